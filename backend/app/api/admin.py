@@ -4,6 +4,18 @@ from datetime import datetime
 
 from app.db.mongodb import get_database
 from app.core.config import settings
+from app.services.inference_batcher import inference_batcher
+from app.services.inference_pool import inference_pool
+from app.services.change_tracker import change_tracker
+from app.services.detection_cache import detection_cache
+from app.services.keyframe_tracker import keyframe_tracker
+from app.services.frame_quality import frame_quality_gate
+from app.services.frame_channel import frame_channels
+from app.services.stream_ingest import stream_ingest_service
+from app.services.video_jobs import video_job_service
+from app.models.video_job import VideoJobCreate
+from app.services.model_registry import model_registry
+from app.services.yolo_service import yolo_service
 
 router = APIRouter()
 
@@ -151,3 +163,141 @@ async def delete_session_admin(
         raise HTTPException(status_code=404, detail="Session not found")
     
     return {"message": "Session deleted", "session_id": session_id}
+
+@router.get("/inference/stats")
+async def get_inference_stats(x_api_key: str = Header(...)):
+    """Get inference statistics (batch fill rate, queue wait, per-camera re-inference savings)"""
+    await verify_admin_key(x_api_key)
+    
+    return {
+        "batching": inference_batcher.get_stats(),
+        "worker_processes": inference_pool.num_workers if inference_pool.is_running else 0,
+        "change_detection": change_tracker.get_stats(),
+        "cascade": yolo_service.get_cascade_stats(),
+        "keyframes": keyframe_tracker.get_stats(),
+        "frame_quality": frame_quality_gate.get_stats(),
+        "websocket": frame_channels.get_stats(),
+        "streams": stream_ingest_service.get_stats(),
+        "timestamp": datetime.utcnow()
+    }
+
+@router.get("/inference/cache")
+async def get_detection_cache_stats(x_api_key: str = Header(...)):
+    """Get detection cache hit/miss counts"""
+    await verify_admin_key(x_api_key)
+    
+    return {
+        **detection_cache.get_stats(),
+        "timestamp": datetime.utcnow()
+    }
+
+@router.delete("/inference/cache")
+async def clear_detection_cache(x_api_key: str = Header(...)):
+    """Drop all cached detection results"""
+    await verify_admin_key(x_api_key)
+    
+    detection_cache.clear()
+    return {"message": "Detection cache cleared"}
+
+@router.get("/models")
+async def list_model_versions(x_api_key: str = Header(...)):
+    """List model versions in the registry and the one currently serving"""
+    await verify_admin_key(x_api_key)
+    
+    return {
+        "versions": model_registry.list_versions(),
+        "serving_version": yolo_service.model_version,
+        "activation": model_registry.status
+    }
+
+@router.post("/models/{version}/activate", status_code=202)
+async def activate_model_version(version: str, x_api_key: str = Header(...)):
+    """
+    Load a model version in the background and swap it in once warmed up
+    Uploads keep being served by the current model until the swap
+    """
+    await verify_admin_key(x_api_key)
+    
+    try:
+        return model_registry.activate(version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/models/activation")
+async def get_model_activation(x_api_key: str = Header(...)):
+    """Progress of the last model activation (loading, active or failed)"""
+    await verify_admin_key(x_api_key)
+    
+    return {
+        **model_registry.status,
+        "serving_version": yolo_service.model_version
+    }
+
+def _job_response(job) -> dict:
+    response = job.dict(exclude={"id"})
+    response["progress"] = round(job.progress, 4)
+    return response
+
+@router.post("/video-jobs", status_code=202)
+async def create_video_job(data: VideoJobCreate, x_api_key: str = Header(...)):
+    """
+    Analyse a recorded video file of a camera into an occupancy time series (Admin only)
+    The job runs in the background; poll GET /video-jobs/{job_id} for progress
+    """
+    await verify_admin_key(x_api_key)
+    
+    try:
+        job = await video_job_service.create_job(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    video_job_service.start(job.job_id)
+    return _job_response(job)
+
+@router.get("/video-jobs")
+async def list_video_jobs(
+    x_api_key: str = Header(...),
+    limit: int = 50,
+    skip: int = 0
+):
+    """List video jobs, newest first (Admin only)"""
+    await verify_admin_key(x_api_key)
+    jobs = await video_job_service.list_jobs(skip, limit)
+    return {"jobs": [_job_response(job) for job in jobs], "count": len(jobs)}
+
+@router.get("/video-jobs/{job_id}")
+async def get_video_job(job_id: str, x_api_key: str = Header(...)):
+    """Status and progress of a video job (Admin only)"""
+    await verify_admin_key(x_api_key)
+    job = await video_job_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    return _job_response(job)
+
+@router.get("/video-jobs/{job_id}/series")
+async def get_video_job_series(job_id: str, x_api_key: str = Header(...)):
+    """Occupancy time series of a video job, as far as it is processed (Admin only)"""
+    await verify_admin_key(x_api_key)
+    job = await video_job_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    
+    points = await video_job_service.get_series(job_id)
+    return {"job_id": job_id, "status": job.status, "progress": round(job.progress, 4), "points": points}
+
+@router.post("/video-jobs/{job_id}/resume", status_code=202)
+async def resume_video_job(job_id: str, x_api_key: str = Header(...)):
+    """Restart a failed or cancelled video job from its missing segments (Admin only)"""
+    await verify_admin_key(x_api_key)
+    job = await video_job_service.resume_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    return _job_response(job)
+
+@router.delete("/video-jobs/{job_id}")
+async def cancel_video_job(job_id: str, x_api_key: str = Header(...)):
+    """Cancel a queued or running video job; processed segments are kept (Admin only)"""
+    await verify_admin_key(x_api_key)
+    if not await video_job_service.cancel_job(job_id):
+        raise HTTPException(status_code=404, detail="No queued or running video job with this id")
+    return {"message": "Video job cancelled", "job_id": job_id}
@@ -2,7 +2,13 @@ from fastapi import APIRouter, HTTPException, Header
 from typing import List, Optional
 
 from app.models.calibration import CameraCalibration, CalibrationCreate, CalibrationUpdate
+from app.models.inference_profile import InferenceProfile, InferenceProfileUpdate
+from app.models.camera_stream import CameraStream, CameraStreamUpdate
 from app.services.calibration_service import calibration_service
+from app.services.inference_profile_service import inference_profile_service
+from app.services.change_tracker import change_tracker
+from app.services.keyframe_tracker import keyframe_tracker
+from app.services.stream_ingest import stream_ingest_service
 from app.core.config import settings
 
 router = APIRouter()
@@ -25,6 +31,8 @@ async def create_calibration(
     
     try:
         calibration = await calibration_service.save_calibration(data)
+        change_tracker.reset(data.camera_id)
+        keyframe_tracker.reset(data.camera_id)
         return calibration
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -60,6 +68,8 @@ async def update_calibration(
     if not calibration:
         raise HTTPException(status_code=404, detail="Calibration not found")
     
+    change_tracker.reset(camera_id)
+    keyframe_tracker.reset(camera_id)
     return calibration
 
 @router.delete("/{camera_id}")
@@ -76,6 +86,8 @@ async def delete_calibration(
     if not success:
         raise HTTPException(status_code=404, detail="Calibration not found")
     
+    change_tracker.reset(camera_id)
+    keyframe_tracker.reset(camera_id)
     return {"message": "Calibration deleted", "camera_id": camera_id}
 
 @router.get("", response_model=List[CameraCalibration])
@@ -91,3 +103,109 @@ async def list_calibrations(
     
     calibrations = await calibration_service.list_calibrations(skip, limit)
     return calibrations
+
+@router.get("/{camera_id}/profile", response_model=InferenceProfile)
+async def get_inference_profile(
+    camera_id: str,
+    x_api_key: str = Header(...)
+):
+    """
+    Get the inference profile (model input size, thresholds, backend, ROI) of a camera (Admin only)
+    """
+    await verify_admin_key(x_api_key)
+    
+    profile = await inference_profile_service.get_profile(camera_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Inference profile not found")
+    
+    return profile
+
+@router.put("/{camera_id}/profile", response_model=InferenceProfile)
+async def save_inference_profile(
+    camera_id: str,
+    data: InferenceProfileUpdate,
+    x_api_key: str = Header(...)
+):
+    """
+    Create or update the inference profile of a camera (Admin only)
+    Unset fields fall back to the global settings
+    """
+    await verify_admin_key(x_api_key)
+    
+    try:
+        profile = await inference_profile_service.save_profile(camera_id, data)
+        change_tracker.reset(camera_id)
+        keyframe_tracker.reset(camera_id)
+        return profile
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/{camera_id}/profile")
+async def delete_inference_profile(
+    camera_id: str,
+    x_api_key: str = Header(...)
+):
+    """
+    Delete the inference profile of a camera (Admin only)
+    """
+    await verify_admin_key(x_api_key)
+    
+    success = await inference_profile_service.delete_profile(camera_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Inference profile not found")
+    
+    change_tracker.reset(camera_id)
+    keyframe_tracker.reset(camera_id)
+    return {"message": "Inference profile deleted", "camera_id": camera_id}
+
+@router.get("/{camera_id}/stream")
+async def get_camera_stream(
+    camera_id: str,
+    x_api_key: str = Header(...)
+):
+    """
+    Get the stream the server pulls frames from for a camera, with its puller status (Admin only)
+    """
+    await verify_admin_key(x_api_key)
+    
+    stream = await stream_ingest_service.get_stream(camera_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Camera stream not found")
+    
+    return {"stream": stream.dict(exclude={"id"}), "status": stream_ingest_service.get_status(camera_id)}
+
+@router.put("/{camera_id}/stream", response_model=CameraStream)
+async def save_camera_stream(
+    camera_id: str,
+    data: CameraStreamUpdate,
+    x_api_key: str = Header(...)
+):
+    """
+    Register or update the RTSP/MJPEG stream or video file of a camera (Admin only)
+    The server pulls and samples its frames and runs them through the upload pipeline
+    """
+    await verify_admin_key(x_api_key)
+    
+    try:
+        stream = await stream_ingest_service.save_stream(camera_id, data)
+        change_tracker.reset(camera_id)
+        keyframe_tracker.reset(camera_id)
+        return stream
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/{camera_id}/stream")
+async def delete_camera_stream(
+    camera_id: str,
+    x_api_key: str = Header(...)
+):
+    """
+    Stop pulling and remove the stream of a camera (Admin only)
+    """
+    await verify_admin_key(x_api_key)
+    
+    success = await stream_ingest_service.delete_stream(camera_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Camera stream not found")
+    
+    return {"message": "Camera stream deleted", "camera_id": camera_id}
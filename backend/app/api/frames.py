@@ -1,23 +1,21 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Header
-from typing import Optional
-import cv2
-import numpy as np
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Query, Header, Request, WebSocket, status
+from typing import List, Optional
 from datetime import datetime
-import uuid
-import os
+import json
 import logging
 
-from app.services.yolo_service import yolo_service
-from app.services.calibration_service import calibration_service
-from app.services.empty_space_detector import EmptySpaceDetector
-from app.services.visualization_service import visualization_service
-from app.models.detection import FrameDetection, DetectionSession
+from app.services.frame_processor import frame_processor, FrameError
+from app.services.upload_buffers import upload_buffers
+from app.services.frame_channel import frame_channels
 from app.db.mongodb import get_database
 from app.core.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Body types accepted by the raw upload route
+RAW_CONTENT_TYPES = ("image/jpeg", "image/png", "application/octet-stream")
+
 async def verify_admin_key(x_api_key: Optional[str] = Header(None)):
     """Verify admin API key"""
     from app.core.config import settings
@@ -25,6 +23,12 @@ async def verify_admin_key(x_api_key: Optional[str] = Header(None)):
         raise HTTPException(status_code=403, detail="Invalid or missing API key")
     return True
 
+async def _process(contents, session_id: str, camera_id: Optional[str]) -> dict:
+    try:
+        return await frame_processor.process(contents, session_id, camera_id)
+    except FrameError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
 @router.post("/upload")
 async def upload_frame(
     session_id: str = Query(...),
@@ -37,202 +41,105 @@ async def upload_frame(
     Frames are compared and the one with most detections is saved
     If camera_id provided, will detect empty parking spaces
     """
-    try:
-        await verify_admin_key(x_api_key)
-        
-        # Read image
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise HTTPException(status_code=400, detail="Invalid image")
-        
-        logger.info(f"Image loaded: {image.shape}")
-        
-        # Detect objects
-        detections, count = yolo_service.detect(image)
-        logger.info(f"Detections: {count}")
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in upload_frame: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
-    
-    # Process with calibration if camera_id provided
-    parking_analysis = None
-    if camera_id:
-        calibration = await calibration_service.get_calibration(camera_id)
-        if calibration:
-            try:
-                detector = EmptySpaceDetector(calibration)
-                parking_analysis = detector.process_detections(detections, session_id)
-            except Exception as e:
-                # Log error but continue with basic detection
-                logger.warning(f"Error processing empty spaces for camera {camera_id}: {e}")
-                parking_analysis = None
-        else:
-            # No calibration found - skip empty space detection
-            logger.info(f"No calibration found for camera {camera_id}, skipping empty space detection")
-    
-    # Create frame detection
-    frame_id = str(uuid.uuid4())
-    frame_detection = FrameDetection(
-        frame_id=frame_id,
-        timestamp=datetime.utcnow(),
-        detections=detections,
-        detection_count=count
-    )
+    await verify_admin_key(x_api_key)
+    contents = await file.read()
+    return await _process(contents, session_id, camera_id)
+
+@router.post("/upload/raw")
+async def upload_frame_raw(
+    request: Request,
+    session_id: str = Query(...),
+    x_api_key: str = Header(...),
+    camera_id: Optional[str] = Query(None),
+    content_type: Optional[str] = Header(None)
+):
+    """
+    Upload a frame as the raw request body (Admin only)
+    Same as /upload, but the body is the encoded image itself
+    (Content-Type: image/jpeg or image/png). It is streamed into a pooled
+    buffer and decoded from there, without multipart parsing or spooling.
+    """
+    await verify_admin_key(x_api_key)
+    if (content_type or "").split(";")[0].strip().lower() not in RAW_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=415, detail=f"Content-Type must be one of: {', '.join(RAW_CONTENT_TYPES)}"
+        )
     
-    # Get or create session
-    db = get_database()
-    session = await db.detection_sessions.find_one({"session_id": session_id})
+    content_length = request.headers.get("content-length")
+    size_hint = int(content_length) if content_length and content_length.isdigit() else 0
+    if size_hint > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {settings.MAX_UPLOAD_BYTES} bytes")
     
-    if not session:
-        # Create new session
-        best_frame_data = frame_detection.dict() if count > 0 else None
-        
-        # Save initial best frame image with visualization
-        if best_frame_data and count > 0:
-            os.makedirs("uploads/best_frames", exist_ok=True)
-            img_path = f"uploads/best_frames/{session_id}.jpg"
-            
-            # Draw visualization
-            if parking_analysis and camera_id:
-                # Draw complete parking visualization with rows, empty spaces, and detections
-                calibration = await calibration_service.get_calibration(camera_id)
-                if calibration:
-                    img_with_viz = visualization_service.draw_complete_visualization(
-                        image,
-                        calibration.rows,
-                        parking_analysis.detections,
-                        parking_analysis.empty_spaces,
-                        calibration.row_start_x,
-                        calibration.row_end_x
-                    )
-                    cv2.imwrite(img_path, img_with_viz)
-                else:
-                    # Fallback to basic detection visualization
-                    img_with_boxes = yolo_service.draw_detections(image, detections)
-                    cv2.imwrite(img_path, img_with_boxes)
-            else:
-                # No calibration - use basic detection visualization
-                img_with_boxes = yolo_service.draw_detections(image, detections)
-                cv2.imwrite(img_path, img_with_boxes)
-            
-            best_frame_data["image_path"] = img_path
-        
-        session_data = {
-            "session_id": session_id,
-            "camera_id": camera_id,
-            "user_id": None,
-            "frames": [frame_detection.dict()],
-            "max_detection_count": count,
-            "best_frame": best_frame_data,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "status": "active"
-        }
-        
-        # Add parking analysis if available
-        if parking_analysis:
-            session_data["parking_analysis"] = parking_analysis.dict()
-            session_data["empty_spaces"] = [space.dict() for space in parking_analysis.empty_spaces]
-            session_data["total_motorcycles"] = parking_analysis.total_motorcycles
-            session_data["total_empty_spaces"] = parking_analysis.total_empty_spaces
-            # Convert integer keys to strings for MongoDB
-            session_data["empty_spaces_per_row"] = {str(k): v for k, v in parking_analysis.empty_spaces_per_row.items()}
-            session_data["parking_occupancy_rate"] = parking_analysis.parking_occupancy_rate
-        
-        await db.detection_sessions.insert_one(session_data)
-    else:
-        # Update existing session
-        frames = session.get("frames", [])
-        frames.append(frame_detection.dict())
-        
-        # Keep only last N frames
-        if len(frames) > settings.MAX_FRAMES_PER_SESSION:
-            frames = frames[-settings.MAX_FRAMES_PER_SESSION:]
-        
-        # Update best frame if current has more detections
-        max_count = session.get("max_detection_count", 0)
-        best_frame = session.get("best_frame")
-        
-        if count > max_count:
-            max_count = count
-            best_frame = frame_detection.dict()
-            
-            # Save best frame image with visualization
-            os.makedirs("uploads/best_frames", exist_ok=True)
-            img_path = f"uploads/best_frames/{session_id}.jpg"
-            
-            # Draw visualization
-            if parking_analysis and camera_id:
-                # Draw complete parking visualization with rows, empty spaces, and detections
-                calibration = await calibration_service.get_calibration(camera_id)
-                if calibration:
-                    img_with_viz = visualization_service.draw_complete_visualization(
-                        image,
-                        calibration.rows,
-                        parking_analysis.detections,
-                        parking_analysis.empty_spaces,
-                        calibration.row_start_x,
-                        calibration.row_end_x
-                    )
-                    cv2.imwrite(img_path, img_with_viz)
-                else:
-                    # Fallback to basic detection visualization
-                    img_with_boxes = yolo_service.draw_detections(image, detections)
-                    cv2.imwrite(img_path, img_with_boxes)
-            else:
-                # No calibration - use basic detection visualization
-                img_with_boxes = yolo_service.draw_detections(image, detections)
-                cv2.imwrite(img_path, img_with_boxes)
-            
-            best_frame["image_path"] = img_path
-        
-        update_data = {
-            "frames": frames,
-            "max_detection_count": max_count,
-            "best_frame": best_frame,
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Update parking analysis if available
-        if parking_analysis:
-            update_data["parking_analysis"] = parking_analysis.dict()
-            update_data["camera_id"] = camera_id
-            update_data["empty_spaces"] = [space.dict() for space in parking_analysis.empty_spaces]
-            update_data["total_motorcycles"] = parking_analysis.total_motorcycles
-            update_data["total_empty_spaces"] = parking_analysis.total_empty_spaces
-            # Convert integer keys to strings for MongoDB
-            update_data["empty_spaces_per_row"] = {str(k): v for k, v in parking_analysis.empty_spaces_per_row.items()}
-            update_data["parking_occupancy_rate"] = parking_analysis.parking_occupancy_rate
-        
-        await db.detection_sessions.update_one(
-            {"session_id": session_id},
-            {"$set": update_data}
+    buffer = upload_buffers.acquire(size_hint)
+    try:
+        try:
+            buffer, length = await upload_buffers.read_stream(buffer, request.stream())
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if not length:
+            raise HTTPException(status_code=400, detail="Empty request body")
+        return await _process(memoryview(buffer)[:length], session_id, camera_id)
+    finally:
+        upload_buffers.release(buffer)
+
+@router.post("/upload/batch")
+async def upload_frames_batch(
+    files: List[UploadFile] = File(...),
+    frames: str = Form(...),
+    x_api_key: str = Header(...)
+):
+    """
+    Upload several frames in one request (Admin only)
+    frames: JSON list with one {"session_id", "camera_id"} object per file, in order;
+    frames may belong to different cameras and sessions. They are decoded and
+    detected together and all session updates are written at once.
+    Returns one result per frame, in order; a frame that failed carries
+    "error" and "status_code" instead of detections.
+    """
+    await verify_admin_key(x_api_key)
+    if len(files) > settings.MAX_BATCH_UPLOAD_FRAMES:
+        raise HTTPException(
+            status_code=413, detail=f"At most {settings.MAX_BATCH_UPLOAD_FRAMES} frames per batch"
         )
     
-    response = {
-        "frame_id": frame_id,
-        "session_id": session_id,
-        "detection_count": count,
-        "detections": [det.dict() for det in detections],
-        "is_best": count > session.get("max_detection_count", 0) if session else True
-    }
+    try:
+        metadata = json.loads(frames)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="frames must be a JSON list")
+    if not isinstance(metadata, list) or len(metadata) != len(files):
+        raise HTTPException(status_code=400, detail="frames must have one entry per uploaded file")
+    if not all(isinstance(entry, dict) and entry.get("session_id") for entry in metadata):
+        raise HTTPException(status_code=400, detail="Every frame needs a session_id")
     
-    # Add parking analysis if available
-    if parking_analysis:
-        response["parking_analysis"] = {
-            "total_motorcycles": parking_analysis.total_motorcycles,
-            "total_empty_spaces": parking_analysis.total_empty_spaces,
-            # Convert integer keys to strings for JSON compatibility
-            "empty_spaces_per_row": {str(k): v for k, v in parking_analysis.empty_spaces_per_row.items()},
-            "parking_occupancy_rate": parking_analysis.parking_occupancy_rate
-        }
+    items = [
+        (await file.read(), str(entry["session_id"]), entry.get("camera_id") or None)
+        for file, entry in zip(files, metadata)
+    ]
+    results = await frame_processor.process_many(items)
+    return {"count": len(results), "results": results}
+
+@router.websocket("/ws")
+async def frames_websocket(
+    websocket: WebSocket,
+    x_api_key: Optional[str] = Header(None),
+    session_id: Optional[str] = Query(None),
+    camera_id: Optional[str] = Query(None)
+):
+    """
+    Persistent ingestion channel for a camera (Admin only)
+    The API key is checked once, on connect (X-API-Key header only, so it never
+    ends up in URLs or access logs).
+    Each binary message is one frame: 2-byte big-endian header length, JSON
+    header {"session_id", "camera_id", "timestamp", "seq"} and the encoded image;
+    session_id/camera_id query params serve as defaults for every frame.
+    Compact results are sent back as JSON text messages, in frame order.
+    """
+    if not x_api_key or x_api_key != settings.ADMIN_API_KEY:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     
-    return response
+    await websocket.accept()
+    await frame_channels.serve(websocket, {"session_id": session_id, "camera_id": camera_id})
 
 @router.post("/complete/{session_id}")
 async def complete_session(session_id: str, x_api_key: str = Header(...)):
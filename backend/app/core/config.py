@@ -7,12 +7,92 @@ class Settings(BaseSettings):
     DATABASE_NAME: str = "parkit_db"
     
     # Model
-    MODEL_PATH: str = "models/best.pt"
+    MODEL_PATH: str = "models/best.pt"  # .pt, .onnx or OpenVINO IR (.xml / *_openvino_model dir)
+    MODEL_REGISTRY_DIR: str = "models/registry"  # Versioned models (<dir>/<version>/<model file>), activated via the admin API
+    INFERENCE_BACKEND: str = "auto"  # auto, torch, ultralytics, onnxruntime, openvino
+    INFERENCE_THREADS: int = 0  # CPU threads for the backend (0 = library default)
     CONFIDENCE_THRESHOLD: float = 0.25
     IOU_THRESHOLD: float = 0.45
     MAX_DETECTIONS: int = 300
+    NMS_TOP_K: int = 0  # Only the K highest-scoring candidates per frame go into NMS (0 = up to 30000)
+    
+    # Model cascade (a small model first, the main model only for uncertain results; empty = disabled)
+    CASCADE_MODEL_PATH: str = ""  # e.g. models/yolo12n.pt trained on the same dataset
+    CASCADE_MIN_CONFIDENCE: float = 0.1  # Small model candidates below this are ignored
+    CASCADE_ACCEPT_CONFIDENCE: float = 0.5  # Small model boxes between min and accept count as uncertain
+    CASCADE_MAX_UNCERTAIN: int = 3  # Escalate when more uncertain boxes than this
+    CASCADE_ROW_MARGIN: int = 20  # Uncertain boxes within this many pixels of a calibrated row line escalate
+    
+    # Inference batching (frames arriving within the wait window share one forward pass)
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: float = 10.0
+    
+    # Mosaic packing (small crops of a batch share one canvas at the model input size)
+    MOSAIC_ENABLED: bool = False
+    MOSAIC_CANVAS_SIZE: int = 0  # Canvas side in pixels (0 = the model's input size)
+    MOSAIC_MAX_FRACTION: float = 0.5  # Only crops whose long side is at most this fraction of the canvas are packed
+    MOSAIC_GAP: int = 32  # Padding between packed crops so boxes do not bleed into a neighbour
+    
+    # Inference worker processes (0 = run the model inside the API process)
+    INFERENCE_WORKERS: int = 0
+    INFERENCE_WORKER_THREADS: int = 1  # backend CPU threads per worker process
+    INFERENCE_SHM_SLOT_MB: int = 64  # shared memory per worker for decoded frames
+    
+    # Calibration ROI inference (crop frames to the calibrated rows before detection)
+    ROI_INFERENCE_ENABLED: bool = True
+    ROI_ROW_MARGIN: int = 150  # Pixels above/below the outer row lines where parked motorcycles extend
+    ROI_PADDING: int = 32  # Extra band around the region so edge motorcycles are not cut off
+    
+    # Tiled inference (enabled per camera with calibration.tile_size)
+    TILE_MERGE_THRESHOLD: float = 0.6  # Intersection over smaller box for merging boxes across tile seams
+    
+    # Change-aware re-inference (only changed grid cells of a camera's frame are re-inferred)
+    CHANGE_DETECTION_ENABLED: bool = False
+    CHANGE_GRID_CELL: int = 64  # Grid cell size in pixels
+    CHANGE_PIXEL_THRESHOLD: float = 12.0  # Mean absolute gray difference (0-255) for a cell to count as changed
+    CHANGE_MAX_FRACTION: float = 0.5  # Above this fraction of changed cells the whole frame is re-inferred
+    CHANGE_REGION_PADDING: int = 64  # Context around changed regions so motorcycles are not cut off
+    CHANGE_FULL_REFRESH_FRAMES: int = 30  # Force a full inference after this many partial/skipped frames
+    
+    # Keyframe mode (detect every Nth frame of a camera, track boxes with optical flow in between)
+    KEYFRAME_INTERVAL: int = 1  # 1 = detect every frame; override per camera with the inference profile
+    KEYFRAME_CHANGE_THRESHOLD: float = 25.0  # Change score (0-255) that forces a keyframe early
+    KEYFRAME_TRACK_WIDTH: int = 640  # Width of the grayscale frame used for tracking
+    KEYFRAME_MIN_TRACKED_POINTS: int = 4  # Boxes with fewer tracked points keep their position
+    
+    # Frame quality gate (dark, overexposed, blurred or frozen frames skip inference)
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_GATE_ACTION: str = "skip"  # skip = answer without inference or session update, reject = HTTP 422
+    QUALITY_CHECK_WIDTH: int = 320  # Width of the grayscale copy the checks run on
+    QUALITY_MIN_BRIGHTNESS: float = 30.0  # Mean gray level (0-255) below which a frame is too dark
+    QUALITY_MAX_BRIGHTNESS: float = 230.0  # Mean gray level above which a frame is overexposed
+    QUALITY_MIN_SHARPNESS: float = 100.0  # Laplacian variance below which a frame is blurred or obscured
+    QUALITY_FROZEN_DIFF: float = 0.05  # Mean absolute difference to the previous frame that counts as identical (sensor noise stays above this)
+    QUALITY_FROZEN_FRAMES: int = 5  # Identical frames in a row before a camera counts as frozen (0 = off)
+    
+    # Detection cache (repeated uploads of identical bytes skip decode and inference; 0 = disabled)
+    DETECTION_CACHE_SIZE: int = 256
+    
+    # Stream ingestion (the server pulls RTSP/MJPEG/video file streams registered per camera)
+    STREAM_INGEST_ENABLED: bool = True  # Start the registered stream pullers on startup
+    STREAM_RECONNECT_DELAY: float = 5.0  # Seconds before reopening a stream that failed or ended
+    SHM_RING_POLL_INTERVAL: float = 0.005  # Seconds between checks of a shm:// frame ring for a new frame
+    
+    # Offline video jobs (recorded footage split into time segments decoded in parallel processes)
+    VIDEO_JOB_DECODE_WORKERS: int = 2  # Decode processes; also the number of segments in flight per job
+    VIDEO_JOB_SEGMENT_SECONDS: float = 60.0  # Video time per segment (unit of parallelism and of resume)
+    VIDEO_JOB_MAX_SEGMENT_SAMPLES: int = 60  # Sampled frames per segment at most; they are decoded into memory at once (0 = no cap)
+    VIDEO_JOB_MAX_CONCURRENT: int = 1  # Jobs running at the same time; others wait as queued
     
     # Frame processing
+    MAX_IMAGE_PIXELS: int = 40_000_000  # Uploads above this (read from the image header) are rejected with 413
+    REDUCED_DECODE_ENABLED: bool = True  # Decode JPEGs at 1/2, 1/4 or 1/8 when the inferred area stays >= the model input size
+    MAX_UPLOAD_BYTES: int = 32 * 1024 * 1024  # Raw-body uploads above this are rejected with 413
+    UPLOAD_BUFFER_POOL_SIZE: int = 16  # Idle upload buffers kept for reuse by the raw upload route
+    UPLOAD_BUFFER_BYTES: int = 4 * 1024 * 1024  # Initial size of an upload buffer
+    MAX_BATCH_UPLOAD_FRAMES: int = 64  # Frames accepted by one /upload/batch request
+    WS_MAX_PENDING_FRAMES: int = 2  # Frames a WebSocket connection may queue before backpressure applies
+    WS_OVERFLOW_POLICY: str = "drop_oldest"  # drop_oldest (report dropped frames) or block (stop reading the socket)
     MAX_FRAMES_PER_SESSION: int = 10
     FRAME_COMPARISON_WINDOW: int = 5  # Compare last N frames
     
@@ -42,6 +42,8 @@ class CameraCalibration(BaseModel):
     space_coefficient: float = Field(..., ge=0.1, le=1.0, description="Reduction factor per row for perspective")
     row_start_x: int = Field(default=0, ge=0, description="Left boundary of parking area")
     row_end_x: int = Field(default=1920, ge=0, description="Right boundary of parking area")
+    tile_size: Optional[int] = Field(None, ge=320, le=4096, description="Tile size for tiled inference on high-resolution frames (None = disabled)")
+    tile_overlap: float = Field(default=0.2, ge=0.0, le=0.5, description="Overlap between neighbouring tiles (fraction of tile size)")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -80,6 +82,8 @@ class CalibrationCreate(BaseModel):
     space_coefficient: float = Field(..., ge=0.1, le=1.0)
     row_start_x: int = Field(default=0, ge=0)
     row_end_x: int = Field(default=1920, ge=0)
+    tile_size: Optional[int] = Field(None, ge=320, le=4096)
+    tile_overlap: float = Field(default=0.2, ge=0.0, le=0.5)
 
 class CalibrationUpdate(BaseModel):
     rows: Optional[List[ParkingRow]] = None
@@ -87,3 +91,5 @@ class CalibrationUpdate(BaseModel):
     space_coefficient: Optional[float] = Field(None, ge=0.1, le=1.0)
     row_start_x: Optional[int] = Field(None, ge=0)
     row_end_x: Optional[int] = Field(None, ge=0)
+    tile_size: Optional[int] = Field(None, ge=320, le=4096)
+    tile_overlap: Optional[float] = Field(None, ge=0.0, le=0.5)
@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from bson import ObjectId
+
+from app.models.calibration import PyObjectId
+
+class CameraStream(BaseModel):
+    """
+    Stream the server pulls frames from for a camera, instead of the camera pushing uploads
+    url: RTSP/HTTP(MJPEG) stream URL, a local video file, or shm://{ring name}
+    for a shared-memory frame ring written by a capture process on this host
+    """
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    camera_id: str = Field(..., description="Camera identifier (same as calibration)")
+    url: str = Field(..., description="rtsp://, http(s):// (MJPEG), shm://{ring name} or path to a local video file")
+    session_id: Optional[str] = Field(None, description="Detection session to write to (default: stream-{camera_id})")
+    sample_fps: float = Field(1.0, gt=0, le=30, description="Frames per second sent to detection at most")
+    loop: bool = Field(False, description="Restart video files from the beginning when they end")
+    enabled: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class CameraStreamUpdate(BaseModel):
+    url: Optional[str] = None
+    session_id: Optional[str] = None
+    sample_fps: Optional[float] = Field(None, gt=0, le=30)
+    loop: Optional[bool] = None
+    enabled: Optional[bool] = None
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from datetime import datetime
 from bson import ObjectId
+import numpy as np
 
 class PyObjectId(ObjectId):
     @classmethod
@@ -35,12 +36,65 @@ class BoundingBox(BaseModel):
     confidence: float
     class_name: str = "motor"
 
+class DetectionResult:
+    """
+    Columnar detections of one frame as numpy arrays
+    
+    boxes: (N, 4) float32 [x1, y1, x2, y2], scores: (N,) float32, class_ids: (N,) int
+    BoundingBox objects are only built (once) when a response or the database needs them.
+    """
+    __slots__ = ("boxes", "scores", "class_ids", "names", "_bounding_boxes")
+    
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, names: Dict[int, str]):
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+        self.names = names
+        self._bounding_boxes: Optional[List[BoundingBox]] = None
+    
+    @classmethod
+    def from_array(cls, array: np.ndarray, names: Dict[int, str]) -> "DetectionResult":
+        """Split a compact (N, 6) [x1, y1, x2, y2, confidence, class_id] array into columns (views, no copy)"""
+        return cls(array[:, :4], array[:, 4], array[:, 5].astype(np.int64), names)
+    
+    @property
+    def count(self) -> int:
+        return len(self.scores)
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def to_array(self) -> np.ndarray:
+        """Back to the compact (N, 6) float32 layout"""
+        return np.column_stack([self.boxes, self.scores, self.class_ids]).astype(np.float32, copy=False)
+    
+    def to_bounding_boxes(self) -> List[BoundingBox]:
+        """BoundingBox objects for API responses and storage, built on first use"""
+        if self._bounding_boxes is None:
+            # One tolist() per column instead of per-box numpy scalar conversions
+            if len(self.names) == 1:
+                # Single-class model: no per-box name lookup
+                class_names = [next(iter(self.names.values()))] * self.count
+            else:
+                class_names = [self.names[class_id] for class_id in self.class_ids.tolist()]
+            self._bounding_boxes = [
+                BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2, confidence=confidence, class_name=class_name)
+                for (x1, y1, x2, y2), confidence, class_name in zip(
+                    self.boxes.tolist(), self.scores.tolist(), class_names
+                )
+            ]
+        return self._bounding_boxes
+
 class FrameDetection(BaseModel):
     frame_id: str
     timestamp: datetime
     detections: List[BoundingBox]
     detection_count: int
     image_path: Optional[str] = None
+    model_version: Optional[str] = None
+
+    class Config:
+        protected_namespaces = ()
 
 class DetectionSession(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
@@ -50,6 +104,7 @@ class DetectionSession(BaseModel):
     frames: List[FrameDetection] = []
     best_frame: Optional[FrameDetection] = None
     max_detection_count: int = 0
+    model_version: Optional[str] = Field(None, description="Model version of the latest frame")
     empty_spaces: List[Dict] = Field(default_factory=list, description="List of detected empty parking spaces")
     total_motorcycles: int = Field(default=0, description="Total number of motorcycles detected")
     total_empty_spaces: int = Field(default=0, description="Total number of empty spaces detected")
@@ -62,4 +117,5 @@ class DetectionSession(BaseModel):
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
+        protected_namespaces = ()
         json_encoders = {ObjectId: str}
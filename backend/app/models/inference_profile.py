@@ -0,0 +1,74 @@
+from pydantic import BaseModel, Field, validator
+from typing import NamedTuple, Optional
+from datetime import datetime
+from bson import ObjectId
+
+from app.models.calibration import PyObjectId
+
+BACKEND_CHOICES = ("auto", "torch", "ultralytics", "onnxruntime", "openvino")
+
+class InferenceParams(NamedTuple):
+    """Resolved inference settings for one frame; frames are only batched with equal params"""
+    conf: float
+    iou: float
+    max_det: int
+    imgsz: Optional[int] = None  # None = the model's own input size
+    model_path: Optional[str] = None  # None = settings.MODEL_PATH
+    backend: str = "auto"
+
+def _validate_imgsz(v):
+    if v is not None and v % 32 != 0:
+        raise ValueError("imgsz must be a multiple of 32")
+    return v
+
+def _validate_backend(v):
+    if v is not None and v not in BACKEND_CHOICES:
+        raise ValueError(f"backend must be one of: {', '.join(BACKEND_CHOICES)}")
+    return v
+
+class InferenceProfile(BaseModel):
+    """
+    Per-camera inference settings, stored next to the camera's calibration
+    Unset fields fall back to the global Settings values
+    """
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    camera_id: str = Field(..., description="Camera identifier (same as calibration)")
+    imgsz: Optional[int] = Field(None, ge=160, le=4096, description="Model input size in pixels (multiple of 32)")
+    confidence_threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    iou_threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    max_detections: Optional[int] = Field(None, ge=1, le=1000)
+    model_path: Optional[str] = Field(None, description="Model file for this camera (defaults to MODEL_PATH)")
+    backend: Optional[str] = Field(None, description="auto, torch, ultralytics, onnxruntime or openvino")
+    roi_enabled: Optional[bool] = Field(None, description="Crop to the calibrated rows before inference")
+    roi_row_margin: Optional[int] = Field(None, ge=0, le=2000, description="Pixels above/below the outer row lines")
+    roi_padding: Optional[int] = Field(None, ge=0, le=1000, description="Padding band around the ROI")
+    keyframe_interval: Optional[int] = Field(None, ge=1, le=300, description="Detect every Nth frame, track boxes in between")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    _check_imgsz = validator('imgsz', allow_reuse=True)(_validate_imgsz)
+    _check_backend = validator('backend', allow_reuse=True)(_validate_backend)
+
+    class Config:
+        populate_by_name = True
+        protected_namespaces = ()
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class InferenceProfileUpdate(BaseModel):
+    imgsz: Optional[int] = Field(None, ge=160, le=4096)
+    confidence_threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    iou_threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    max_detections: Optional[int] = Field(None, ge=1, le=1000)
+    model_path: Optional[str] = None
+    backend: Optional[str] = None
+    roi_enabled: Optional[bool] = None
+    roi_row_margin: Optional[int] = Field(None, ge=0, le=2000)
+    roi_padding: Optional[int] = Field(None, ge=0, le=1000)
+    keyframe_interval: Optional[int] = Field(None, ge=1, le=300)
+
+    _check_imgsz = validator('imgsz', allow_reuse=True)(_validate_imgsz)
+    _check_backend = validator('backend', allow_reuse=True)(_validate_backend)
+
+    class Config:
+        protected_namespaces = ()
@@ -0,0 +1,54 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from bson import ObjectId
+
+from app.models.calibration import PyObjectId
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+
+class VideoJobCreate(BaseModel):
+    video_path: str = Field(..., description="Path of the video file on the server")
+    camera_id: str = Field(..., description="Camera whose calibration and inference profile are used")
+    sample_seconds: float = Field(5.0, gt=0, le=3600, description="Seconds of video between analysed frames")
+    segment_seconds: Optional[float] = Field(None, ge=1, le=3600, description="Video time per segment (default VIDEO_JOB_SEGMENT_SECONDS)")
+    video_start: Optional[datetime] = Field(None, description="Wall-clock time of the first frame, for absolute timestamps")
+
+class VideoJob(BaseModel):
+    """
+    Offline analysis of a recorded video, split into segments that are processed
+    in parallel; completed segments are recorded so a job resumes where it stopped
+    """
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    job_id: str
+    camera_id: str
+    video_path: str
+    sample_seconds: float
+    segment_seconds: float
+    video_start: Optional[datetime] = None
+    status: str = "queued"
+    fps: float
+    frame_count: int
+    width: int
+    height: int
+    step: int = Field(..., description="Frames between analysed frames")
+    segment_frames: int
+    segment_count: int
+    total_samples: int
+    completed_segments: List[int] = []
+    processed_frames: int = 0
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+    @property
+    def progress(self) -> float:
+        return len(self.completed_segments) / self.segment_count if self.segment_count else 1.0
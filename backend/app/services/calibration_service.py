@@ -1,7 +1,8 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from app.models.calibration import CameraCalibration, CalibrationCreate, CalibrationUpdate
 from app.db.mongodb import get_database
+from app.core.config import settings
 
 class CalibrationService:
     """Service for managing camera calibration data"""
@@ -95,6 +96,40 @@ class CalibrationService:
         
         return [CameraCalibration(**cal) for cal in calibrations]
     
+    @staticmethod
+    def get_inference_roi(
+        calibration: CameraCalibration,
+        image_shape: Tuple[int, int],
+        row_margin: Optional[int] = None,
+        padding: Optional[int] = None
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Region of the frame that can contain parked motorcycles:
+        X from the leftmost row start to the rightmost row end,
+        Y from the top row line to the bottom row line plus row_margin,
+        all grown by a padding band and clipped to the image
+        Returns: (x1, y1, x2, y2) or None if the region covers the whole frame
+        """
+        row_margin = settings.ROI_ROW_MARGIN if row_margin is None else row_margin
+        padding = settings.ROI_PADDING if padding is None else padding
+        img_height, img_width = image_shape
+        
+        start_xs = [row.start_x if row.start_x is not None else calibration.row_start_x for row in calibration.rows]
+        end_xs = [row.end_x if row.end_x is not None else calibration.row_end_x for row in calibration.rows]
+        row_ys = [row.y_coordinate for row in calibration.rows]
+        
+        x1 = max(0, min(start_xs) - padding)
+        x2 = min(img_width, max(end_xs) + padding)
+        y1 = max(0, min(row_ys) - row_margin - padding)
+        y2 = min(img_height, max(row_ys) + row_margin + padding)
+        
+        if x2 <= x1 or y2 <= y1:
+            return None
+        if x1 == 0 and y1 == 0 and x2 == img_width and y2 == img_height:
+            return None
+        
+        return int(x1), int(y1), int(x2), int(y2)
+    
     @staticmethod
     def validate_calibration(data: dict) -> tuple[bool, Optional[str]]:
         """
@@ -0,0 +1,260 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.yolo_processing import MAX_WH, nms
+
+# Each grid cell is compared on SUBCELLS x SUBCELLS downscaled pixels
+SUBCELLS = 4
+
+class _CameraState:
+    """Reference frame and detections of one camera"""
+    __slots__ = ("shape", "reference", "detections", "frames_since_full")
+
+    def __init__(self, shape: Tuple[int, int], reference: np.ndarray, detections: np.ndarray):
+        self.shape = shape
+        self.reference = reference
+        self.detections = detections
+        self.frames_since_full = 0
+
+class ChangePlan:
+    """
+    What to run for a new frame
+
+    mode "full": infer the whole frame (no usable state or too much changed)
+    mode "skipped": nothing changed, reuse the previous detections
+    mode "partial": infer only regions (x1, y1, x2, y2); boxes whose center
+    falls in a core region replace the previous ones there
+    """
+    __slots__ = ("mode", "shape", "small", "regions", "cores", "changed_cells", "changed_fraction")
+
+    def __init__(
+        self,
+        mode: str,
+        shape: Tuple[int, int],
+        small: np.ndarray,
+        changed_cells: Optional[np.ndarray] = None,
+        regions: Optional[List[Tuple[int, int, int, int]]] = None,
+        cores: Optional[List[Tuple[int, int, int, int]]] = None,
+        changed_fraction: float = 1.0
+    ):
+        self.mode = mode
+        self.shape = shape
+        self.small = small
+        self.regions = regions or []
+        self.cores = cores or []
+        self.changed_cells = changed_cells
+        self.changed_fraction = changed_fraction
+
+class ChangeTracker:
+    """
+    Per-camera change detection for partial re-inference
+
+    Each frame is reduced to a small grayscale image and compared against
+    the camera's reference on a grid of cell_size x cell_size pixel cells.
+    Only cells whose mean absolute difference exceeds pixel_threshold are
+    re-inferred. The reference of a cell is only refreshed when that cell is
+    inferred again, so slow drift (lighting) still adds up to a change.
+    State lives in memory of the API process.
+    """
+
+    def __init__(
+        self,
+        cell_size: int,
+        pixel_threshold: float,
+        max_changed_fraction: float,
+        region_padding: int,
+        full_refresh_frames: int
+    ):
+        self.cell_size = max(8, cell_size)
+        self.pixel_threshold = pixel_threshold
+        self.max_changed_fraction = max_changed_fraction
+        self.region_padding = region_padding
+        self.full_refresh_frames = full_refresh_frames
+        self._states: Dict[str, _CameraState] = {}
+        self._stats: Dict[str, dict] = {}
+
+    def _reduce(self, image: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+        """Grayscale image with SUBCELLS x SUBCELLS pixels per grid cell of the original shape"""
+        h, w = shape
+        grid_h = -(-h // self.cell_size)
+        grid_w = -(-w // self.cell_size)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return cv2.resize(gray, (grid_w * SUBCELLS, grid_h * SUBCELLS), interpolation=cv2.INTER_AREA)
+
+    def _cell_bounds(
+        self,
+        shape: Tuple[int, int],
+        roi: Optional[Tuple[int, int, int, int]]
+    ) -> Tuple[int, int, int, int]:
+        """Grid cells (cx1, cy1, cx2, cy2) covering the ROI, or the whole frame"""
+        h, w = shape
+        if roi is None:
+            return 0, 0, -(-w // self.cell_size), -(-h // self.cell_size)
+        x1, y1, x2, y2 = roi
+        return (
+            x1 // self.cell_size,
+            y1 // self.cell_size,
+            -(-x2 // self.cell_size),
+            -(-y2 // self.cell_size)
+        )
+
+    def plan(
+        self,
+        camera_id: str,
+        image: np.ndarray,
+        roi: Optional[Tuple[int, int, int, int]] = None,
+        shape: Optional[Tuple[int, int]] = None
+    ) -> ChangePlan:
+        """
+        Diff the frame against the camera's reference and decide what to infer
+        roi limits the comparison to the area that is inferred anyway
+        shape is the original (h, w) when image was decoded at reduced resolution;
+        regions are always in original coordinates
+        """
+        shape = shape or image.shape[:2]
+        small = self._reduce(image, shape)
+        bounds = self._cell_bounds(shape, roi)
+        state = self._states.get(camera_id)
+
+        if (
+            state is None
+            or state.shape != shape
+            or state.frames_since_full >= self.full_refresh_frames
+        ):
+            return ChangePlan("full", shape, small)
+
+        # Mean absolute difference per grid cell
+        diff = cv2.absdiff(small, state.reference).astype(np.float32)
+        grid_h, grid_w = diff.shape[0] // SUBCELLS, diff.shape[1] // SUBCELLS
+        cell_diff = diff.reshape(grid_h, SUBCELLS, grid_w, SUBCELLS).mean(axis=(1, 3))
+
+        changed = np.zeros((grid_h, grid_w), dtype=np.uint8)
+        cx1, cy1, cx2, cy2 = bounds
+        changed[cy1:cy2, cx1:cx2] = cell_diff[cy1:cy2, cx1:cx2] > self.pixel_threshold
+
+        total_cells = max(1, (cx2 - cx1) * (cy2 - cy1))
+        changed_fraction = float(changed.sum()) / total_cells
+        if changed_fraction == 0:
+            return ChangePlan("skipped", shape, small, changed, changed_fraction=0.0)
+        if changed_fraction > self.max_changed_fraction:
+            return ChangePlan("full", shape, small, changed_fraction=changed_fraction)
+
+        # Group neighbouring changed cells into rectangular regions
+        grouped = cv2.dilate(changed, np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(grouped, connectivity=8)
+
+        h, w = shape
+        regions, cores = [], []
+        for left, top, width, height, _ in stats[1:count]:
+            core = (
+                int(left * self.cell_size),
+                int(top * self.cell_size),
+                int(min(w, (left + width) * self.cell_size)),
+                int(min(h, (top + height) * self.cell_size))
+            )
+            cores.append(core)
+            regions.append((
+                max(0, core[0] - self.region_padding),
+                max(0, core[1] - self.region_padding),
+                min(w, core[2] + self.region_padding),
+                min(h, core[3] + self.region_padding)
+            ))
+
+        return ChangePlan(
+            "partial", shape, small, grouped, regions=regions, cores=cores, changed_fraction=changed_fraction
+        )
+
+    def previous_detections(self, camera_id: str) -> np.ndarray:
+        return self._states[camera_id].detections
+
+    @staticmethod
+    def _centers_in(detections: np.ndarray, areas: List[Tuple[int, int, int, int]]) -> np.ndarray:
+        """Boolean mask of detections whose box center lies inside any of the areas"""
+        inside = np.zeros(len(detections), dtype=bool)
+        if not len(detections):
+            return inside
+        cx = (detections[:, 0] + detections[:, 2]) / 2
+        cy = (detections[:, 1] + detections[:, 3]) / 2
+        for x1, y1, x2, y2 in areas:
+            inside |= (cx >= x1) & (cx < x2) & (cy >= y1) & (cy < y2)
+        return inside
+
+    def merge(self, camera_id: str, plan: ChangePlan, region_detections: List[np.ndarray]) -> np.ndarray:
+        """
+        Combine detections of the re-inferred regions (full-frame coordinates)
+        with the previous detections outside them; every box is owned by the
+        core region its center falls in
+        """
+        previous = self.previous_detections(camera_id)
+        fresh = np.concatenate([
+            detections[self._centers_in(detections, [core])]
+            for detections, core in zip(region_detections, plan.cores)
+        ])
+        if len(plan.cores) > 1 and len(fresh):
+            # Bounding rectangles of separate regions can overlap
+            keep = nms(fresh[:, :4] + fresh[:, 5:6] * MAX_WH, fresh[:, 4], settings.IOU_THRESHOLD)
+            fresh = fresh[keep]
+
+        merged = np.concatenate([previous[~self._centers_in(previous, plan.cores)], fresh])
+        order = merged[:, 4].argsort(kind="stable")[::-1]
+        return merged[order]
+
+    def update(self, camera_id: str, plan: ChangePlan, detections: np.ndarray, inferred_fraction: float):
+        """Store the frame's result as the camera's new state and record statistics"""
+        state = self._states.get(camera_id)
+        if plan.mode == "full" or state is None:
+            state = _CameraState(plan.shape, plan.small, detections)
+            self._states[camera_id] = state
+        elif plan.mode == "partial":
+            # Only re-inferred cells get a new reference
+            mask = cv2.resize(
+                plan.changed_cells, (plan.small.shape[1], plan.small.shape[0]), interpolation=cv2.INTER_NEAREST
+            ).astype(bool)
+            state.reference[mask] = plan.small[mask]
+            state.detections = detections
+            state.frames_since_full += 1
+        else:
+            state.frames_since_full += 1
+
+        stats = self._stats.setdefault(
+            camera_id,
+            {"frames": 0, "full": 0, "partial": 0, "skipped": 0, "inferred_fraction_total": 0.0, "last_seen": None}
+        )
+        stats["frames"] += 1
+        stats[plan.mode] += 1
+        stats["inferred_fraction_total"] += inferred_fraction
+        stats["last_seen"] = time.time()
+
+    def get_stats(self) -> dict:
+        """Per-camera counts of full / partial / skipped frames and mean re-inferred fraction"""
+        return {
+            camera_id: {
+                "frames": s["frames"],
+                "full": s["full"],
+                "partial": s["partial"],
+                "skipped": s["skipped"],
+                "avg_inferred_fraction": round(s["inferred_fraction_total"] / s["frames"], 4) if s["frames"] else 0.0
+            }
+            for camera_id, s in self._stats.items()
+        }
+
+    def reset(self, camera_id: str):
+        """Forget a camera's state (e.g. after recalibration)"""
+        self._states.pop(camera_id, None)
+
+    def reset_all(self):
+        """Forget every camera's state (e.g. after a model swap)"""
+        self._states.clear()
+
+# Singleton instance
+change_tracker = ChangeTracker(
+    cell_size=settings.CHANGE_GRID_CELL,
+    pixel_threshold=settings.CHANGE_PIXEL_THRESHOLD,
+    max_changed_fraction=settings.CHANGE_MAX_FRACTION,
+    region_padding=settings.CHANGE_REGION_PADDING,
+    full_refresh_frames=settings.CHANGE_FULL_REFRESH_FRAMES
+)
@@ -0,0 +1,85 @@
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.calibration import CameraCalibration
+from app.models.inference_profile import InferenceParams, InferenceProfile
+
+class DetectionCache:
+    """
+    Bounded LRU cache of detection results keyed by upload content
+
+    The key combines a BLAKE2 digest of the raw uploaded bytes with the model
+    version, the inference params and the camera's calibration/profile
+    revision, so any change that could alter the detections misses.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[Hashable, Tuple[np.ndarray, dict]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(
+        contents: bytes,
+        model_version: str,
+        params: InferenceParams,
+        calibration: Optional[CameraCalibration] = None,
+        profile: Optional[InferenceProfile] = None
+    ) -> Hashable:
+        digest = hashlib.blake2b(contents, digest_size=16).digest()
+        return (
+            digest,
+            model_version,
+            params,
+            calibration.updated_at if calibration else None,
+            profile.updated_at if profile else None
+        )
+
+    def get(self, key: Hashable) -> Optional[Tuple[np.ndarray, dict]]:
+        """Cached (detections, inference info) for key, or None"""
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry
+
+    def put(self, key: Hashable, value: Tuple[np.ndarray, dict]):
+        if not self.enabled:
+            return
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0
+        }
+
+# Singleton instance
+detection_cache = DetectionCache(max_entries=settings.DETECTION_CACHE_SIZE)
@@ -1,17 +1,45 @@
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Sequence
 import logging
+import numpy as np
 from app.models.calibration import CameraCalibration, ParkingRow
 from app.models.empty_space import EmptySpace, DetectionWithRow, ParkingAnalysis
-from app.models.detection import BoundingBox
+from app.models.detection import BoundingBox, DetectionResult
 
 logger = logging.getLogger(__name__)
 
 class EmptySpaceDetector:
-    """Service for detecting empty parking spaces"""
+    """
+    Service for detecting empty parking spaces
+    
+    process_detections() and process_batch() run on box arrays: row assignment,
+    sorting and gap widths are computed for all boxes of all frames at once.
+    assign_to_row() and detect_empty_spaces_in_row() are the per-box
+    equivalents and give the same results.
+    """
     
     def __init__(self, calibration: CameraCalibration):
         self.calibration = calibration
         self.rows = sorted(calibration.rows, key=lambda r: r.row_index)
+        
+        # Row lines as arrays, one entry per row (assign_to_row uses each row's own X boundaries)
+        self._row_y = np.array([row.y_coordinate for row in self.rows], dtype=np.float64)
+        self._row_start_x = np.array([
+            row.start_x if row.start_x is not None else calibration.row_start_x for row in self.rows
+        ], dtype=np.float64)
+        self._row_end_x = np.array([
+            row.end_x if row.end_x is not None else calibration.row_end_x for row in self.rows
+        ], dtype=np.float64)
+        
+        # Detections are grouped by row_index value; per-row space geometry is looked up by that value
+        self._row_indexes, self._row_keys = np.unique(
+            np.array([row.row_index for row in self.rows], dtype=np.int64), return_inverse=True
+        )
+        self._key_bounds = [self.get_row_x_boundaries(int(i)) for i in self._row_indexes]
+        self._key_expected = np.array([self.calculate_expected_space(int(i)) for i in self._row_indexes], dtype=np.float64)
+        self._key_center_y = np.array([
+            self.rows[i if 0 <= i < len(self.rows) else 0].y_coordinate if self.rows else 0
+            for i in self._row_indexes
+        ], dtype=np.float64)
     
     def assign_to_row(self, bbox: BoundingBox) -> Tuple[int, int]:
         """
@@ -301,100 +329,273 @@ class EmptySpaceDetector:
             logger.error(f"Unexpected error detecting empty spaces in row {row_index}: {e}")
             return []
     
-    def process_detections(
+    def assign_rows(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        assign_to_row for an (N, 4) [x1, y1, x2, y2] array of boxes
+        
+        Returns: (N,) positions in self.rows, -1 for invalid boxes and boxes that
+                 intersect no row line within the row's X boundaries
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        positions = np.full(len(boxes), -1, dtype=np.int64)
+        if not self.rows or not len(boxes):
+            return positions
+        
+        x1, y1, x2, y2 = boxes.T
+        valid = (y1 >= 0) & (y2 >= 0) & (y1 < y2)
+        if not valid.all():
+            logger.warning(f"{int((~valid).sum())} bounding box(es) with invalid Y coordinates")
+        
+        center_x = (x1 + x2) / 2
+        center_y = (y1 + y2) / 2
+        hits = (
+            valid[:, None]
+            & (y1[:, None] <= self._row_y) & (self._row_y <= y2[:, None])
+            & (self._row_start_x <= center_x[:, None]) & (center_x[:, None] <= self._row_end_x)
+        )
+        
+        # Tall motor crossing several row lines: the row closest to its center (the first one on a tie)
+        distance = np.where(hits, np.abs(self._row_y - center_y[:, None]), np.inf)
+        assigned = hits.any(axis=1)
+        positions[assigned] = distance.argmin(axis=1)[assigned]
+        return positions
+    
+    def _empty_spaces(
         self,
-        detections: List[BoundingBox],
-        session_id: str
-    ) -> ParkingAnalysis:
+        boxes: np.ndarray,
+        frames: np.ndarray,
+        positions: np.ndarray,
+        frame_count: int
+    ) -> List[List[EmptySpace]]:
         """
-        Main processing function to detect empty spaces
-        Handles edge cases and errors gracefully
+        detect_empty_spaces_in_row for every row of every frame at once
+        
+        boxes: (N, 4) boxes of all frames, frames: (N,) frame of each box,
+        positions: (N,) assign_rows() result
+        Returns: empty spaces per group, group = frame * row key count + row key
         """
+        key_count = len(self._row_indexes)
+        group_count = frame_count * key_count
+        assigned = positions >= 0
+        groups = frames[assigned] * key_count + self._row_keys[positions[assigned]]
+        boxes = boxes[assigned]
+        assigned_counts = np.bincount(groups, minlength=group_count)
+        
+        # Invalid boxes are left out; a row holding only invalid boxes gets no spaces at all
+        x1, y1, x2, y2 = boxes.T
+        valid = (x1 >= 0) & (x2 > x1) & (y1 >= 0) & (y2 > y1)
+        groups, boxes = groups[valid], boxes[valid]
+        
+        # Sort by group, then x1; lexsort is stable, so equal x1 keep their detection order
+        order = np.lexsort((boxes[:, 0], groups))
+        groups, boxes = groups[order], boxes[order]
+        x1, y1, x2, y2 = boxes.T
+        counts = np.bincount(groups, minlength=group_count)
+        rank = np.arange(len(groups)) - (np.cumsum(counts) - counts)[groups]
+        
+        keys = np.arange(group_count) % key_count if key_count else np.zeros(0, dtype=np.int64)
+        expected = self._key_expected[keys]
+        start_x = np.array([bounds[0] for bounds in self._key_bounds], dtype=np.float64)[keys]
+        end_x = np.array([bounds[1] for bounds in self._key_bounds], dtype=np.float64)[keys]
+        
+        # Space height from the average motor height of the row; heights are summed left to
+        # right like sum() does (cumsum is sequential, unlike the pairwise sum of np.sum)
+        padded = np.zeros((group_count, max(1, counts.max(initial=0))))
+        padded[groups, rank] = y2 - y1
+        half_height = np.where(counts > 0, padded.cumsum(axis=1)[:, -1] / np.maximum(counts, 1) / 2, 50)
+        center_y = self._key_center_y[keys]
+        top = np.maximum(0, np.trunc(center_y - half_height)).astype(np.int64).tolist()
+        bottom = np.trunc(center_y + half_height).astype(np.int64).tolist()
+        
+        def capacity(width: np.ndarray, group: np.ndarray) -> List[int]:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(expected[group] > 0, np.trunc(width / expected[group]), 0).astype(np.int64).tolist()
+        
+        spaces: List[List[EmptySpace]] = [[] for _ in range(group_count)]
+        row_indexes = self._row_indexes.tolist()
+        
+        def add(group: int, suffix: str, space_x1: int, space_x2: int, width, can_fit: bool, space_capacity: int):
+            row_index = row_indexes[group % key_count]
+            spaces[group].append(EmptySpace(
+                space_id=f"row{row_index}_{suffix}",
+                row_index=row_index,
+                x1=space_x1,
+                x2=space_x2,
+                y1=top[group],
+                y2=bottom[group],
+                width=width,
+                can_fit_motorcycle=can_fit,
+                motorcycle_capacity=space_capacity
+            ))
+        
+        # Space before the first motorcycle of each row
+        first = rank == 0
+        first_groups = groups[first]
+        width = x1[first] - start_x[first_groups]
+        fits = width >= expected[first_groups]
+        for group, motor_x1, space_width, space_capacity in zip(
+            first_groups[fits].tolist(), x1[first][fits].tolist(), width[fits].tolist(),
+            capacity(width[fits], first_groups[fits])
+        ):
+            add(group, "start", self._key_bounds[group % key_count][0], int(motor_x1), space_width, True, space_capacity)
+        
+        # Gaps between neighbouring motorcycles of the same row
+        left = np.flatnonzero(groups[:-1] == groups[1:])
+        gap_groups = groups[left]
+        gap_x1 = np.trunc(x2[left]).astype(np.int64)
+        gap_x2 = np.trunc(x1[left + 1]).astype(np.int64)
+        gap_width = gap_x2 - gap_x1
+        if (gap_width < 0).any():
+            logger.warning(f"{int((gap_width < 0).sum())} negative gap width(s) detected. Motorcycles may be overlapping.")
+        fits = (gap_width >= 0) & (gap_width >= expected[gap_groups])
+        for group, position, space_x1, space_x2, space_width, space_capacity in zip(
+            gap_groups[fits].tolist(), rank[left][fits].tolist(), gap_x1[fits].tolist(), gap_x2[fits].tolist(),
+            gap_width[fits].tolist(), capacity(gap_width[fits], gap_groups[fits])
+        ):
+            add(group, f"space{position}", space_x1, space_x2, space_width, True, space_capacity)
+        
+        # Space after the last motorcycle of each row
+        last = rank == counts[groups] - 1
+        last_groups = groups[last]
+        width = end_x[last_groups] - x2[last]
+        fits = width >= expected[last_groups]
+        for group, motor_x2, space_width, space_capacity in zip(
+            last_groups[fits].tolist(), x2[last][fits].tolist(), width[fits].tolist(),
+            capacity(width[fits], last_groups[fits])
+        ):
+            add(group, "end", int(motor_x2), self._key_bounds[group % key_count][1], space_width, True, space_capacity)
+        
+        # Rows without motorcycles are one empty space over their full width
+        for group in np.flatnonzero(assigned_counts == 0).tolist():
+            row_start_x, row_end_x = self._key_bounds[group % key_count]
+            row_width = row_end_x - row_start_x
+            row_expected = float(expected[group])
+            add(
+                group, "full", row_start_x, row_end_x, row_width, row_width >= row_expected,
+                int(row_width / row_expected) if row_expected > 0 else 0
+            )
+        
+        return spaces
+    
+    def _analyze(
+        self,
+        boxes: np.ndarray,
+        frames: np.ndarray,
+        confidences: List[float],
+        class_names: List[str],
+        session_ids: List[str]
+    ) -> List[ParkingAnalysis]:
+        """Row assignment and empty spaces for the boxes of one or more frames (frames: (N,) frame of each box)"""
         try:
-            # Assign detections to rows
-            detections_with_rows = []
-            detections_by_row: Dict[int, List[BoundingBox]] = {}
+            positions = self.assign_rows(boxes)
+            spaces = self._empty_spaces(boxes, frames, positions, len(session_ids))
             
-            for det in detections:
-                try:
-                    row_index, row_y = self.assign_to_row(det)
-                    
-                    # Skip motor if not within tolerance of any row
-                    if row_index == -1:
-                        logger.debug(f"Skipping motor at Y={det.y1}-{det.y2} (not within tolerance of any row)")
-                        continue
-                    
-                    detections_with_rows.append(DetectionWithRow(
-                        bbox={
-                            "x1": det.x1,
-                            "y1": det.y1,
-                            "x2": det.x2,
-                            "y2": det.y2
-                        },
-                        confidence=det.confidence,
-                        class_name=det.class_name,
-                        assigned_row=row_index,
-                        row_y_coordinate=row_y
-                    ))
-                    
-                    if row_index not in detections_by_row:
-                        detections_by_row[row_index] = []
-                    detections_by_row[row_index].append(det)
-                except Exception as e:
-                    logger.warning(f"Error assigning detection to row: {e}. Skipping detection.")
+            detections_with_rows: List[List[DetectionWithRow]] = [[] for _ in session_ids]
+            for frame, position, (x1, y1, x2, y2), confidence, class_name in zip(
+                frames.tolist(), positions.tolist(), boxes.tolist(), confidences, class_names
+            ):
+                # Skip motor if not within tolerance of any row
+                if position < 0:
                     continue
-        
-            # Detect empty spaces in each row
-            all_empty_spaces = []
-            empty_spaces_per_row = {}
+                row = self.rows[position]
+                detections_with_rows[frame].append(DetectionWithRow(
+                    bbox={"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+                    confidence=confidence,
+                    class_name=class_name,
+                    assigned_row=row.row_index,
+                    row_y_coordinate=row.y_coordinate
+                ))
             
-            for row in self.rows:
-                try:
-                    row_detections = detections_by_row.get(row.row_index, [])
-                    row_empty_spaces = self.detect_empty_spaces_in_row(
-                        row_detections,
-                        row.row_index
-                    )
+            key_count = len(self._row_indexes)
+            row_keys = self._row_keys.tolist()
+            analyses = []
+            for frame, session_id in enumerate(session_ids):
+                all_empty_spaces = []
+                empty_spaces_per_row = {}
+                for row, key in zip(self.rows, row_keys):
+                    row_empty_spaces = spaces[frame * key_count + key]
                     all_empty_spaces.extend(row_empty_spaces)
                     empty_spaces_per_row[row.row_index] = len(row_empty_spaces)
-                except Exception as e:
-                    logger.error(f"Error detecting empty spaces in row {row.row_index}: {e}")
-                    empty_spaces_per_row[row.row_index] = 0
-                    continue
-            
-            # Calculate occupancy metrics
-            total_motorcycles = len(detections_with_rows)
-            total_empty_spaces = len(all_empty_spaces)
-            total_spaces = total_motorcycles + total_empty_spaces
-            
-            # Handle division by zero
-            if total_spaces > 0:
-                occupancy_rate = (total_motorcycles / total_spaces * 100)
-            else:
-                logger.warning("No spaces detected (motorcycles + empty spaces = 0)")
-                occupancy_rate = 0.0
-            
-            return ParkingAnalysis(
-                session_id=session_id,
-                camera_id=self.calibration.camera_id,
-                detections=detections_with_rows,
-                empty_spaces=all_empty_spaces,
-                total_motorcycles=total_motorcycles,
-                total_empty_spaces=total_empty_spaces,
-                empty_spaces_per_row=empty_spaces_per_row,
-                parking_occupancy_rate=round(occupancy_rate, 2)
-            )
+                
+                # Calculate occupancy metrics
+                total_motorcycles = len(detections_with_rows[frame])
+                total_empty_spaces = len(all_empty_spaces)
+                total_spaces = total_motorcycles + total_empty_spaces
+                
+                # Handle division by zero
+                if total_spaces > 0:
+                    occupancy_rate = (total_motorcycles / total_spaces * 100)
+                else:
+                    logger.warning("No spaces detected (motorcycles + empty spaces = 0)")
+                    occupancy_rate = 0.0
+                
+                analyses.append(ParkingAnalysis(
+                    session_id=session_id,
+                    camera_id=self.calibration.camera_id,
+                    detections=detections_with_rows[frame],
+                    empty_spaces=all_empty_spaces,
+                    total_motorcycles=total_motorcycles,
+                    total_empty_spaces=total_empty_spaces,
+                    empty_spaces_per_row=empty_spaces_per_row,
+                    parking_occupancy_rate=round(occupancy_rate, 2)
+                ))
+            return analyses
         
         except Exception as e:
             logger.error(f"Critical error in process_detections: {e}")
             # Return minimal valid analysis
-            return ParkingAnalysis(
-                session_id=session_id,
-                camera_id=self.calibration.camera_id,
-                detections=[],
-                empty_spaces=[],
-                total_motorcycles=0,
-                total_empty_spaces=0,
-                empty_spaces_per_row={},
-                parking_occupancy_rate=0.0
-            )
+            return [
+                ParkingAnalysis(
+                    session_id=session_id,
+                    camera_id=self.calibration.camera_id,
+                    detections=[],
+                    empty_spaces=[],
+                    total_motorcycles=0,
+                    total_empty_spaces=0,
+                    empty_spaces_per_row={},
+                    parking_occupancy_rate=0.0
+                )
+                for session_id in session_ids
+            ]
+    
+    def process_detections(
+        self,
+        detections: List[BoundingBox],
+        session_id: str
+    ) -> ParkingAnalysis:
+        """
+        Main processing function to detect empty spaces
+        Handles edge cases and errors gracefully
+        """
+        boxes = np.array([(d.x1, d.y1, d.x2, d.y2) for d in detections], dtype=np.float64).reshape(-1, 4)
+        return self._analyze(
+            boxes,
+            np.zeros(len(detections), dtype=np.int64),
+            [d.confidence for d in detections],
+            [d.class_name for d in detections],
+            [session_id]
+        )[0]
+    
+    def process_batch(
+        self,
+        results: Sequence[DetectionResult],
+        session_id: str
+    ) -> List[ParkingAnalysis]:
+        """
+        process_detections for several frames of this calibration in one pass
+        (e.g. the sampled frames of a video segment)
+        
+        Returns: one analysis per frame, in order
+        """
+        if not results:
+            return []
+        
+        boxes = np.concatenate([result.boxes for result in results]).astype(np.float64)
+        frames = np.repeat(np.arange(len(results)), [result.count for result in results])
+        confidences = [confidence for result in results for confidence in result.scores.tolist()]
+        # Same names as DetectionResult.to_bounding_boxes() gives
+        class_names = [
+            next(iter(result.names.values())) if len(result.names) == 1 else result.names[class_id]
+            for result in results for class_id in result.class_ids.tolist()
+        ]
+        return self._analyze(boxes, frames, confidences, class_names, [session_id] * len(results))
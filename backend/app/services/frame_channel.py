@@ -0,0 +1,255 @@
+"""
+Persistent WebSocket ingestion for cameras
+
+A camera keeps one authenticated connection open and sends every frame as a
+binary message: a 2-byte big-endian header length, a JSON header
+({"session_id", "camera_id", "timestamp", "seq"}) and the encoded image.
+session_id and camera_id may instead be given once as connection defaults.
+Compact results come back as JSON text messages, in frame order.
+
+Frames wait in a small bounded queue and are processed one at a time, so a
+camera's frames stay ordered for change and keyframe tracking. When the
+server falls behind and the queue is full, the oldest waiting frame is
+dropped (and reported as such), or with the "block" policy the socket is not
+read until a slot frees up, which pushes back on the sender through TCP
+flow control.
+"""
+import asyncio
+import json
+import logging
+import math
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.core.config import settings
+from app.services.frame_processor import frame_processor, FrameError
+
+logger = logging.getLogger(__name__)
+
+HEADER_LENGTH = struct.Struct(">H")
+OVERFLOW_POLICIES = ("drop_oldest", "block")
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """
+    Capture time from a frame header: Unix seconds or an ISO 8601 string
+    Returns: naive UTC datetime (None if not given); raises ValueError otherwise
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value):
+            raise ValueError("timestamp must be finite")
+        try:
+            return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError("timestamp out of range")
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError("timestamp must be Unix seconds or ISO 8601")
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    raise ValueError("timestamp must be Unix seconds or ISO 8601")
+
+def parse_frame_message(message: bytes, defaults: Dict[str, Optional[str]]) -> Tuple[dict, memoryview]:
+    """
+    Split a binary frame message into its header (connection defaults
+    overridden by the message's own fields) and a view of the image bytes
+    The header gains "captured_at", the parsed timestamp
+    Raises ValueError for malformed messages
+    """
+    if len(message) < HEADER_LENGTH.size:
+        raise ValueError("Message too short")
+    (length,) = HEADER_LENGTH.unpack_from(message)
+    end = HEADER_LENGTH.size + length
+    if len(message) < end:
+        raise ValueError("Truncated header")
+
+    header = dict(defaults)
+    if length:
+        try:
+            fields = json.loads(message[HEADER_LENGTH.size:end])
+        except ValueError:
+            raise ValueError("Header is not valid JSON")
+        if not isinstance(fields, dict):
+            raise ValueError("Header must be a JSON object")
+        header.update({key: value for key, value in fields.items() if value is not None})
+
+    if not header.get("session_id"):
+        raise ValueError("Missing session_id")
+    if not isinstance(header["session_id"], str):
+        raise ValueError("session_id must be a string")
+    if header.get("camera_id") is not None and not isinstance(header["camera_id"], str):
+        raise ValueError("camera_id must be a string")
+    seq = header.get("seq")
+    if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int)):
+        raise ValueError("seq must be an integer")
+    header["captured_at"] = parse_timestamp(header.get("timestamp"))
+    image = memoryview(message)[end:]
+    if not len(image):
+        raise ValueError("Empty image")
+    return header, image
+
+def compact_result(response: dict, header: dict) -> dict:
+    """
+    Upload response reduced to what a camera client needs: boxes as
+    [x1, y1, x2, y2, confidence, class_name] lists and the occupancy summary
+    """
+    result = {
+        "seq": header.get("seq"),
+        "timestamp": header.get("timestamp"),
+        "session_id": response["session_id"]
+    }
+    if response.get("skipped"):
+        result["skipped"] = True
+        result["reason"] = response["quality"]["reason"]
+        return result
+
+    result.update({
+        "frame_id": response["frame_id"],
+        "count": response["detection_count"],
+        "is_best": response["is_best"],
+        "boxes": [
+            [round(d["x1"], 1), round(d["y1"], 1), round(d["x2"], 1), round(d["y2"], 1),
+             round(d["confidence"], 3), d["class_name"]]
+            for d in response["detections"]
+        ]
+    })
+    analysis = response.get("parking_analysis")
+    if analysis:
+        result["occupancy"] = {
+            "motorcycles": analysis["total_motorcycles"],
+            "empty_spaces": analysis["total_empty_spaces"],
+            "empty_spaces_per_row": analysis["empty_spaces_per_row"],
+            "rate": analysis["parking_occupancy_rate"]
+        }
+    return result
+
+class _QueuedFrame:
+    __slots__ = ("header", "image", "received_at")
+
+    def __init__(self, header: dict, image: memoryview, received_at: float):
+        self.header = header
+        self.image = image
+        self.received_at = received_at
+
+class FrameChannelHub:
+    """Serves camera WebSocket connections and keeps their ingestion statistics"""
+
+    def __init__(self, max_pending: int, overflow_policy: str):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown WS_OVERFLOW_POLICY {overflow_policy!r}, expected one of {OVERFLOW_POLICIES}")
+        self.max_pending = max(1, max_pending)
+        self.overflow_policy = overflow_policy
+        self._connections = 0
+        self._received = 0
+        self._processed = 0
+        self._dropped = 0
+        self._errors = 0
+
+    async def serve(self, websocket: WebSocket, defaults: Dict[str, Optional[str]]):
+        """Receive and process frames of an accepted connection until the client disconnects"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        send_lock = asyncio.Lock()
+
+        async def send(message: dict):
+            async with send_lock:
+                await websocket.send_json(message)
+
+        self._connections += 1
+        # Whichever side stops first (client gone, or a send to it failed) ends the
+        # connection; the other one would otherwise wait forever on the queue
+        receiver = asyncio.create_task(self._receive_loop(websocket, queue, defaults, send))
+        worker = asyncio.create_task(self._process_loop(queue, send))
+        try:
+            done, _ = await asyncio.wait((receiver, worker), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is not None and not isinstance(error, WebSocketDisconnect):
+                    logger.info(f"WebSocket connection closed: {error!r}")
+        finally:
+            self._connections -= 1
+            for task in (receiver, worker):
+                task.cancel()
+            await asyncio.gather(receiver, worker, return_exceptions=True)
+
+    async def _receive_loop(self, websocket: WebSocket, queue: asyncio.Queue, defaults: dict, send):
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data is None:
+                await send({"error": "Frames must be sent as binary messages", "status_code": 400})
+                continue
+
+            self._received += 1
+            if len(data) > settings.MAX_UPLOAD_BYTES:
+                self._errors += 1
+                await send({"error": f"Frame exceeds {settings.MAX_UPLOAD_BYTES} bytes", "status_code": 413})
+                continue
+            try:
+                header, image = parse_frame_message(data, defaults)
+            except ValueError as e:
+                self._errors += 1
+                await send({"error": str(e), "status_code": 400})
+                continue
+
+            frame = _QueuedFrame(header, image, time.perf_counter())
+            if queue.full() and self.overflow_policy == "drop_oldest":
+                # A live camera is better served by its newest frame than by a backlog
+                stale = queue.get_nowait()
+                self._dropped += 1
+                await send({"seq": stale.header.get("seq"), "timestamp": stale.header.get("timestamp"),
+                            "session_id": stale.header["session_id"], "dropped": True})
+            # With the block policy this waits, and the socket is not read meanwhile
+            await queue.put(frame)
+
+    async def _process_loop(self, queue: asyncio.Queue, send):
+        while True:
+            frame = await queue.get()
+            header = frame.header
+            try:
+                response = await frame_processor.process(
+                    frame.image, header["session_id"], header.get("camera_id"), captured_at=header["captured_at"]
+                )
+                result = compact_result(response, header)
+                self._processed += 1
+            except FrameError as e:
+                self._errors += 1
+                result = {"seq": header.get("seq"), "session_id": header["session_id"],
+                          "error": e.detail, "status_code": e.status_code}
+            except Exception as e:
+                # Keep the connection alive; the camera simply loses this frame
+                logger.error(f"Error processing WebSocket frame: {str(e)}", exc_info=True)
+                self._errors += 1
+                result = {"seq": header.get("seq"), "session_id": header["session_id"],
+                          "error": "Error processing frame", "status_code": 500}
+
+            result["latency_ms"] = round((time.perf_counter() - frame.received_at) * 1000, 1)
+            # Frames still waiting, so clients can slow down before frames get dropped
+            result["pending"] = queue.qsize()
+            await send(result)
+
+    def get_stats(self) -> dict:
+        return {
+            "connections": self._connections,
+            "max_pending": self.max_pending,
+            "overflow_policy": self.overflow_policy,
+            "received_frames": self._received,
+            "processed_frames": self._processed,
+            "dropped_frames": self._dropped,
+            "errors": self._errors
+        }
+
+# Singleton instance
+frame_channels = FrameChannelHub(
+    max_pending=settings.WS_MAX_PENDING_FRAMES,
+    overflow_policy=settings.WS_OVERFLOW_POLICY
+)
@@ -0,0 +1,651 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from pymongo import InsertOne, UpdateOne
+
+from app.core.config import settings
+from app.db.mongodb import get_database
+from app.models.calibration import CameraCalibration
+from app.models.detection import FrameDetection
+from app.models.inference_profile import InferenceProfile, InferenceParams
+from app.services.yolo_service import yolo_service
+from app.services.inference_batcher import inference_batcher
+from app.services.calibration_service import calibration_service
+from app.services.inference_profile_service import inference_profile_service
+from app.services.change_tracker import change_tracker
+from app.services.detection_cache import detection_cache
+from app.services.keyframe_tracker import keyframe_tracker
+from app.services.frame_quality import frame_quality_gate
+from app.services.image_decoder import read_image_size, reduction_factor, decode_image
+from app.services.yolo_processing import scale_detections, translate_detections
+from app.services.empty_space_detector import EmptySpaceDetector
+from app.services.visualization_service import visualization_service
+
+logger = logging.getLogger(__name__)
+
+class FrameError(Exception):
+    """A frame that cannot be processed, with the HTTP status the API answers with"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def _decode_image(contents: bytes, factor: int = 1) -> np.ndarray:
+    """Decode uploaded image bytes to a BGR array (JPEGs at 1/factor resolution)"""
+    image = decode_image(contents, factor)
+    if image is None:
+        raise FrameError(400, "Invalid image")
+    return image
+
+def _check_image_size(contents: bytes) -> Optional[Tuple[int, int]]:
+    """(height, width) from the image header; FrameError 413 for images above MAX_IMAGE_PIXELS"""
+    size = read_image_size(contents)
+    if size and size[0] * size[1] > settings.MAX_IMAGE_PIXELS:
+        raise FrameError(413, f"Image too large: {size[1]}x{size[0]} exceeds {settings.MAX_IMAGE_PIXELS} pixels")
+    return size
+
+def _inference_roi(
+    calibration: Optional[CameraCalibration],
+    profile: Optional[InferenceProfile],
+    shape: Tuple[int, int]
+) -> Optional[Tuple[int, int, int, int]]:
+    """Calibrated parking area to restrict inference to, if enabled for the camera"""
+    roi_enabled = settings.ROI_INFERENCE_ENABLED
+    if profile and profile.roi_enabled is not None:
+        roi_enabled = profile.roi_enabled
+    if not calibration or not roi_enabled:
+        return None
+    return calibration_service.get_inference_roi(
+        calibration,
+        shape,
+        row_margin=profile.roi_row_margin if profile else None,
+        padding=profile.roi_padding if profile else None
+    )
+
+async def decode_factor(
+    size: Optional[Tuple[int, int]],
+    calibration: Optional[CameraCalibration],
+    profile: Optional[InferenceProfile],
+    params: InferenceParams
+) -> int:
+    """
+    DCT scale factor (1, 2, 4 or 8) to decode an upload at: the largest one that
+    keeps the inferred area (calibration ROI or whole frame) at least as large
+    as the model input size. Tiled cameras always decode at full resolution.
+    """
+    if not settings.REDUCED_DECODE_ENABLED or size is None or (calibration and calibration.tile_size):
+        return 1
+    
+    roi = _inference_roi(calibration, profile, size)
+    covered_side = max(roi[2] - roi[0], roi[3] - roi[1]) if roi else max(size)
+    target_side = params.imgsz
+    if not target_side:
+        backend = yolo_service.loaded_backend(params.model_path, params.backend)
+        if backend is None:
+            # First frame of a profile model: load it off the event loop, inference needs it next anyway
+            backend, _ = await asyncio.get_running_loop().run_in_executor(
+                None, yolo_service.get_backend, params.model_path, params.backend
+            )
+        target_side = backend.input_size
+    return reduction_factor(covered_side, target_side)
+
+def _original_shape(image: np.ndarray, size: Optional[Tuple[int, int]], factor: int) -> Tuple[int, int]:
+    """(h, w) of the upload at full resolution"""
+    if factor == 1 or size is None:
+        return image.shape[:2]
+    h, w = size
+    # The decoder applies EXIF rotation, the header size does not
+    if h != w and (image.shape[0] > image.shape[1]) != (h > w):
+        h, w = w, h
+    return h, w
+
+async def _detect_regions(
+    image: np.ndarray,
+    regions: List[Tuple[int, int, int, int]],
+    params: InferenceParams,
+    calibration: Optional[CameraCalibration],
+    factor: int = 1
+) -> Tuple[List[np.ndarray], str, Optional[dict]]:
+    """
+    Detect on crops (x1, y1, x2, y2) of a frame, through the model cascade when enabled
+    Regions are in original coordinates; image may be decoded at 1/factor resolution
+    Returns: (one (N, 6) array per crop in crop coordinates, model version, cascade info)
+    """
+    if factor == 1:
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+    else:
+        crops = [
+            image[y1 // factor:-(-y2 // factor), x1 // factor:-(-x2 // factor)]
+            for x1, y1, x2, y2 in regions
+        ]
+    
+    async def detect_crops(indices: List[int], crop_params: InferenceParams) -> Tuple[List[np.ndarray], str]:
+        arrays, version = await inference_batcher.detect_many([crops[i] for i in indices], crop_params)
+        if factor > 1:
+            # Back to original scale, relative to the region (crops start on a factor-aligned pixel)
+            arrays = [
+                translate_detections(
+                    scale_detections(array, factor),
+                    regions[i][0] // factor * factor - regions[i][0],
+                    regions[i][1] // factor * factor - regions[i][1]
+                )
+                for i, array in zip(indices, arrays)
+            ]
+        return arrays, version
+    
+    small_params = yolo_service.cascade_params(params)
+    if small_params is None:
+        arrays, model_version = await detect_crops(list(range(len(regions))), params)
+        return arrays, model_version, None
+    
+    arrays, small_version = await detect_crops(list(range(len(regions))), small_params)
+    escalate = [
+        i for i, (array, (x1, y1, _, _)) in enumerate(zip(arrays, regions))
+        if yolo_service.is_uncertain(translate_detections(array, x1, y1), calibration)
+    ]
+    arrays = [yolo_service.accept_small(array, params) for array in arrays]
+    model_version = small_version
+    
+    if escalate:
+        escalated, model_version = await detect_crops(escalate, params)
+        for i, array in zip(escalate, escalated):
+            arrays[i] = array
+        if len(escalate) < len(regions):
+            model_version = f"{small_version}+{model_version}"
+    
+    yolo_service.record_cascade(len(regions), len(escalate))
+    cascade_info = {
+        "path": "escalated" if escalate else "small",
+        "regions": len(regions),
+        "escalated_regions": len(escalate)
+    }
+    return arrays, model_version, cascade_info
+
+async def detect_frame(
+    image: np.ndarray,
+    camera_id: Optional[str],
+    calibration: Optional[CameraCalibration],
+    profile: Optional[InferenceProfile],
+    params: InferenceParams,
+    shape: Optional[Tuple[int, int]] = None,
+    factor: int = 1
+) -> Tuple[np.ndarray, str, dict]:
+    """
+    Run detection on a frame using the camera's tiles, ROI and change tracking
+    shape is the original (h, w) when image was decoded at 1/factor resolution
+    Returns: (compact (N, 6) detection array in original frame coordinates, model version, response info)
+    """
+    shape = shape or image.shape[:2]
+    
+    # Split high-resolution frames into tiles if the camera is configured for it
+    tiles = None
+    if calibration and calibration.tile_size:
+        tiles = yolo_service.plan_tiles(
+            shape, calibration.tile_size, calibration.tile_overlap, calibration
+        )
+    
+    # Otherwise restrict inference to the calibrated parking area when possible
+    roi = _inference_roi(calibration, profile, shape) if tiles is None else None
+    
+    # Compare with the camera's previous frame to re-infer only what changed
+    change_plan = None
+    if camera_id and settings.CHANGE_DETECTION_ENABLED:
+        change_plan = change_tracker.plan(camera_id, image, roi, shape)
+        if change_plan.mode == "partial" and tiles is not None and any(
+            x2 - x1 > calibration.tile_size or y2 - y1 > calibration.tile_size
+            for x1, y1, x2, y2 in change_plan.regions
+        ):
+            # Regions larger than a tile would lose the resolution tiling is meant to keep
+            change_plan.mode = "full"
+    
+    # Detect objects
+    if change_plan and change_plan.mode == "skipped":
+        detection_array = change_tracker.previous_detections(camera_id)
+        model_version = yolo_service.model_version
+        cascade_info = None
+        inferred_area = 0
+        logger.info("No change since previous frame, reusing detections")
+    elif change_plan and change_plan.mode == "partial":
+        regions = change_plan.regions
+        region_arrays, model_version, cascade_info = await _detect_regions(
+            image, regions, params, calibration, factor
+        )
+        region_arrays = [
+            translate_detections(array, x1, y1) for array, (x1, y1, _, _) in zip(region_arrays, regions)
+        ]
+        detection_array = change_tracker.merge(camera_id, change_plan, region_arrays)
+        inferred_area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+        logger.info(f"Partial re-inference: {len(regions)} changed region(s)")
+    elif tiles is not None:
+        tile_arrays, model_version, cascade_info = await _detect_regions(image, tiles, params, calibration, factor)
+        detection_array = yolo_service.merge_tiles(tile_arrays, tiles, params.max_det)
+        inferred_area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in tiles)
+        logger.info(f"Tiled inference: {len(tiles)} tile(s) of {calibration.tile_size}px")
+    elif roi:
+        x1, y1, x2, y2 = roi
+        (detection_array,), model_version, cascade_info = await _detect_regions(
+            image, [roi], params, calibration, factor
+        )
+        detection_array = translate_detections(detection_array, x1, y1)
+        inferred_area = (x2 - x1) * (y2 - y1)
+        logger.info(f"Inference ROI: {roi}")
+    else:
+        full_frame = (0, 0, shape[1], shape[0])
+        (detection_array,), model_version, cascade_info = await _detect_regions(
+            image, [full_frame], params, calibration, factor
+        )
+        inferred_area = shape[0] * shape[1]
+    
+    # Tiles overlap, so the inferred area can exceed the frame
+    reinferred_fraction = min(1.0, inferred_area / (shape[0] * shape[1]))
+    if change_plan:
+        change_tracker.update(camera_id, change_plan, detection_array, reinferred_fraction)
+    
+    info = {}
+    if factor > 1:
+        info["decode_factor"] = factor
+    if tiles is not None:
+        info["inference_tiles"] = len(tiles)
+    if roi:
+        info["inference_roi"] = {"x1": roi[0], "y1": roi[1], "x2": roi[2], "y2": roi[3]}
+    if cascade_info:
+        info["cascade"] = cascade_info
+    if change_plan:
+        info["change_detection"] = {
+            "mode": change_plan.mode,
+            "changed_fraction": round(change_plan.changed_fraction, 4),
+            "reinferred_fraction": round(reinferred_fraction, 4)
+        }
+    
+    return detection_array, model_version, info
+
+class FrameResult:
+    """Detections and empty-space analysis of one frame, before it is folded into its session"""
+    __slots__ = (
+        "session_id", "camera_id", "contents", "image", "factor", "calibration", "model_version",
+        "inference_info", "cache_hit", "quality", "skipped", "detections", "count", "parking_analysis",
+        "captured_at"
+    )
+
+    def __init__(self, session_id: str, camera_id: Optional[str], contents, captured_at: Optional[datetime] = None):
+        self.session_id = session_id
+        self.camera_id = camera_id
+        self.contents = contents
+        # Capture time reported by the camera; the frame is stored with the receive time otherwise
+        self.captured_at = captured_at
+        self.image: Optional[np.ndarray] = None
+        self.factor = 1
+        self.calibration: Optional[CameraCalibration] = None
+        self.model_version: Optional[str] = None
+        self.inference_info: dict = {}
+        self.cache_hit = False
+        self.quality: Optional[dict] = None
+        self.skipped = False
+        self.detections = []
+        self.count = 0
+        self.parking_analysis = None
+
+class FrameProcessor:
+    """
+    Detection pipeline behind the upload routes
+
+    detect() turns an encoded frame into detections and its empty-space
+    analysis; the result is then folded into its detection session (recent
+    frames, best frame, parking analysis). process() does both for a single
+    frame, process_many() for frames of several cameras and sessions with a
+    single bulk session write.
+    """
+
+    async def detect(
+        self,
+        contents,
+        session_id: str,
+        camera_id: Optional[str],
+        image: Optional[np.ndarray] = None,
+        captured_at: Optional[datetime] = None
+    ) -> FrameResult:
+        """
+        Detect on one frame
+        contents: encoded image (bytes, or a memoryview of a pooled upload buffer)
+        image: already decoded frame (stream pullers) instead of contents; not cached
+        captured_at: capture time reported by the camera (naive UTC)
+        Raises FrameError for frames that cannot be processed
+        """
+        frame = FrameResult(session_id, camera_id, contents, captured_at)
+        try:
+            # Oversized uploads are rejected from the header, before anything is decoded
+            image_size = _check_image_size(contents) if image is None else None
+            
+            calibration = await calibration_service.get_calibration(camera_id) if camera_id else None
+            profile = await inference_profile_service.get_profile(camera_id) if camera_id else None
+            params = inference_profile_service.resolve_params(profile)
+            frame.calibration = calibration
+            
+            # Identical bytes (client retries, cameras that did not refresh) skip decode and inference
+            cache_key = None
+            if image is None:
+                cache_key = detection_cache.make_key(contents, yolo_service.model_version, params, calibration, profile)
+            cached = detection_cache.get(cache_key) if cache_key else None
+            
+            # A repeat of the camera's previous upload is gated without decoding it,
+            # so a frozen camera re-sending the same JPEG is caught before the cache answers
+            if cached is not None and settings.QUALITY_GATE_ENABLED and camera_id:
+                frame.quality = frame_quality_gate.check_repeat(camera_id, cache_key)
+            
+            if cached is None or (settings.QUALITY_GATE_ENABLED and frame.quality is None):
+                if image is None:
+                    # JPEGs are decoded straight to the smallest resolution the model still needs
+                    factor = await decode_factor(image_size, calibration, profile, params)
+                    image = await asyncio.get_running_loop().run_in_executor(None, _decode_image, contents, factor)
+                    shape = _original_shape(image, image_size, factor)
+                    logger.info(f"Image loaded: {image.shape}" + (f" (1/{factor} of {shape})" if factor > 1 else ""))
+                else:
+                    factor, shape = 1, image.shape[:2]
+                frame.image, frame.factor = image, factor
+                if settings.QUALITY_GATE_ENABLED:
+                    frame.quality = frame_quality_gate.check(image, camera_id, cache_key)
+            
+            # Dark, blurred, obscured or frozen frames would only waste an inference
+            # and must never replace the session's best frame
+            if frame.quality and not frame.quality["ok"]:
+                logger.info(f"Frame failed quality gate: {frame.quality['reason']}")
+                if settings.QUALITY_GATE_ACTION == "reject":
+                    raise FrameError(422, f"Frame rejected by quality gate: {frame.quality['reason']}")
+                frame.skipped = True
+                return frame
+            
+            if cached is not None:
+                frame.cache_hit = True
+                detection_array, model_version, inference_info = cached
+                logger.info("Detection cache hit")
+            else:
+                # Continuous cameras can run the detector on keyframes only and track boxes in between
+                keyframe_interval = settings.KEYFRAME_INTERVAL
+                if profile and profile.keyframe_interval:
+                    keyframe_interval = profile.keyframe_interval
+                use_keyframes = camera_id is not None and keyframe_interval > 1
+                
+                tracked = keyframe_tracker.track(camera_id, image, keyframe_interval, shape) if use_keyframes else None
+                if tracked is not None:
+                    detection_array, model_version, keyframe_info = tracked
+                    inference_info = {"keyframe": keyframe_info}
+                else:
+                    detection_array, model_version, inference_info = await detect_frame(
+                        image, camera_id, calibration, profile, params, shape, factor
+                    )
+                    # Change detection info describes this upload only; tracked frames are never cached
+                    if cache_key:
+                        detection_cache.put(
+                            cache_key,
+                            (detection_array, model_version, {k: v for k, v in inference_info.items() if k != "change_detection"})
+                        )
+                    if use_keyframes:
+                        inference_info["keyframe"] = keyframe_tracker.set_keyframe(
+                            camera_id, image, detection_array, model_version, shape
+                        )
+            
+            result = yolo_service.to_result(detection_array)
+            frame.count = result.count
+            frame.model_version = model_version
+            frame.inference_info = inference_info
+            logger.info(f"Detections: {frame.count}")
+        except FrameError:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing frame: {str(e)}", exc_info=True)
+            raise FrameError(500, f"Error processing image: {str(e)}")
+        
+        # Pydantic boxes are only needed from here on (row assignment, storage, response)
+        frame.detections = result.to_bounding_boxes()
+        
+        # Process with calibration if camera_id provided
+        if camera_id:
+            if calibration:
+                try:
+                    detector = EmptySpaceDetector(calibration)
+                    frame.parking_analysis = detector.process_detections(frame.detections, session_id)
+                except Exception as e:
+                    # Log error but continue with basic detection
+                    logger.warning(f"Error processing empty spaces for camera {camera_id}: {e}")
+            else:
+                # No calibration found - skip empty space detection
+                logger.info(f"No calibration found for camera {camera_id}, skipping empty space detection")
+        
+        return frame
+
+    async def process(
+        self,
+        contents,
+        session_id: str,
+        camera_id: Optional[str] = None,
+        image: Optional[np.ndarray] = None,
+        captured_at: Optional[datetime] = None
+    ) -> dict:
+        """Detect on one frame and update its session; returns the upload response"""
+        frame = await self.detect(contents, session_id, camera_id, image, captured_at)
+        if frame.skipped:
+            return self._skipped_response(frame)
+        
+        db = get_database()
+        session = await db.detection_sessions.find_one({"session_id": session_id})
+        changes, frame_id, is_best = self._session_changes(session, frame)
+        if session is None:
+            await db.detection_sessions.insert_one(changes)
+        else:
+            await db.detection_sessions.update_one({"session_id": session_id}, {"$set": changes})
+        
+        return self._response(frame, frame_id, is_best)
+
+    async def process_many(self, items: List[Tuple[object, str, Optional[str]]]) -> List[dict]:
+        """
+        Detect on several (contents, session_id, camera_id) frames at once
+        Frames of different cameras are decoded and detected concurrently so
+        they share inference batches; frames of the same camera stay in order
+        (change and keyframe tracking). All session changes are written with
+        one bulk operation.
+        Returns: one upload response per frame, in order; failed frames get
+                 {"session_id", "error", "status_code"}
+        """
+        outcomes: List[object] = [None] * len(items)
+        by_camera: Dict[object, List[int]] = defaultdict(list)
+        for i, (_, _, camera_id) in enumerate(items):
+            by_camera[camera_id if camera_id else i].append(i)
+        
+        async def run_camera(indices: List[int]):
+            for i in indices:
+                try:
+                    outcomes[i] = await self.detect(*items[i])
+                except FrameError as e:
+                    outcomes[i] = e
+        
+        await asyncio.gather(*(run_camera(indices) for indices in by_camera.values()))
+        
+        frames = [outcome for outcome in outcomes if isinstance(outcome, FrameResult) and not outcome.skipped]
+        db = get_database()
+        sessions = {}
+        if frames:
+            cursor = db.detection_sessions.find({"session_id": {"$in": list({f.session_id for f in frames})}})
+            sessions = {session["session_id"]: session async for session in cursor}
+        existing = set(sessions)
+        
+        # Sessions are updated in memory frame by frame, then written once
+        updates: Dict[str, dict] = {}
+        responses = []
+        for (_, session_id, _), outcome in zip(items, outcomes):
+            if isinstance(outcome, FrameError):
+                responses.append({"session_id": session_id, "error": outcome.detail, "status_code": outcome.status_code})
+                continue
+            if outcome.skipped:
+                responses.append(self._skipped_response(outcome))
+                continue
+            
+            session = sessions.get(session_id)
+            changes, frame_id, is_best = self._session_changes(session, outcome)
+            if session is None:
+                sessions[session_id] = changes
+            else:
+                session.update(changes)
+                if session_id in existing:
+                    updates.setdefault(session_id, {}).update(changes)
+            responses.append(self._response(outcome, frame_id, is_best))
+        
+        operations = [InsertOne(session) for session_id, session in sessions.items() if session_id not in existing]
+        operations += [UpdateOne({"session_id": session_id}, {"$set": changes}) for session_id, changes in updates.items()]
+        if operations:
+            await db.detection_sessions.bulk_write(operations, ordered=False)
+        return responses
+
+    def _session_changes(self, session: Optional[dict], frame: FrameResult) -> Tuple[dict, str, bool]:
+        """
+        Fold a frame into its session: keep the last MAX_FRAMES_PER_SESSION frames,
+        replace the best frame if this one has more detections
+        Returns: (new session document if session is None, else the fields to $set;
+                  frame id; whether the frame is the session's new best frame)
+        """
+        parking_analysis = frame.parking_analysis
+        frame_detection = FrameDetection(
+            frame_id=str(uuid.uuid4()),
+            timestamp=frame.captured_at or datetime.utcnow(),
+            detections=frame.detections,
+            detection_count=frame.count,
+            model_version=frame.model_version
+        )
+        
+        if not session:
+            # Create new session
+            best_frame_data = frame_detection.dict() if frame.count > 0 else None
+            if best_frame_data:
+                best_frame_data["image_path"] = self._save_best_frame(frame)
+            
+            changes = {
+                "session_id": frame.session_id,
+                "camera_id": frame.camera_id,
+                "user_id": None,
+                "frames": [frame_detection.dict()],
+                "max_detection_count": frame.count,
+                "best_frame": best_frame_data,
+                "model_version": frame.model_version,
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+                "status": "active"
+            }
+            is_best = True
+        else:
+            # Update existing session
+            frames = session.get("frames", [])
+            frames.append(frame_detection.dict())
+            
+            # Keep only last N frames
+            if len(frames) > settings.MAX_FRAMES_PER_SESSION:
+                frames = frames[-settings.MAX_FRAMES_PER_SESSION:]
+            
+            # Update best frame if current has more detections
+            max_count = session.get("max_detection_count", 0)
+            best_frame = session.get("best_frame")
+            is_best = frame.count > max_count
+            if is_best:
+                max_count = frame.count
+                best_frame = frame_detection.dict()
+                best_frame["image_path"] = self._save_best_frame(frame)
+            
+            changes = {
+                "frames": frames,
+                "max_detection_count": max_count,
+                "best_frame": best_frame,
+                "model_version": frame.model_version,
+                "updated_at": datetime.utcnow()
+            }
+            if parking_analysis:
+                changes["camera_id"] = frame.camera_id
+        
+        # Add parking analysis if available
+        if parking_analysis:
+            changes["parking_analysis"] = parking_analysis.dict()
+            changes["empty_spaces"] = [space.dict() for space in parking_analysis.empty_spaces]
+            changes["total_motorcycles"] = parking_analysis.total_motorcycles
+            changes["total_empty_spaces"] = parking_analysis.total_empty_spaces
+            # Convert integer keys to strings for MongoDB
+            changes["empty_spaces_per_row"] = {str(k): v for k, v in parking_analysis.empty_spaces_per_row.items()}
+            changes["parking_occupancy_rate"] = parking_analysis.parking_occupancy_rate
+        
+        return changes, frame_detection.frame_id, is_best
+
+    def _save_best_frame(self, frame: FrameResult) -> str:
+        """Draw the frame's detections (and empty spaces) and save it as its session's best frame image"""
+        os.makedirs("uploads/best_frames", exist_ok=True)
+        img_path = f"uploads/best_frames/{frame.session_id}.jpg"
+        
+        # Cache hits and reduced decodes skip the full decode; only do it when the image is actually drawn
+        image = frame.image
+        if image is None or frame.factor > 1:
+            image = _decode_image(frame.contents)
+        
+        calibration = frame.calibration
+        if frame.parking_analysis and calibration:
+            # Draw complete parking visualization with rows, empty spaces, and detections
+            img_with_viz = visualization_service.draw_complete_visualization(
+                image,
+                calibration.rows,
+                frame.parking_analysis.detections,
+                frame.parking_analysis.empty_spaces,
+                calibration.row_start_x,
+                calibration.row_end_x
+            )
+        else:
+            # No calibration - use basic detection visualization
+            img_with_viz = yolo_service.draw_detections(image, frame.detections)
+        cv2.imwrite(img_path, img_with_viz)
+        return img_path
+
+    @staticmethod
+    def _response(frame: FrameResult, frame_id: str, is_best: bool) -> dict:
+        response = {
+            "frame_id": frame_id,
+            "session_id": frame.session_id,
+            "detection_count": frame.count,
+            "model_version": frame.model_version,
+            "detections": [det.dict() for det in frame.detections],
+            "is_best": is_best
+        }
+        
+        response.update(frame.inference_info)
+        response["cache_hit"] = frame.cache_hit
+        if frame.quality:
+            response["quality"] = frame.quality
+        
+        # Add parking analysis if available
+        parking_analysis = frame.parking_analysis
+        if parking_analysis:
+            response["parking_analysis"] = {
+                "total_motorcycles": parking_analysis.total_motorcycles,
+                "total_empty_spaces": parking_analysis.total_empty_spaces,
+                # Convert integer keys to strings for JSON compatibility
+                "empty_spaces_per_row": {str(k): v for k, v in parking_analysis.empty_spaces_per_row.items()},
+                "parking_occupancy_rate": parking_analysis.parking_occupancy_rate
+            }
+        
+        return response
+
+    @staticmethod
+    def _skipped_response(frame: FrameResult) -> dict:
+        """Frames that failed the quality gate: no inference, session untouched"""
+        return {
+            "frame_id": None,
+            "session_id": frame.session_id,
+            "detection_count": 0,
+            "detections": [],
+            "is_best": False,
+            "skipped": True,
+            "quality": frame.quality
+        }
+
+# Singleton instance
+frame_processor = FrameProcessor()
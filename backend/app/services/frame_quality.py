@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+class FrameQualityGate:
+    """
+    Cheap pre-inference checks on a downscaled grayscale copy of a frame
+
+    - dark / overexposed: mean brightness outside [min_brightness, max_brightness]
+    - blurred: variance of the Laplacian below min_sharpness (motion blur,
+      obscured or fogged lens)
+    - frozen: the camera sent the same picture frozen_frames times in a row
+      (mean absolute difference to the previous frame below frozen_diff)
+
+    Failing frames skip inference so they can never become a session's best frame.
+    Byte-identical re-uploads are gated from the previous frame's measurements
+    (check_repeat), so a frozen camera is caught before the detection cache answers.
+    Rejection reasons are counted per camera.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        min_brightness: float,
+        max_brightness: float,
+        min_sharpness: float,
+        frozen_diff: float,
+        frozen_frames: int
+    ):
+        self.width = width
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_sharpness = min_sharpness
+        self.frozen_diff = frozen_diff
+        self.frozen_frames = frozen_frames
+        self._previous: Dict[str, np.ndarray] = {}
+        self._repeats: Dict[str, int] = {}
+        # (upload key, brightness, sharpness) of each camera's previous frame
+        self._last: Dict[str, Tuple[Optional[Hashable], float, float]] = {}
+        self._stats: Dict[str, dict] = {}
+
+    def _reduce(self, image: np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if w > self.width:
+            gray = cv2.resize(gray, (self.width, max(1, int(round(h * self.width / w)))), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def check(self, image: np.ndarray, camera_id: Optional[str] = None, key: Optional[Hashable] = None) -> dict:
+        """
+        Measure a frame and decide whether it is worth running the detector on
+        key identifies the uploaded bytes (detection cache key), see check_repeat()
+        Returns: {"ok", "reason", "brightness", "sharpness", "difference"}
+        """
+        gray = self._reduce(image)
+        brightness = float(gray.mean())
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+        difference = None
+        repeats = 0
+        if camera_id is not None:
+            previous = self._previous.get(camera_id)
+            if previous is not None and previous.shape == gray.shape:
+                difference = float(cv2.absdiff(previous, gray).mean())
+                if difference < self.frozen_diff:
+                    repeats = self._repeats.get(camera_id, 0) + 1
+            self._previous[camera_id] = gray
+            self._repeats[camera_id] = repeats
+            self._last[camera_id] = (key, brightness, sharpness)
+        return self._report(camera_id, brightness, sharpness, difference, repeats)
+
+    def check_repeat(self, camera_id: str, key: Hashable) -> Optional[dict]:
+        """
+        Gate an upload byte-identical to the camera's previous one without decoding
+        it: same brightness and sharpness, no difference, one more frozen repeat
+        Returns: the report, or None if key is not the camera's previous upload
+        (the frame then has to be decoded and check()ed)
+        """
+        last = self._last.get(camera_id)
+        if last is None or last[0] != key:
+            return None
+        repeats = self._repeats.get(camera_id, 0) + 1
+        self._repeats[camera_id] = repeats
+        return self._report(camera_id, last[1], last[2], 0.0, repeats)
+
+    def _report(
+        self,
+        camera_id: Optional[str],
+        brightness: float,
+        sharpness: float,
+        difference: Optional[float],
+        repeats: int
+    ) -> dict:
+        reason = None
+        if brightness < self.min_brightness:
+            reason = "too_dark"
+        elif brightness > self.max_brightness:
+            reason = "overexposed"
+        elif sharpness < self.min_sharpness:
+            reason = "blurred"
+        elif self.frozen_frames > 0 and repeats >= self.frozen_frames:
+            reason = "frozen"
+
+        report = {
+            "ok": reason is None,
+            "reason": reason,
+            "brightness": round(brightness, 1),
+            "sharpness": round(sharpness, 1),
+            "difference": round(difference, 2) if difference is not None else None
+        }
+        if camera_id is not None:
+            self._record(camera_id, reason)
+        return report
+
+    def _record(self, camera_id: str, reason: Optional[str]):
+        stats = self._stats.setdefault(camera_id, {"checked": 0, "rejected": 0, "reasons": {}, "last_rejection": None})
+        stats["checked"] += 1
+        if reason is not None:
+            stats["rejected"] += 1
+            stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+            stats["last_rejection"] = {"reason": reason, "at": datetime.utcnow()}
+
+    def get_stats(self) -> dict:
+        """Per-camera checked/rejected counts and rejection reasons"""
+        return {camera_id: {**stats, "reasons": dict(stats["reasons"])} for camera_id, stats in self._stats.items()}
+
+# Singleton instance
+frame_quality_gate = FrameQualityGate(
+    width=settings.QUALITY_CHECK_WIDTH,
+    min_brightness=settings.QUALITY_MIN_BRIGHTNESS,
+    max_brightness=settings.QUALITY_MAX_BRIGHTNESS,
+    min_sharpness=settings.QUALITY_MIN_SHARPNESS,
+    frozen_diff=settings.QUALITY_FROZEN_DIFF,
+    frozen_frames=settings.QUALITY_FROZEN_FRAMES
+)
@@ -0,0 +1,84 @@
+"""
+Upload decoding with header inspection and DCT-scaled JPEG decode
+
+The image size is read from the JPEG/PNG header before anything is decoded,
+so oversized uploads are rejected without allocating the full bitmap. JPEGs
+are decoded straight to 1/2, 1/4 or 1/8 resolution by libjpeg when the area
+the model looks at stays at least as large as its input size; the model
+would downsize the full-resolution pixels anyway.
+"""
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# DCT scale factors libjpeg can decode to directly, largest first
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+# Start-of-frame markers (baseline, progressive, ...), excluding DHT, JPG and DAC
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def is_jpeg(contents: bytes) -> bool:
+    return contents[:2] == b"\xff\xd8"
+
+def read_image_size(contents: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (height, width) from a JPEG or PNG header without decoding
+    Returns None for other formats or a header that cannot be parsed
+    """
+    if contents[:8] == _PNG_SIGNATURE and len(contents) >= 24:
+        width, height = struct.unpack(">II", contents[16:24])
+        return height, width
+
+    if not is_jpeg(contents):
+        return None
+
+    data = memoryview(contents)
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Standalone markers carry no length
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image / start of scan before any frame header
+            return None
+
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in _SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return (height, width) if height and width else None
+        i += 2 + length
+    return None
+
+def reduction_factor(covered_side: int, target_side: int) -> int:
+    """Largest DCT scale factor that keeps covered_side pixels at or above target_side"""
+    for factor, _ in REDUCED_FLAGS:
+        if covered_side // factor >= target_side:
+            return factor
+    return 1
+
+def decode_image(contents: bytes, factor: int = 1) -> Optional[np.ndarray]:
+    """
+    Decode uploaded bytes to a BGR array, JPEGs at 1/factor resolution
+    Returns None if the bytes are not a decodable image
+    """
+    buffer = np.frombuffer(contents, np.uint8)
+    if factor > 1 and is_jpeg(contents):
+        flag = dict(REDUCED_FLAGS)[factor]
+        return cv2.imdecode(buffer, flag)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
@@ -0,0 +1,322 @@
+import abc
+import ast
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.yolo_processing import letterbox, preprocess, postprocess, rect_shape
+
+class InferenceBackend(abc.ABC):
+    """
+    Base class for model runtimes used by YOLOService
+
+    Every backend returns one compact (N, 6) float32 array per image:
+    [x1, y1, x2, y2, confidence, class_id] in original image coordinates.
+    """
+    name = "base"
+    # Long side of the model input frames are letterboxed to by default
+    input_size: int = 640
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.names: Dict[int, str] = {}
+        # Candidates handed to NMS per image (0 = MAX_NMS)
+        self.nms_top_k = settings.NMS_TOP_K
+
+    @abc.abstractmethod
+    def predict_arrays(
+        self,
+        images: List[np.ndarray],
+        conf: float,
+        iou: float,
+        max_det: int,
+        imgsz: Optional[int] = None
+    ) -> List[np.ndarray]:
+        """Detect on a batch of BGR images, one (N, 6) array per image"""
+
+def _default_imgsz(yolo) -> int:
+    """Image size model.predict() uses by default: the size the weights were trained at"""
+    imgsz = yolo.overrides.get("imgsz", 640)
+    return max(imgsz) if isinstance(imgsz, (list, tuple)) else int(imgsz)
+
+class UltralyticsBackend(InferenceBackend):
+    """PyTorch .pt weights through ultralytics model.predict()"""
+    name = "ultralytics"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        super().__init__(model_path, num_threads)
+        from ultralytics import YOLO
+
+        if num_threads > 0:
+            import torch
+            torch.set_num_threads(num_threads)
+
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+        self.input_size = _default_imgsz(self.model)
+
+    def predict_arrays(self, images, conf, iou, max_det, imgsz=None):
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        results = self.model.predict(
+            images,
+            conf=conf,
+            iou=iou,
+            max_det=max_det,
+            verbose=False,
+            **kwargs
+        )
+
+        return [result.boxes.data.cpu().numpy().astype(np.float32, copy=False) for result in results]
+
+class TorchBackend(InferenceBackend):
+    """
+    PyTorch .pt weights with a lean predict path
+
+    Same preprocessing, network and NMS as model.predict(), without the
+    generic predictor: frames are letterboxed into input tensors that are
+    pooled per (batch size, h, w), batches of equally sized frames use the
+    rectangular stride-aligned input (384x640 instead of 640x640 for 16:9),
+    the fused network is called directly and the raw head output goes
+    through the shared postprocess.
+    """
+    name = "torch"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        super().__init__(model_path, num_threads)
+        import torch
+        from ultralytics import YOLO
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+
+        yolo = YOLO(model_path)
+        self.torch = torch
+        self.names = yolo.names
+        self.net = yolo.model.fuse(verbose=False).float().eval()
+        self.stride = max(int(self.net.stride.max()), 32)
+        self.input_size = _default_imgsz(yolo)
+
+        # Free input tensors per (batch size, h, w); concurrent batches take separate ones
+        self._tensors: Dict[Tuple[int, int, int], List] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key: Tuple[int, int, int]):
+        with self._lock:
+            free = self._tensors.get(key)
+            if free:
+                return free.pop()
+        return self.torch.empty((key[0], 3, key[1], key[2]), dtype=self.torch.float32)
+
+    def _release(self, key: Tuple[int, int, int], tensor):
+        with self._lock:
+            self._tensors.setdefault(key, []).append(tensor)
+
+    def predict_arrays(self, images, conf, iou, max_det, imgsz=None):
+        if not images:
+            return []
+
+        imgsz = -(-(imgsz or self.input_size) // self.stride) * self.stride
+        shapes = [image.shape[:2] for image in images]
+        if len(set(shapes)) == 1:
+            input_shape = rect_shape(shapes[0], imgsz, self.stride)
+        else:
+            input_shape = (imgsz, imgsz)
+
+        key = (len(images), input_shape[0], input_shape[1])
+        tensor = self._acquire(key)
+        try:
+            batch = tensor.numpy()
+            for i, image in enumerate(images):
+                boxed, _, _ = letterbox(image, input_shape)
+                # BGR HWC uint8 -> RGB CHW float32, written straight into the pooled tensor
+                np.copyto(batch[i], boxed.transpose(2, 0, 1)[::-1])
+            tensor /= 255
+
+            with self.torch.inference_mode():
+                prediction = self.net(tensor)
+            if isinstance(prediction, (list, tuple)):
+                prediction = prediction[0]
+            prediction = prediction.numpy()
+        finally:
+            self._release(key, tensor)
+
+        return postprocess(prediction, input_shape, shapes, conf, iou, max_det, self.nms_top_k)
+
+class RawTensorBackend(InferenceBackend):
+    """
+    Backend for exported graphs that output the raw YOLO head tensor
+    Uses the shared letterbox preprocessing and NMS postprocessing
+    """
+    # Spatial input size (h, w) of the exported graph
+    input_shape: Tuple[int, int] = (640, 640)
+    # Whether the graph accepts more than one image per call
+    dynamic_batch: bool = False
+    # Whether the graph accepts any spatial input size (otherwise imgsz is ignored)
+    dynamic_shape: bool = False
+
+    @property
+    def input_size(self) -> int:
+        return max(self.input_shape)
+
+    @abc.abstractmethod
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        """Run the graph on a float32 NCHW batch, return (B, 4 + num_classes, anchors)"""
+
+    def predict_arrays(self, images, conf, iou, max_det, imgsz=None):
+        if not images:
+            return []
+
+        input_shape = (imgsz, imgsz) if imgsz and self.dynamic_shape else self.input_shape
+        tensor = preprocess(images, input_shape)
+        if self.dynamic_batch:
+            prediction = self.forward(tensor)
+        else:
+            prediction = np.concatenate([self.forward(tensor[i:i + 1]) for i in range(len(images))])
+
+        return postprocess(
+            prediction,
+            input_shape,
+            [image.shape[:2] for image in images],
+            conf,
+            iou,
+            max_det,
+            self.nms_top_k
+        )
+
+def _parse_names(raw) -> Dict[int, str]:
+    """Class names as stored in ultralytics export metadata"""
+    if isinstance(raw, str):
+        raw = ast.literal_eval(raw)
+    return {int(k): str(v) for k, v in raw.items()}
+
+class OnnxRuntimeBackend(RawTensorBackend):
+    """ONNX model (model.export(format='onnx')) on ONNX Runtime CPU"""
+    name = "onnxruntime"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        super().__init__(model_path, num_threads)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("ONNX backend requires onnxruntime: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = _parse_names(metadata.get("names", "{0: 'motor'}"))
+
+        batch, _, height, width = model_input.shape
+        self.dynamic_batch = not isinstance(batch, int)
+        if isinstance(height, int) and isinstance(width, int):
+            self.input_shape = (height, width)
+        else:
+            self.dynamic_shape = True
+            if "imgsz" in metadata:
+                self.input_shape = tuple(ast.literal_eval(metadata["imgsz"]))
+
+    def forward(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+class OpenVINOBackend(RawTensorBackend):
+    """OpenVINO IR model (model.export(format='openvino')) on the CPU plugin"""
+    name = "openvino"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        super().__init__(model_path, num_threads)
+        try:
+            import openvino as ov
+        except ImportError:
+            raise ImportError("OpenVINO backend requires openvino: pip install openvino")
+
+        # Accept either the export directory or the .xml file inside it
+        if os.path.isdir(model_path):
+            xml_files = [f for f in os.listdir(model_path) if f.endswith(".xml")]
+            if not xml_files:
+                raise FileNotFoundError(f"No OpenVINO .xml model found in {model_path}")
+            xml_path = os.path.join(model_path, xml_files[0])
+        else:
+            xml_path = model_path
+
+        core = ov.Core()
+        config = {"INFERENCE_NUM_THREADS": num_threads} if num_threads > 0 else {}
+        model = core.read_model(xml_path)
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+
+        metadata = self._read_metadata(os.path.dirname(xml_path))
+        self.names = _parse_names(metadata.get("names", {0: "motor"}))
+
+        partial_shape = model.input(0).get_partial_shape()
+        self.dynamic_batch = partial_shape[0].is_dynamic
+        if partial_shape[2].is_static and partial_shape[3].is_static:
+            self.input_shape = (partial_shape[2].get_length(), partial_shape[3].get_length())
+        else:
+            self.dynamic_shape = True
+            if "imgsz" in metadata:
+                self.input_shape = tuple(metadata["imgsz"])
+
+    @staticmethod
+    def _read_metadata(model_dir: str) -> dict:
+        """metadata.yaml written next to the IR by ultralytics export"""
+        path = os.path.join(model_dir, "metadata.yaml")
+        if not os.path.exists(path):
+            return {}
+
+        import yaml
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+
+    def forward(self, batch):
+        return self.compiled(batch)[self.output]
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+    OpenVINOBackend.name: OpenVINOBackend,
+}
+
+def resolve_backend_name(model_path: str, backend: str = "auto") -> str:
+    """Pick the backend from config, or from the model file type when set to 'auto'"""
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend}'. Choose from: auto, {', '.join(BACKENDS)}")
+        return backend
+
+    path = model_path.rstrip("/\\")
+    if path.endswith(".onnx"):
+        return OnnxRuntimeBackend.name
+    if path.endswith(".xml") or path.endswith("_openvino_model"):
+        return OpenVINOBackend.name
+    return TorchBackend.name
+
+# Backends able to load each model file type (keyed by the backend "auto" picks for the file)
+_COMPATIBLE_BACKENDS = {
+    TorchBackend.name: {TorchBackend.name, UltralyticsBackend.name},
+    OnnxRuntimeBackend.name: {OnnxRuntimeBackend.name, OpenVINOBackend.name},
+    OpenVINOBackend.name: {OpenVINOBackend.name},
+}
+
+def check_backend(model_path: str, backend: str = "auto"):
+    """Raise ValueError if backend cannot load model_path (e.g. onnxruntime with a .pt file)"""
+    name = resolve_backend_name(model_path, backend)
+    compatible = _COMPATIBLE_BACKENDS[resolve_backend_name(model_path)]
+    if name not in compatible:
+        raise ValueError(
+            f"Backend '{name}' cannot load {model_path}. Choose from: auto, {', '.join(sorted(compatible))}"
+        )
+
+def create_backend(model_path: str, backend: str = "auto", num_threads: int = 0) -> InferenceBackend:
+    """Load model_path with the configured backend"""
+    return BACKENDS[resolve_backend_name(model_path, backend)](model_path, num_threads)
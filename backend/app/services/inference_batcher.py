@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.inference_profile import InferenceParams
+from app.services.yolo_service import yolo_service
+from app.services.inference_pool import inference_pool
+from app.services.mosaic_packer import plan_mosaic, build_canvas, split_detections
+
+logger = logging.getLogger(__name__)
+
+class _PendingFrame:
+    """A frame waiting in the batch queue together with the future of its caller"""
+    __slots__ = ("image", "params", "future", "enqueued_at")
+
+    def __init__(
+        self,
+        image: np.ndarray,
+        params: Optional[InferenceParams],
+        future: asyncio.Future,
+        enqueued_at: float
+    ):
+        self.image = image
+        self.params = params
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+class InferenceBatcher:
+    """
+    Micro-batching scheduler in front of YOLOService
+
+    Frames submitted by concurrent requests are collected until either
+    max_batch_size frames are waiting or the oldest frame has waited
+    max_wait_ms, then run through the model in a single forward pass.
+    Each caller gets back exactly the result for its own frame.
+    Only frames with equal inference params (per-camera profiles) share
+    a batch; others wait for the next one.
+
+    Batches run on the multi-process inference pool when it is started
+    (one batch in flight per worker process), otherwise in-process on
+    yolo_service one batch at a time.
+
+    With mosaic packing enabled, small frames of a batch (e.g. ROI crops of
+    cameras covering small areas) are packed into shared canvases at the
+    model input size and their boxes are split back per frame.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Frames pulled from the queue that did not match the params of the batch being built
+        self._deferred: deque = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._concurrency = 0
+        self._in_flight = set()
+
+        # Tuning statistics
+        self._batches = 0
+        self._frames = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._recent_waits = deque(maxlen=1000)
+        self._mosaic_canvases = 0
+        self._mosaic_frames = 0
+
+    async def detect(self, image: np.ndarray, params: Optional[InferenceParams] = None) -> Tuple[np.ndarray, str]:
+        """
+        Queue an image for batched detection and wait for its result
+        params: per-camera inference params, None for the global settings
+        Returns: (compact (N, 6) float32 array [x1, y1, x2, y2, confidence, class_id],
+                  version of the model that produced it)
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put(_PendingFrame(image, params, future, time.perf_counter()))
+        return await future
+
+    async def detect_many(
+        self,
+        images: List[np.ndarray],
+        params: Optional[InferenceParams] = None
+    ) -> Tuple[List[np.ndarray], str]:
+        """
+        Queue several images at once (e.g. tiles of one frame) so they share batches
+        Returns: (one compact (N, 6) array per image in order, model version)
+        """
+        self._ensure_worker()
+        enqueued_at = time.perf_counter()
+        futures = []
+        for image in images:
+            future = self._loop.create_future()
+            self._queue.put_nowait(_PendingFrame(image, params, future, enqueued_at))
+            futures.append(future)
+        results = await asyncio.gather(*futures)
+        # Images split across a model swap report the version of the last batch
+        return [array for array, _ in results], results[-1][1] if results else None
+
+    def _ensure_worker(self):
+        """Start the batching loop on the running event loop if needed"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            concurrency = inference_pool.num_workers if inference_pool.is_running else 1
+            if self._executor is None or self._concurrency != concurrency:
+                self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inference")
+                self._concurrency = concurrency
+
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._deferred = deque()
+            self._slots = asyncio.Semaphore(concurrency)
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        """Collect frames into batches and dispatch them as inference slots free up"""
+        while True:
+            # Wait for a free slot first so frames keep accumulating while all slots are busy
+            await self._slots.acquire()
+            first = self._deferred.popleft() if self._deferred else await self._queue.get()
+            batch = [first]
+            deadline = first.enqueued_at + self.max_wait
+
+            # Deferred frames with the same params go first, in arrival order
+            for item in list(self._deferred):
+                if len(batch) == self.max_batch_size:
+                    break
+                if item.params == first.params:
+                    self._deferred.remove(item)
+                    batch.append(item)
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    if timeout <= 0:
+                        # Window closed - only take frames that are already waiting
+                        item = self._queue.get_nowait()
+                    else:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+
+                if item.params == first.params:
+                    batch.append(item)
+                else:
+                    self._deferred.append(item)
+
+            task = self._loop.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._on_dispatch_done)
+
+    def _on_dispatch_done(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, batch: List[_PendingFrame]):
+        """Run one batched forward pass and resolve every waiting caller"""
+        started_at = time.perf_counter()
+        self._record_batch(batch, started_at)
+
+        engine = inference_pool if inference_pool.is_running else yolo_service
+        try:
+            results, version = await self._loop.run_in_executor(
+                self._executor,
+                self._predict,
+                engine,
+                [item.image for item in batch],
+                batch[0].params
+            )
+        except Exception as e:
+            logger.error(f"Batched inference failed for {len(batch)} frame(s): {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        logger.debug(f"Batch of {len(batch)}/{self.max_batch_size} frames inferred in "
+                     f"{(time.perf_counter() - started_at) * 1000:.1f}ms")
+
+        for item, result in zip(batch, results):
+            if not item.future.done():
+                item.future.set_result((result, version))
+
+    def _predict(
+        self,
+        engine,
+        images: List[np.ndarray],
+        params: Optional[InferenceParams]
+    ) -> Tuple[List[np.ndarray], str]:
+        """One forward pass over a batch, small frames packed into mosaic canvases (runs in the executor)"""
+        inputs, packed, canvases = self._pack(images, params)
+        outputs, version = engine.predict_versioned(inputs, params)
+        if not canvases:
+            return outputs, version
+
+        # Unpacked frames come first, then one output per canvas
+        results = [None] * len(images)
+        for index, output in zip([i for i in range(len(images)) if i not in packed], outputs):
+            results[index] = output
+        shapes = [image.shape[:2] for image in images]
+        for placements, output in zip(canvases, outputs[len(images) - len(packed):]):
+            for index, detections in split_detections(output, placements, shapes):
+                results[index] = detections
+        return results, version
+
+    def _pack(
+        self,
+        images: List[np.ndarray],
+        params: Optional[InferenceParams]
+    ) -> Tuple[List[np.ndarray], set, list]:
+        """
+        Pack small images of a batch into mosaic canvases
+        Returns: (model inputs: unpacked images then canvases, indices of packed
+                  images, placements per canvas)
+        """
+        if not settings.MOSAIC_ENABLED or len(images) < 2:
+            return images, set(), []
+
+        canvas_size = (params.imgsz if params else None) or settings.MOSAIC_CANVAS_SIZE
+        if not canvas_size:
+            # The model the params select, which may be a profile's own model
+            selected = params or yolo_service.default_params()
+            canvas_size = yolo_service.get_backend(selected.model_path, selected.backend)[0].input_size
+        limit = canvas_size * settings.MOSAIC_MAX_FRACTION
+        small = [i for i, image in enumerate(images) if max(image.shape[:2]) <= limit]
+        if len(small) < 2:
+            return images, set(), []
+
+        canvases = [
+            [(small[i], x, y) for i, x, y in placements]
+            for placements in plan_mosaic([images[i].shape[:2] for i in small], canvas_size, settings.MOSAIC_GAP)
+        ]
+        # A canvas holding a single frame gains nothing; that frame is inferred on its own
+        canvases = [placements for placements in canvases if len(placements) > 1]
+        packed = {index for placements in canvases for index, _, _ in placements}
+        if not packed:
+            return images, set(), []
+
+        self._mosaic_canvases += len(canvases)
+        self._mosaic_frames += len(packed)
+        inputs = [image for i, image in enumerate(images) if i not in packed]
+        inputs += [build_canvas(images, placements, canvas_size) for placements in canvases]
+        return inputs, packed, canvases
+
+    def _record_batch(self, batch: List[_PendingFrame], started_at: float):
+        """Update batch fill and queue wait statistics"""
+        self._batches += 1
+        self._frames += len(batch)
+        for item in batch:
+            wait = started_at - item.enqueued_at
+            self._queue_wait_total += wait
+            self._queue_wait_max = max(self._queue_wait_max, wait)
+            self._recent_waits.append(wait)
+
+    def get_stats(self) -> dict:
+        """Batch fill rate and per-frame queue wait, for tuning batch size and wait time"""
+        avg_batch_size = self._frames / self._batches if self._batches else 0.0
+        recent = sorted(self._recent_waits)
+        p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "total_batches": self._batches,
+            "total_frames": self._frames,
+            "avg_batch_size": round(avg_batch_size, 2),
+            "batch_fill_rate": round(avg_batch_size / self.max_batch_size, 4),
+            "avg_queue_wait_ms": round(self._queue_wait_total / self._frames * 1000, 2) if self._frames else 0.0,
+            "p95_queue_wait_ms": round(p95 * 1000, 2),
+            "max_queue_wait_ms": round(self._queue_wait_max * 1000, 2),
+            "mosaic": {
+                "enabled": settings.MOSAIC_ENABLED,
+                "canvases": self._mosaic_canvases,
+                "packed_frames": self._mosaic_frames,
+                "frames_per_canvas": round(self._mosaic_frames / self._mosaic_canvases, 2)
+                if self._mosaic_canvases else 0.0
+            }
+        }
+
+    async def stop(self):
+        """Cancel the batching loop (called on application shutdown)"""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+
+        for task in list(self._in_flight):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+# Singleton instance
+inference_batcher = InferenceBatcher(
+    max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS
+)
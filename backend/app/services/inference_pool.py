@@ -0,0 +1,358 @@
+import logging
+import multiprocessing as mp
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Deque, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.inference_profile import InferenceParams
+
+logger = logging.getLogger(__name__)
+
+# Frames are packed into a worker's shared memory slot on this byte boundary
+_SLOT_ALIGNMENT = 64
+
+def _worker_main(conn, shm_name: str, num_threads: int, model_path: str, model_version: str):
+    """
+    Inference worker process entry point
+
+    Loads its own copy of model_path, then serves batches described by
+    (offset, shape) layouts pointing into the shared memory slot, run
+    with the batch's inference params.
+    Replies with one compact (N, 6) float32 array per frame and the model version.
+    """
+    from app.core.config import settings
+    settings.INFERENCE_THREADS = num_threads
+    # Load exactly the model the parent asked for, not the registry's active version
+    settings.MODEL_PATH = model_path
+    settings.MODEL_REGISTRY_DIR = ""
+
+    from app.services.yolo_service import yolo_service
+    if yolo_service.model_path != model_path:
+        # Already imported with another model (e.g. by the spawning script's main module)
+        yolo_service.activate(model_path, model_version)
+    else:
+        yolo_service.warmup(yolo_service.backend)
+
+    # Spawned children share the parent's resource tracker, which unlinks the segment on stop()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    conn.send(("ready", yolo_service.names))
+
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+
+            layouts, params = message
+            images = [
+                np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                for offset, shape in layouts
+            ]
+            try:
+                arrays, version = yolo_service.predict_versioned(images, params)
+                # Profile overrides report their own file version
+                conn.send(("ok", (arrays, model_version if params is None or params.model_path is None else version)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            finally:
+                # Views must be released before the segment can be closed
+                del images
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        shm.close()
+        conn.close()
+
+class _Worker:
+    """Parent-side handle of one inference process and its shared memory slot"""
+
+    def __init__(self, index: int, process, conn, shm: shared_memory.SharedMemory, model_path: str, model_version: str):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.shm = shm
+        self.model_path = model_path
+        self.model_version = model_version
+
+class InferencePool:
+    """
+    Pool of inference worker processes, each holding its own model
+
+    Decoded frames are copied once into the chosen worker's shared memory
+    slot; only their offsets and shapes travel over the pipe. Detections come
+    back as compact (N, 6) arrays [x1, y1, x2, y2, confidence, class_id].
+    predict_arrays() blocks and is meant to be called from worker threads,
+    one call per idle process, so N processes serve N batches in parallel.
+
+    reload() starts a new set of processes with another model and swaps
+    them in once every model is loaded; the old processes finish their
+    current batch and are shut down afterwards. Callers always take an idle
+    worker of the current set, so a caller waiting across a swap gets a new
+    worker instead of an old one that reload() is shutting down.
+    """
+
+    def __init__(self, num_workers: int, slot_bytes: int, threads_per_worker: int = 1):
+        self.num_workers = num_workers
+        self.slot_bytes = slot_bytes
+        self.threads_per_worker = threads_per_worker
+        self._ctx = mp.get_context("spawn")
+        self._workers: List[_Worker] = []
+        # Idle workers of the current set and workers running a batch (any set), guarded by _cond
+        self._idle: Deque[_Worker] = deque()
+        self._busy: Set[_Worker] = set()
+        self._cond = threading.Condition()
+        self.model_version: Optional[str] = None
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, model_path: str, model_version: str):
+        """Spawn the worker processes and wait until every model is loaded"""
+        if self.is_running or self.num_workers <= 0:
+            return
+
+        workers = self._start_workers(model_path, model_version)
+        with self._cond:
+            self._workers = workers
+            self._idle = deque(workers)
+            self._cond.notify_all()
+        self.model_version = model_version
+
+        print(f"✅ Inference pool started with {self.num_workers} worker(s)")
+
+    def _start_workers(self, model_path: str, model_version: str) -> List[_Worker]:
+        # Launch everything first so the models load in parallel
+        launched = [
+            self._launch_worker(index, model_path, model_version)
+            for index in range(self.num_workers)
+        ]
+        try:
+            for worker in launched:
+                self._wait_ready(worker)
+        except RuntimeError:
+            for worker in launched:
+                self._close_worker(worker)
+            raise
+        return launched
+
+    def reload(self, model_path: str, model_version: str):
+        """
+        Swap every worker to another model without dropping batches
+        Blocks until the new workers are loaded and the old ones are drained
+        """
+        if not self.is_running:
+            return
+
+        new_workers = self._start_workers(model_path, model_version)
+        with self._cond:
+            old_workers = self._workers
+            self._workers = new_workers
+            self._idle = deque(new_workers)
+            self.model_version = model_version
+            self._cond.notify_all()
+
+            # Old workers still running a batch are released (not requeued) when it is done
+            while any(worker in self._busy for worker in old_workers):
+                self._cond.wait()
+
+        for worker in old_workers:
+            self._close_worker(worker)
+
+        print(f"✅ Inference pool reloaded with model version {model_version}")
+
+    def _launch_worker(
+        self,
+        index: int,
+        model_path: str,
+        model_version: str,
+        shm: Optional[shared_memory.SharedMemory] = None
+    ) -> _Worker:
+        if shm is None:
+            shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, shm.name, self.threads_per_worker, model_path, model_version),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        return _Worker(index, process, parent_conn, shm, model_path, model_version)
+
+    def _wait_ready(self, worker: _Worker):
+        try:
+            status, _ = worker.conn.recv()
+        except EOFError:
+            status = None
+        if status != "ready":
+            raise RuntimeError(f"Inference worker {worker.index} failed to start")
+
+    def _acquire(self) -> _Worker:
+        """Wait for an idle worker of the current set and mark it busy"""
+        with self._cond:
+            while not self._idle:
+                self._cond.wait()
+            worker = self._idle.popleft()
+            self._busy.add(worker)
+            return worker
+
+    def _release(self, worker: _Worker):
+        """Return a worker after its batch; workers retired by reload() meanwhile are left to it"""
+        with self._cond:
+            self._busy.discard(worker)
+            if worker in self._workers:
+                self._idle.append(worker)
+            self._cond.notify_all()
+
+    def _restart_worker(self, worker: _Worker) -> _Worker:
+        """Replace a crashed busy worker, reusing its shared memory slot; returns the (busy) replacement"""
+        logger.error(f"Inference worker {worker.index} died, restarting")
+        worker.conn.close()
+        worker.process.join(timeout=1)
+
+        replacement = self._launch_worker(worker.index, worker.model_path, worker.model_version, worker.shm)
+        self._wait_ready(replacement)
+        with self._cond:
+            if worker not in self._workers:
+                # Retired by reload() while restarting
+                retired = True
+            else:
+                retired = False
+                self._workers[self._workers.index(worker)] = replacement
+                self._busy.discard(worker)
+                self._busy.add(replacement)
+        if retired:
+            # reload() closes the retired worker and with it the shared memory slot
+            try:
+                replacement.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            replacement.process.join(timeout=5)
+            replacement.conn.close()
+            return worker
+        return replacement
+
+    def predict_versioned(
+        self,
+        images: List[np.ndarray],
+        params: Optional[InferenceParams] = None
+    ) -> Tuple[List[np.ndarray], str]:
+        """
+        Run a batch on the next idle worker
+        Returns: (one (N, 6) float32 detection array per image in order, model version)
+        """
+        worker = self._acquire()
+        try:
+            return self._predict_on_worker(worker, images, params)
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            if worker in self._workers:
+                worker = self._restart_worker(worker)
+            raise RuntimeError(f"Inference worker {worker.index} crashed while processing a batch")
+        finally:
+            self._release(worker)
+
+    def predict_arrays(self, images: List[np.ndarray], params: Optional[InferenceParams] = None) -> List[np.ndarray]:
+        """
+        Run a batch on the next idle worker
+        Returns: one (N, 6) float32 detection array per image, in order
+        """
+        return self.predict_versioned(images, params)[0]
+
+    def _predict_on_worker(
+        self,
+        worker: _Worker,
+        images: List[np.ndarray],
+        params: Optional[InferenceParams]
+    ) -> Tuple[List[np.ndarray], str]:
+        outputs = []
+        version = worker.model_version
+        layouts: List[Tuple[int, Tuple[int, ...]]] = []
+        offset = 0
+
+        for image in images:
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            if image.nbytes > self.slot_bytes:
+                raise ValueError(
+                    f"Frame of {image.nbytes} bytes does not fit in a "
+                    f"{self.slot_bytes} byte inference slot"
+                )
+
+            # Slot full - run what is packed so far and start over at the beginning
+            if offset + image.nbytes > self.slot_bytes:
+                arrays, version = self._run_on_worker(worker, layouts, params)
+                outputs.extend(arrays)
+                layouts, offset = [], 0
+
+            slot_view = np.ndarray(image.shape, dtype=np.uint8, buffer=worker.shm.buf, offset=offset)
+            slot_view[...] = image
+            del slot_view
+
+            layouts.append((offset, image.shape))
+            offset += -(-image.nbytes // _SLOT_ALIGNMENT) * _SLOT_ALIGNMENT
+
+        if layouts:
+            arrays, version = self._run_on_worker(worker, layouts, params)
+            outputs.extend(arrays)
+
+        return outputs, version
+
+    def _run_on_worker(
+        self,
+        worker: _Worker,
+        layouts,
+        params: Optional[InferenceParams]
+    ) -> Tuple[List[np.ndarray], str]:
+        worker.conn.send((layouts, params))
+        status, payload = worker.conn.recv()
+
+        if status != "ok":
+            raise RuntimeError(f"Inference worker {worker.index} failed: {payload}")
+
+        return payload
+
+    def stop(self):
+        """Shut down all workers and release their shared memory"""
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+
+        for worker in self._workers:
+            self._close_worker(worker, notify=False)
+
+        with self._cond:
+            self._workers = []
+            self._idle = deque()
+            self._busy.clear()
+        self.model_version = None
+
+    def _close_worker(self, worker: _Worker, notify: bool = True):
+        """Stop one worker process and release its shared memory slot"""
+        if notify:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+
+        worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.conn.close()
+        worker.shm.close()
+        worker.shm.unlink()
+
+# Singleton instance (processes are only spawned by start())
+inference_pool = InferencePool(
+    num_workers=settings.INFERENCE_WORKERS,
+    slot_bytes=settings.INFERENCE_SHM_SLOT_MB * 1024 * 1024,
+    threads_per_worker=settings.INFERENCE_WORKER_THREADS
+)
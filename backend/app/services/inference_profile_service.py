@@ -0,0 +1,100 @@
+import os
+from typing import List, Optional
+from datetime import datetime
+from app.models.inference_profile import InferenceProfile, InferenceProfileUpdate, InferenceParams
+from app.db.mongodb import get_database
+from app.core.config import settings
+from app.services.inference_backends import check_backend
+from app.services.yolo_service import yolo_service
+
+class InferenceProfileService:
+    """Service for managing per-camera inference profiles"""
+
+    @staticmethod
+    async def get_profile(camera_id: str) -> Optional[InferenceProfile]:
+        """
+        Get inference profile for a specific camera
+        """
+        db = get_database()
+        profile = await db.inference_profiles.find_one({"camera_id": camera_id})
+
+        if profile:
+            return InferenceProfile(**profile)
+        return None
+
+    @staticmethod
+    async def save_profile(camera_id: str, data: InferenceProfileUpdate) -> InferenceProfile:
+        """
+        Create or update the inference profile of a camera
+        Only fields present in the request are changed
+        """
+        if data.model_path and not os.path.exists(data.model_path):
+            raise ValueError(f"Model not found at {data.model_path}")
+
+        db = get_database()
+        existing = await db.inference_profiles.find_one({"camera_id": camera_id}) or {}
+
+        # The stored backend must be able to load the model the camera ends up with
+        model_path = data.model_path or existing.get("model_path") or yolo_service.model_path
+        backend = data.backend or existing.get("backend") or "auto"
+        check_backend(model_path, backend)
+
+        update_data = data.dict(exclude_unset=True)
+        update_data["updated_at"] = datetime.utcnow()
+
+        await db.inference_profiles.update_one(
+            {"camera_id": camera_id},
+            {
+                "$set": update_data,
+                "$setOnInsert": {"camera_id": camera_id, "created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+        saved = await db.inference_profiles.find_one({"camera_id": camera_id})
+        return InferenceProfile(**saved)
+
+    @staticmethod
+    async def delete_profile(camera_id: str) -> bool:
+        """
+        Delete inference profile for a camera (falls back to global settings)
+        """
+        db = get_database()
+        result = await db.inference_profiles.delete_one({"camera_id": camera_id})
+        return result.deleted_count > 0
+
+    @staticmethod
+    async def list_profiles(skip: int = 0, limit: int = 50) -> List[InferenceProfile]:
+        """
+        List all inference profiles
+        """
+        db = get_database()
+        cursor = db.inference_profiles.find().skip(skip).limit(limit)
+        profiles = await cursor.to_list(length=limit)
+
+        return [InferenceProfile(**p) for p in profiles]
+
+    @staticmethod
+    def resolve_params(profile: Optional[InferenceProfile]) -> InferenceParams:
+        """
+        Effective inference parameters for a camera: profile values where set,
+        global settings otherwise
+        """
+        if profile is None:
+            return InferenceParams(
+                conf=settings.CONFIDENCE_THRESHOLD,
+                iou=settings.IOU_THRESHOLD,
+                max_det=settings.MAX_DETECTIONS
+            )
+
+        return InferenceParams(
+            conf=profile.confidence_threshold if profile.confidence_threshold is not None else settings.CONFIDENCE_THRESHOLD,
+            iou=profile.iou_threshold if profile.iou_threshold is not None else settings.IOU_THRESHOLD,
+            max_det=profile.max_detections if profile.max_detections is not None else settings.MAX_DETECTIONS,
+            imgsz=profile.imgsz,
+            model_path=profile.model_path,
+            backend=profile.backend or "auto"
+        )
+
+# Singleton instance
+inference_profile_service = InferenceProfileService()
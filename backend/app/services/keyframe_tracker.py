@@ -0,0 +1,175 @@
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+# Points sampled per box side for optical flow (GRID x GRID points inside each box)
+GRID = 4
+# Change score is the largest mean difference over a CHANGE_GRID x CHANGE_GRID grid of the frame
+CHANGE_GRID = 8
+
+class _TrackState:
+    """Last frame and boxes of one camera"""
+    __slots__ = ("shape", "gray", "detections", "model_version", "since_keyframe")
+
+    def __init__(self, shape: Tuple[int, int], gray: np.ndarray, detections: np.ndarray, model_version: str):
+        self.shape = shape
+        self.gray = gray
+        self.detections = detections
+        self.model_version = model_version
+        self.since_keyframe = 0
+
+class KeyframeTracker:
+    """
+    Detect on keyframes, track boxes in between
+
+    For continuous cameras the detector only runs on every Nth frame, or
+    earlier when the change score between consecutive frames spikes. On the
+    frames in between, every box is moved by the median optical flow
+    (pyramidal Lucas-Kanade) of a grid of points inside it, computed on a
+    downscaled grayscale frame.
+    """
+
+    def __init__(self, track_width: int, change_threshold: float, min_points: int):
+        self.track_width = track_width
+        self.change_threshold = change_threshold
+        self.min_points = min_points
+        self._states: Dict[str, _TrackState] = {}
+        self._stats: Dict[str, dict] = {}
+
+    def _reduce(self, image: np.ndarray, shape: Tuple[int, int]) -> Tuple[np.ndarray, float]:
+        """Downscaled grayscale frame and its scale relative to the original shape (h, w)"""
+        h, w = shape
+        # Frames decoded at reduced resolution are tracked at that resolution at most
+        scale = min(1.0, self.track_width / w, image.shape[1] / w)
+        size = (int(round(w * scale)), int(round(h * scale)))
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if (gray.shape[1], gray.shape[0]) != size:
+            gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    @staticmethod
+    def change_score(previous: np.ndarray, current: np.ndarray) -> float:
+        """Largest mean absolute difference over a coarse grid, so a local change is not averaged away"""
+        diff = cv2.absdiff(previous, current)
+        cells = cv2.resize(diff, (CHANGE_GRID, CHANGE_GRID), interpolation=cv2.INTER_AREA)
+        return float(cells.max())
+
+    def track(
+        self,
+        camera_id: str,
+        image: np.ndarray,
+        interval: int,
+        shape: Optional[Tuple[int, int]] = None
+    ) -> Optional[Tuple[np.ndarray, str, dict]]:
+        """
+        Move the camera's boxes to this frame
+        shape is the original (h, w) when image was decoded at reduced resolution
+        Returns: (tracked (N, 6) detections, model version of the keyframe, info),
+                 or None when this frame must be a keyframe
+        """
+        shape = shape or image.shape[:2]
+        state = self._states.get(camera_id)
+        if state is None or state.shape != shape or state.since_keyframe + 1 >= interval:
+            return None
+
+        gray, scale = self._reduce(image, shape)
+        if gray.shape != state.gray.shape:
+            return None
+        score = self.change_score(state.gray, gray)
+        if score > self.change_threshold:
+            return None
+
+        detections = self._flow_boxes(state.gray, gray, state.detections, scale, shape)
+        state.gray = gray
+        state.detections = detections
+        state.since_keyframe += 1
+        self._record(camera_id, keyframe=False)
+
+        return detections, state.model_version, {
+            "mode": "tracked",
+            "change_score": round(score, 2),
+            "frames_since_keyframe": state.since_keyframe
+        }
+
+    def set_keyframe(
+        self,
+        camera_id: str,
+        image: np.ndarray,
+        detections: np.ndarray,
+        model_version: str,
+        shape: Optional[Tuple[int, int]] = None
+    ) -> dict:
+        """Store a freshly detected frame as the camera's new keyframe"""
+        shape = shape or image.shape[:2]
+        gray, _ = self._reduce(image, shape)
+        self._states[camera_id] = _TrackState(shape, gray, detections, model_version)
+        self._record(camera_id, keyframe=True)
+        return {"mode": "keyframe", "frames_since_keyframe": 0}
+
+    def _flow_boxes(
+        self,
+        previous: np.ndarray,
+        current: np.ndarray,
+        detections: np.ndarray,
+        scale: float,
+        image_shape: Tuple[int, int]
+    ) -> np.ndarray:
+        """Shift each box by the median flow of the points inside it"""
+        if not len(detections):
+            return detections
+
+        # GRID x GRID points over the inner part of every box, in downscaled coordinates
+        steps = (np.arange(GRID) + 0.5) / GRID * 0.6 + 0.2
+        boxes = detections[:, :4] * scale
+        xs = boxes[:, 0:1] + (boxes[:, 2:3] - boxes[:, 0:1]) * steps
+        ys = boxes[:, 1:2] + (boxes[:, 3:4] - boxes[:, 1:2]) * steps
+        points = np.stack([
+            np.repeat(xs, GRID, axis=1),
+            np.tile(ys, (1, GRID))
+        ], axis=2).reshape(-1, 1, 2).astype(np.float32)
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(
+            previous, current, points, None, winSize=(15, 15), maxLevel=2
+        )
+        flow = (moved - points).reshape(len(detections), GRID * GRID, 2)
+        valid = status.reshape(len(detections), GRID * GRID).astype(bool)
+
+        tracked = detections.copy()
+        h, w = image_shape
+        for i in range(len(detections)):
+            if valid[i].sum() < self.min_points:
+                continue
+            dx, dy = np.median(flow[i][valid[i]], axis=0) / scale
+            tracked[i, [0, 2]] = np.clip(tracked[i, [0, 2]] + dx, 0, w)
+            tracked[i, [1, 3]] = np.clip(tracked[i, [1, 3]] + dy, 0, h)
+        return tracked
+
+    def _record(self, camera_id: str, keyframe: bool):
+        stats = self._stats.setdefault(camera_id, {"keyframes": 0, "tracked": 0})
+        stats["keyframes" if keyframe else "tracked"] += 1
+
+    def get_stats(self) -> dict:
+        """Per-camera keyframe and tracked frame counts"""
+        return {
+            camera_id: {
+                **stats,
+                "keyframe_rate": round(stats["keyframes"] / (stats["keyframes"] + stats["tracked"]), 4)
+            }
+            for camera_id, stats in self._stats.items()
+        }
+
+    def reset(self, camera_id: str):
+        self._states.pop(camera_id, None)
+
+    def reset_all(self):
+        self._states.clear()
+
+# Singleton instance
+keyframe_tracker = KeyframeTracker(
+    track_width=settings.KEYFRAME_TRACK_WIDTH,
+    change_threshold=settings.KEYFRAME_CHANGE_THRESHOLD,
+    min_points=settings.KEYFRAME_MIN_TRACKED_POINTS
+)
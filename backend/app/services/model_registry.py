@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# File in the registry directory holding the name of the active version
+ACTIVE_FILE = "ACTIVE"
+MODEL_SUFFIXES = (".pt", ".onnx", ".xml", "_openvino_model")
+
+class ModelRegistry:
+    """
+    Versioned model files with zero-downtime activation
+
+    Every version is a subdirectory of registry_dir holding one model
+    (.pt, .onnx or OpenVINO export), e.g. models/registry/v3/best.onnx.
+    Activating a version loads and warms it up in the background, then swaps
+    it in atomically; requests already running finish on the old model.
+    The active version survives restarts through the ACTIVE file.
+    """
+
+    def __init__(self, registry_dir: str):
+        self.registry_dir = registry_dir
+        self._task: Optional[asyncio.Future] = None
+        self.status = {"state": "idle", "version": None, "error": None, "started_at": None, "finished_at": None}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.registry_dir) and os.path.isdir(self.registry_dir)
+
+    def model_path(self, version: str) -> str:
+        """Model file of a version; ValueError if the version does not exist"""
+        version_dir = os.path.join(self.registry_dir, version)
+        # Version names are plain directory names, never paths
+        if not self.enabled or version != os.path.basename(version) or version in (".", "..") \
+                or not os.path.isdir(version_dir):
+            raise ValueError(f"Unknown model version '{version}'")
+
+        for name in sorted(os.listdir(version_dir)):
+            if name.endswith(MODEL_SUFFIXES):
+                return os.path.join(version_dir, name)
+        raise ValueError(f"No model file found for version '{version}'")
+
+    def active_version(self) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = os.path.join(self.registry_dir, ACTIVE_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().strip() or None
+
+    def active_model(self) -> Optional[Tuple[str, str]]:
+        """(model path, version) to load at startup, or None to use settings.MODEL_PATH"""
+        version = self.active_version()
+        if version is None:
+            return None
+        try:
+            return self.model_path(version), version
+        except ValueError as e:
+            logger.warning(f"Active model version unusable, falling back to MODEL_PATH: {e}")
+            return None
+
+    def list_versions(self) -> List[dict]:
+        if not self.enabled:
+            return []
+
+        active = self.active_version()
+        versions = []
+        for version in sorted(os.listdir(self.registry_dir)):
+            if not os.path.isdir(os.path.join(self.registry_dir, version)):
+                continue
+            try:
+                path = self.model_path(version)
+            except ValueError:
+                continue
+            versions.append({
+                "version": version,
+                "model_path": path,
+                "modified_at": datetime.utcfromtimestamp(os.path.getmtime(path)),
+                "active": version == active
+            })
+        return versions
+
+    def activate(self, version: str) -> dict:
+        """
+        Start loading a version in the background
+        Raises ValueError for unknown versions or while another activation runs
+        """
+        path = self.model_path(version)
+        if self._task is not None and not self._task.done():
+            raise ValueError(f"Model version '{self.status['version']}' is still loading")
+
+        self.status = {
+            "state": "loading",
+            "version": version,
+            "error": None,
+            "started_at": datetime.utcnow(),
+            "finished_at": None
+        }
+        loop = asyncio.get_running_loop()
+        self._task = loop.run_in_executor(None, self._swap, version, path, loop)
+        return self.status
+
+    def _swap(self, version: str, path: str, loop: asyncio.AbstractEventLoop):
+        """Load, warm up and swap in a model version (runs in a worker thread)"""
+        from app.services.yolo_service import yolo_service
+        from app.services.inference_pool import inference_pool
+
+        try:
+            if inference_pool.is_running:
+                inference_pool.reload(path, version)
+            yolo_service.activate(path, version)
+
+            with open(os.path.join(self.registry_dir, ACTIVE_FILE), "w") as f:
+                f.write(version)
+
+            # The trackers and the cache are only touched on the event loop
+            loop.call_soon_threadsafe(self._finish, version)
+        except Exception as e:
+            logger.error(f"Activating model version {version} failed: {e}", exc_info=True)
+            self.status.update(state="failed", error=str(e), finished_at=datetime.utcnow())
+
+    def _finish(self, version: str):
+        """Drop state built from the previous model (runs on the event loop)"""
+        from app.services.change_tracker import change_tracker
+        from app.services.keyframe_tracker import keyframe_tracker
+        from app.services.detection_cache import detection_cache
+
+        # Detections of the previous model must not be reused
+        change_tracker.reset_all()
+        keyframe_tracker.reset_all()
+        detection_cache.clear()
+
+        self.status.update(state="active", finished_at=datetime.utcnow())
+        logger.info(f"Model version {version} activated")
+
+# Singleton instance
+model_registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
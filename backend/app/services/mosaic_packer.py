@@ -0,0 +1,88 @@
+"""
+Mosaic packing of small frames into shared inference canvases
+
+Calibration-ROI crops of cameras covering small areas are only a few
+hundred pixels wide; letterboxed one by one they are mostly upscaling and
+padding. Packing several of them into one canvas at the model input size
+lets a single forward pass cover all of them.
+"""
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# (index of the image in the batch, x, y) of one packed image inside its canvas
+Placement = Tuple[int, int, int]
+
+def plan_mosaic(
+    shapes: Sequence[Tuple[int, int]],
+    canvas_size: int,
+    gap: int
+) -> List[List[Placement]]:
+    """
+    Shelf-pack images of shapes (h, w) into canvas_size x canvas_size canvases,
+    tallest first, with gap pixels of padding between neighbours
+    Returns: placements per canvas; images larger than a canvas are left out
+    """
+    order = sorted(range(len(shapes)), key=lambda i: shapes[i][0], reverse=True)
+
+    canvases: List[List[Placement]] = []
+    x = y = shelf_height = 0
+    for index in order:
+        h, w = shapes[index]
+        if h > canvas_size or w > canvas_size:
+            continue
+
+        if not canvases or x + w > canvas_size:
+            # Next shelf, or a new canvas when the shelf does not fit below
+            if canvases and y + shelf_height + gap + h <= canvas_size:
+                y += shelf_height + gap
+            else:
+                canvases.append([])
+                y = 0
+            x = shelf_height = 0
+
+        canvases[-1].append((index, x, y))
+        x += w + gap
+        shelf_height = max(shelf_height, h)
+
+    return canvases
+
+def build_canvas(
+    images: Sequence[np.ndarray],
+    placements: List[Placement],
+    canvas_size: int,
+    pad_value: int = 114
+) -> np.ndarray:
+    """Copy the placed images into one canvas filled with the letterbox pad color"""
+    canvas = np.full((canvas_size, canvas_size, 3), pad_value, dtype=np.uint8)
+    for index, x, y in placements:
+        image = images[index]
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        h, w = image.shape[:2]
+        canvas[y:y + h, x:x + w] = image
+    return canvas
+
+def split_detections(
+    detections: np.ndarray,
+    placements: List[Placement],
+    shapes: Sequence[Tuple[int, int]]
+) -> List[Tuple[int, np.ndarray]]:
+    """
+    Hand each canvas detection to the image its box center falls in, in that
+    image's own coordinates (clipped to the image)
+    Returns: (image index, (N, 6) detections) per placement
+    """
+    cx = (detections[:, 0] + detections[:, 2]) / 2
+    cy = (detections[:, 1] + detections[:, 3]) / 2
+
+    results = []
+    for index, x, y in placements:
+        h, w = shapes[index]
+        inside = (cx >= x) & (cx < x + w) & (cy >= y) & (cy < y + h)
+        own = detections[inside].copy()
+        own[:, [0, 2]] = (own[:, [0, 2]] - x).clip(0, w)
+        own[:, [1, 3]] = (own[:, [1, 3]] - y).clip(0, h)
+        results.append((index, own))
+    return results
@@ -0,0 +1,217 @@
+"""
+Shared-memory frame ring for capture processes on the same host
+
+A capture process writes raw BGR frames into a named shared memory segment
+(one per camera) instead of encoding JPEGs and posting them over HTTP; the
+backend copies the newest frame straight out of it, without encode or decode.
+
+Kept free of app imports so capture processes only need numpy.
+
+Layout (little-endian):
+    header    magic, version, slot count, slot capacity, newest frame number,
+              newest slot, slot pinned by the reader
+    slot meta per slot: sequence, height, width, channels, capture time
+    slot data per slot: slot capacity bytes, 64-byte aligned
+
+A slot's sequence is 2 * frame number once the frame is complete and odd
+while the writer is filling it (a seqlock). The reader copies the newest
+frame out of its slot and re-reads the sequence afterwards; a copy whose
+sequence changed is discarded, so the pipeline never sees a torn frame.
+The pin is only a hint: the reader marks the slot it copies from and the
+writer skips that slot when it sees the mark, which makes discarded copies
+rare, but the sequence check alone decides whether a copy is used. The
+check relies on the writer's stores and the reader's loads each staying in
+program order, which x86 (TSO) guarantees.
+"""
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"PKRB"
+VERSION = 1
+
+# magic, version, slots, slot_bytes, latest frame number, latest slot, pinned slot
+_HEADER = struct.Struct("<4sHHQQii")
+_HEADER_BYTES = 64
+_LATEST_OFFSET = 16
+_LATEST_SLOT_OFFSET = 24
+_PINNED_OFFSET = 28
+
+# sequence, height, width, channels, capture time
+_META = struct.Struct("<QIIId")
+_META_BYTES = 32
+
+_ALIGNMENT = 64
+_U64 = struct.Struct("<Q")
+_I32 = struct.Struct("<i")
+
+class RingFrame(NamedTuple):
+    number: int
+    captured_at: float
+    image: np.ndarray
+
+def _align(size: int) -> int:
+    return -(-size // _ALIGNMENT) * _ALIGNMENT
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing segment without letting this process' resource tracker unlink it on exit"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+class _FrameRing:
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.name = shm.name
+        magic, version, self.slots, self.slot_bytes, _, _, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Shared memory {shm.name} is not a version {VERSION} frame ring")
+        self._data_offset = _align(_HEADER_BYTES + self.slots * _META_BYTES)
+
+    @staticmethod
+    def segment_size(slots: int, slot_bytes: int) -> int:
+        return _align(_HEADER_BYTES + slots * _META_BYTES) + slots * _align(slot_bytes)
+
+    def _meta_offset(self, slot: int) -> int:
+        return _HEADER_BYTES + slot * _META_BYTES
+
+    def _sequence(self, slot: int) -> int:
+        return _U64.unpack_from(self.shm.buf, self._meta_offset(slot))[0]
+
+    def _pinned(self) -> int:
+        return _I32.unpack_from(self.shm.buf, _PINNED_OFFSET)[0]
+
+    def _view(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        offset = self._data_offset + slot * _align(self.slot_bytes)
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    @property
+    def latest_number(self) -> int:
+        """Number of the newest complete frame (0 before the first one)"""
+        return _U64.unpack_from(self.shm.buf, _LATEST_OFFSET)[0]
+
+class FrameRingWriter(_FrameRing):
+    """
+    Capture side of a frame ring
+
+    Creates the segment, or reuses one left by a previous run of the capture
+    process if its geometry matches, so a reader attached to it keeps working
+    across capture restarts.
+    """
+
+    def __init__(self, name: str, slot_bytes: int, slots: int = 3):
+        if slots < 2:
+            raise ValueError("A frame ring needs at least 2 slots")
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=self.segment_size(slots, slot_bytes))
+            _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, slots, slot_bytes, 0, -1, -1)
+            self.owner = True
+        except FileExistsError:
+            shm = _attach(name)
+            self.owner = False
+        super().__init__(shm)
+        if self.slots != slots or self.slot_bytes < slot_bytes:
+            shm.close()
+            raise ValueError(
+                f"Frame ring {name} exists with {self.slots} slots of {self.slot_bytes} bytes; "
+                f"unlink it to change the geometry"
+            )
+        latest_slot = _I32.unpack_from(shm.buf, _LATEST_SLOT_OFFSET)[0]
+        self._number = self.latest_number
+        self._slot = latest_slot if latest_slot >= 0 else self.slots - 1
+
+    def write(self, image: np.ndarray, captured_at: Optional[float] = None) -> int:
+        """
+        Copy a BGR frame into the next free slot and publish it as the newest frame
+        Returns: frame number
+        """
+        if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+            raise ValueError("Frames must be uint8 BGR arrays of shape (height, width, 3)")
+        if image.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {image.nbytes} bytes does not fit in a {self.slot_bytes} byte slot")
+
+        number = self._number + 1
+        buf = self.shm.buf
+        slot = self._slot
+        for _ in range(self.slots):
+            slot = (slot + 1) % self.slots
+            if slot == self._pinned():
+                continue
+            meta = self._meta_offset(slot)
+            previous = self._sequence(slot)
+            # Mark as being written, then make sure the reader did not pin it in between
+            _U64.pack_into(buf, meta, 2 * number - 1)
+            if slot != self._pinned():
+                break
+            _U64.pack_into(buf, meta, previous)
+        else:
+            raise RuntimeError(f"No free slot in frame ring {self.name}")
+
+        h, w, c = image.shape
+        view = self._view(slot, image.shape)
+        view[...] = image
+        del view
+        _META.pack_into(buf, meta, 2 * number, h, w, c, time.time() if captured_at is None else captured_at)
+        _I32.pack_into(buf, _LATEST_SLOT_OFFSET, slot)
+        _U64.pack_into(buf, _LATEST_OFFSET, number)
+
+        self._number, self._slot = number, slot
+        return number
+
+    def close(self, unlink: Optional[bool] = None):
+        """Detach; unlinks the segment if this writer created it (or if unlink is True)"""
+        self.shm.close()
+        if self.owner if unlink is None else unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+class FrameRingReader(_FrameRing):
+    """
+    Backend side of a frame ring: copies out the newest frame
+
+    read() returns a frame only if its slot sequence is unchanged after the
+    copy; copies overwritten meanwhile are counted in torn and retried.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(_attach(name))
+        self.torn = 0
+
+    def read(self, after: int = 0) -> Optional[RingFrame]:
+        """The newest complete frame if its number is above after, as a private copy"""
+        buf = self.shm.buf
+        for _ in range(3):
+            if self.latest_number <= after:
+                return None
+            slot = _I32.unpack_from(buf, _LATEST_SLOT_OFFSET)[0]
+            sequence = self._sequence(slot)
+            if sequence % 2 or sequence // 2 <= after:
+                continue
+            _I32.pack_into(buf, _PINNED_OFFSET, slot)
+            try:
+                _, h, w, c, captured_at = _META.unpack_from(buf, self._meta_offset(slot))
+                if h * w * c > self.slot_bytes:
+                    # Metadata of a slot being rewritten; the sequence check below rejects it
+                    image = None
+                else:
+                    view = self._view(slot, (h, w, c))
+                    image = view.copy()
+                    del view
+                intact = self._sequence(slot) == sequence
+            finally:
+                _I32.pack_into(buf, _PINNED_OFFSET, -1)
+            if intact and image is not None:
+                return RingFrame(sequence // 2, captured_at, image)
+            self.torn += 1
+        return None
+
+    def close(self):
+        self.shm.close()
@@ -0,0 +1,399 @@
+"""
+Server-side ingestion of camera streams
+
+For IP cameras that only expose an RTSP/MJPEG stream (or for replaying a
+local video file as a camera), the server pulls the frames itself instead
+of a bridge pushing JPEG uploads. Each registered stream gets a reader
+thread that grabs and decodes frames and an asyncio task that feeds the
+sampled frames into the same pipeline as /api/frames/upload (detection,
+empty-space analysis, session updates).
+
+Capture processes on the same host can instead write raw frames into a
+shared-memory ring (see shm_ring); such streams are registered as
+shm://{ring name} and read without encode or decode.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.db.mongodb import get_database
+from app.models.camera_stream import CameraStream, CameraStreamUpdate
+from app.services.frame_processor import frame_processor, FrameError
+from app.services.shm_ring import FrameRingReader
+
+logger = logging.getLogger(__name__)
+
+# Stream URL of a shared-memory frame ring written by a capture process on this host
+SHM_SCHEME = "shm://"
+
+def is_video_file(url: str) -> bool:
+    return "://" not in url
+
+def is_shm_ring(url: str) -> bool:
+    return url.startswith(SHM_SCHEME)
+
+class StreamPuller:
+    """
+    Pulls one camera stream and feeds sampled frames to the frame pipeline
+
+    The reader thread grabs every frame so the capture never falls behind the
+    live stream (RTSP clients otherwise buffer stale frames), but only decodes
+    the frames it samples. A sampled frame goes into a single slot; if the
+    pipeline is still busy with the previous one, the slot is overwritten and
+    the older frame is dropped, so results never lag behind the camera.
+
+    The sampling interval adapts to the pipeline: it is 1 / sample_fps, or the
+    recent per-frame processing time if that is longer, so frames are not
+    decoded only to be dropped when inference is saturated.
+    """
+
+    def __init__(self, stream: CameraStream, loop: asyncio.AbstractEventLoop):
+        self.stream = stream
+        self.session_id = stream.session_id or f"stream-{stream.camera_id}"
+        self._loop = loop
+        self._stop = threading.Event()
+        self._slot_lock = threading.Lock()
+        self._slot: Optional[Tuple[np.ndarray, float]] = None
+        self._ready = asyncio.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+        # Exponential moving average of seconds per processed frame
+        self._processing_time = 0.0
+
+        self.state = "starting"
+        self._grabbed = 0
+        self._sampled = 0
+        self._processed = 0
+        self._dropped = 0
+        self._errors = 0
+        self._reconnects = 0
+        self._last_error: Optional[str] = None
+        self._last_result: Optional[dict] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._read_loop, name=f"stream-{self.stream.camera_id}", daemon=True
+        )
+        self._thread.start()
+        self._task = self._loop.create_task(self._consume())
+
+    def stop(self):
+        """Signal the reader thread and cancel the consumer; a blocked read exits on its own"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+        self.state = "stopped"
+
+    def join(self, timeout: float):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def sample_interval(self) -> float:
+        return max(1 / self.stream.sample_fps, self._processing_time)
+
+    def _read_loop(self):
+        """Reader thread: open the stream, grab continuously, decode sampled frames, reconnect on failure"""
+        url = self.stream.url
+        video_file = is_video_file(url)
+
+        while not self._stop.is_set():
+            capture = cv2.VideoCapture(url)
+            if not capture.isOpened():
+                capture.release()
+                if video_file:
+                    self._fail(f"Cannot open video file {url}", "failed")
+                    return
+                self._fail(f"Cannot open stream {url}")
+                self._stop.wait(settings.STREAM_RECONNECT_DELAY)
+                continue
+
+            self.state = "running"
+            fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+            started = time.monotonic()
+            frame_index = 0
+            next_sample = 0.0
+            while not self._stop.is_set():
+                if video_file and fps > 0:
+                    # Replay files at their own frame rate, like a live camera
+                    delay = started + frame_index / fps - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                if not capture.grab():
+                    break
+                frame_index += 1
+                self._grabbed += 1
+
+                now = time.monotonic()
+                if now < next_sample:
+                    continue
+                ok, image = capture.retrieve()
+                if not ok:
+                    continue
+                next_sample = now + self.sample_interval
+                self._offer(image)
+            capture.release()
+
+            if self._stop.is_set():
+                return
+            if video_file and not self.stream.loop:
+                self.state = "finished"
+                return
+            if not video_file:
+                self._fail(f"Stream {url} ended")
+                self._stop.wait(settings.STREAM_RECONNECT_DELAY)
+            self._reconnects += 1
+
+    def _fail(self, message: str, state: str = "reconnecting"):
+        logger.warning(f"Camera {self.stream.camera_id}: {message}")
+        self.state = state
+        self._last_error = message
+        self._errors += 1
+
+    def _offer(self, image: np.ndarray):
+        """Hand a decoded frame to the consumer, replacing one it has not picked up yet"""
+        with self._slot_lock:
+            if self._slot is not None:
+                self._dropped += 1
+            self._slot = (image, time.time())
+            self._sampled += 1
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Event loop closed (application shutdown)
+            self._stop.set()
+
+    async def _consume(self):
+        """Run the newest sampled frame through the pipeline, one at a time"""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            with self._slot_lock:
+                item, self._slot = self._slot, None
+            if item is None:
+                continue
+
+            await self._process(*item)
+
+    async def _process(self, image: np.ndarray, captured_at: float):
+        """Run one frame through the upload pipeline and update the stats"""
+        started = time.perf_counter()
+        try:
+            response = await frame_processor.process(None, self.session_id, self.stream.camera_id, image)
+            self._processed += 1
+            self._last_result = {
+                "captured_at": datetime.utcfromtimestamp(captured_at),
+                "detection_count": response["detection_count"],
+                "skipped": response.get("skipped", False),
+                "parking_analysis": response.get("parking_analysis")
+            }
+        except FrameError as e:
+            self._errors += 1
+            self._last_error = e.detail
+        except Exception as e:
+            # A failing frame (e.g. database hiccup) must not stop the stream
+            logger.error(f"Error processing stream frame of camera {self.stream.camera_id}: {e}", exc_info=True)
+            self._errors += 1
+            self._last_error = str(e)
+
+        elapsed = time.perf_counter() - started
+        self._processing_time = elapsed if not self._processing_time else 0.8 * self._processing_time + 0.2 * elapsed
+
+    def get_stats(self) -> dict:
+        return {
+            "url": self.stream.url,
+            "session_id": self.session_id,
+            "state": self.state,
+            "sample_fps": self.stream.sample_fps,
+            "effective_fps": round(1 / self.sample_interval, 2),
+            "avg_processing_ms": round(self._processing_time * 1000, 1),
+            "grabbed_frames": self._grabbed,
+            "sampled_frames": self._sampled,
+            "processed_frames": self._processed,
+            "dropped_frames": self._dropped,
+            "errors": self._errors,
+            "reconnects": self._reconnects,
+            "last_error": self._last_error,
+            "last_result": self._last_result
+        }
+
+class ShmRingPuller(StreamPuller):
+    """
+    Feeds a camera's shared-memory frame ring (url shm://{ring name}) to the frame pipeline
+
+    There is no reader thread: the consumer polls the ring's newest frame
+    number and copies the newest frame out of the ring, so a frame is neither
+    encoded nor decoded on the way in. The copy is checked against the slot
+    sequence before it reaches the pipeline; a frame overwritten while being
+    copied is dropped (torn_frames). Sampling follows sample_fps and the
+    processing time like the stream puller; frames written in between are
+    simply overwritten by the capture process.
+
+    A ring that stays silent for STREAM_RECONNECT_DELAY is attached again, in
+    case the capture process restarted with a new segment.
+    """
+
+    def __init__(self, stream: CameraStream, loop: asyncio.AbstractEventLoop):
+        super().__init__(stream, loop)
+        self.ring_name = stream.url[len(SHM_SCHEME):]
+        self._reader: Optional[FrameRingReader] = None
+        self._first_number = 0
+        self._last_number = 0
+        self._last_frame_at = 0.0
+        self._torn = 0  # torn copies of previous readers (a re-attach starts a new one)
+
+    def start(self):
+        self._task = self._loop.create_task(self._consume())
+
+    def _attach(self) -> bool:
+        try:
+            self._reader = FrameRingReader(self.ring_name)
+        except (FileNotFoundError, ValueError) as e:
+            self._fail(f"Frame ring {self.ring_name} not available: {e}", "waiting")
+            return False
+        self.state = "running"
+        self._first_number = self._last_number = self._reader.latest_number
+        self._last_frame_at = time.monotonic()
+        return True
+
+    def _detach(self):
+        if self._reader is not None:
+            self._torn += self._reader.torn
+            self._reader.close()
+            self._reader = None
+
+    async def _consume(self):
+        try:
+            while True:
+                if self._reader is None and not self._attach():
+                    await asyncio.sleep(settings.STREAM_RECONNECT_DELAY)
+                    continue
+
+                frame = self._reader.read(after=self._last_number)
+                if frame is None:
+                    if time.monotonic() - self._last_frame_at > settings.STREAM_RECONNECT_DELAY:
+                        self._detach()
+                        self._reconnects += 1
+                        if not self._attach():
+                            await asyncio.sleep(settings.STREAM_RECONNECT_DELAY)
+                        continue
+                    await asyncio.sleep(settings.SHM_RING_POLL_INTERVAL)
+                    continue
+
+                started = time.monotonic()
+                self._last_frame_at = started
+                self._grabbed = frame.number - self._first_number
+                self._last_number = frame.number
+                self._sampled += 1
+                await self._process(frame.image, frame.captured_at)
+
+                await asyncio.sleep(max(0.0, started + self.sample_interval - time.monotonic()))
+        finally:
+            self._detach()
+
+    def get_stats(self) -> dict:
+        stats = super().get_stats()
+        stats["torn_frames"] = self._torn + (self._reader.torn if self._reader is not None else 0)
+        return stats
+
+class StreamIngestService:
+    """Registered camera streams (stored in MongoDB) and their running pullers"""
+
+    def __init__(self):
+        self._pullers: Dict[str, StreamPuller] = {}
+
+    async def start(self):
+        """Start pullers for all enabled streams (called on application startup)"""
+        if not settings.STREAM_INGEST_ENABLED:
+            return
+        for stream in await self.list_streams(limit=0):
+            if stream.enabled:
+                self._restart(stream)
+
+    def stop(self):
+        """Stop all pullers (called on application shutdown)"""
+        for puller in self._pullers.values():
+            puller.stop()
+        # Let reader threads release their captures before the process exits
+        for puller in self._pullers.values():
+            puller.join(timeout=2.0)
+        self._pullers.clear()
+
+    def _restart(self, stream: Optional[CameraStream], camera_id: Optional[str] = None):
+        """Replace the camera's puller with one for the given stream (None or disabled: just stop it)"""
+        camera_id = stream.camera_id if stream else camera_id
+        previous = self._pullers.pop(camera_id, None)
+        if previous is not None:
+            previous.stop()
+        if stream is not None and stream.enabled and settings.STREAM_INGEST_ENABLED:
+            puller_class = ShmRingPuller if is_shm_ring(stream.url) else StreamPuller
+            puller = puller_class(stream, asyncio.get_running_loop())
+            puller.start()
+            self._pullers[camera_id] = puller
+            logger.info(f"Pulling stream of camera {camera_id} at up to {stream.sample_fps} fps")
+
+    async def get_stream(self, camera_id: str) -> Optional[CameraStream]:
+        db = get_database()
+        stream = await db.camera_streams.find_one({"camera_id": camera_id})
+        return CameraStream(**stream) if stream else None
+
+    async def save_stream(self, camera_id: str, data: CameraStreamUpdate) -> CameraStream:
+        """
+        Create or update the stream of a camera and (re)start its puller
+        Only fields present in the request are changed
+        """
+        if data.url and is_video_file(data.url) and not os.path.exists(data.url):
+            raise ValueError(f"Video file not found at {data.url}")
+        if data.url and is_shm_ring(data.url) and not data.url[len(SHM_SCHEME):]:
+            raise ValueError("shm:// stream URL needs a ring name")
+
+        db = get_database()
+        existing = await db.camera_streams.find_one({"camera_id": camera_id})
+        if existing is None and not data.url:
+            raise ValueError("url is required for a new stream")
+
+        update_data = data.dict(exclude_unset=True)
+        update_data["updated_at"] = datetime.utcnow()
+        await db.camera_streams.update_one(
+            {"camera_id": camera_id},
+            {
+                "$set": update_data,
+                "$setOnInsert": {"camera_id": camera_id, "created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+        stream = await self.get_stream(camera_id)
+        self._restart(stream)
+        return stream
+
+    async def delete_stream(self, camera_id: str) -> bool:
+        """Stop the camera's puller and remove its stream"""
+        self._restart(None, camera_id)
+        db = get_database()
+        result = await db.camera_streams.delete_one({"camera_id": camera_id})
+        return result.deleted_count > 0
+
+    async def list_streams(self, skip: int = 0, limit: int = 50) -> List[CameraStream]:
+        db = get_database()
+        cursor = db.camera_streams.find().skip(skip).limit(limit)
+        streams = await cursor.to_list(length=limit or None)
+        return [CameraStream(**s) for s in streams]
+
+    def get_status(self, camera_id: str) -> Optional[dict]:
+        puller = self._pullers.get(camera_id)
+        return puller.get_stats() if puller else None
+
+    def get_stats(self) -> dict:
+        return {camera_id: puller.get_stats() for camera_id, puller in self._pullers.items()}
+
+# Singleton instance
+stream_ingest_service = StreamIngestService()
@@ -0,0 +1,61 @@
+import threading
+from typing import AsyncIterator, List, Tuple
+
+from app.core.config import settings
+
+class UploadBufferPool:
+    """
+    Reusable bytearrays for raw-body uploads
+
+    Request bodies are streamed straight into a pooled buffer and decoded
+    from a memoryview of it, so a request costs no bytes object of its own
+    and steady traffic allocates no new upload memory. Buffers grow to the
+    largest body seen; at most max_buffers idle ones are kept.
+    """
+
+    def __init__(self, max_buffers: int, buffer_size: int, max_body_size: int):
+        self.max_buffers = max_buffers
+        self.buffer_size = buffer_size
+        self.max_body_size = max_body_size
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size_hint: int = 0) -> bytearray:
+        """An idle buffer of at least size_hint bytes, or a new one"""
+        with self._lock:
+            for i, buffer in enumerate(self._free):
+                if len(buffer) >= size_hint:
+                    return self._free.pop(i)
+        return bytearray(max(self.buffer_size, min(size_hint, self.max_body_size)))
+
+    def release(self, buffer: bytearray):
+        with self._lock:
+            if len(self._free) < self.max_buffers:
+                self._free.append(buffer)
+
+    async def read_stream(self, buffer: bytearray, chunks: AsyncIterator[bytes]) -> Tuple[bytearray, int]:
+        """
+        Copy a streamed body into buffer, replacing it with a larger one if needed
+        Raises ValueError when the body exceeds max_body_size
+        Returns: (buffer holding the body, body length)
+        """
+        length = 0
+        async for chunk in chunks:
+            end = length + len(chunk)
+            if end > self.max_body_size:
+                raise ValueError(f"Request body exceeds {self.max_body_size} bytes")
+            if end > len(buffer):
+                # Never resized in place: stale views of a pooled buffer may still exist
+                grown = bytearray(min(self.max_body_size, max(end, len(buffer) * 2)))
+                grown[:length] = memoryview(buffer)[:length]
+                buffer = grown
+            buffer[length:end] = chunk
+            length = end
+        return buffer, length
+
+# Singleton instance
+upload_buffers = UploadBufferPool(
+    max_buffers=settings.UPLOAD_BUFFER_POOL_SIZE,
+    buffer_size=settings.UPLOAD_BUFFER_BYTES,
+    max_body_size=settings.MAX_UPLOAD_BYTES
+)
@@ -0,0 +1,285 @@
+"""
+Offline video jobs: occupancy time series from recorded footage
+
+A job splits a video file into time segments. Segments are decoded in a
+pool of processes (only every sampled frame is converted, already
+downscaled to the resolution the model needs), their frames go through the
+batched detection pipeline concurrently with the other segments (ROI,
+tiles and cascade of the camera, no per-camera tracking state), then through
+EmptySpaceDetector. Each segment's points are stored on their own before
+the segment is marked completed, so an interrupted job resumes with the
+segments that are still missing.
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.db.mongodb import get_database
+from app.models.calibration import CameraCalibration
+from app.models.inference_profile import InferenceParams, InferenceProfile
+from app.models.video_job import VideoJob, VideoJobCreate
+from app.services.calibration_service import calibration_service
+from app.services.inference_profile_service import inference_profile_service
+from app.services.empty_space_detector import EmptySpaceDetector
+from app.services.frame_processor import decode_factor, detect_frame
+from app.services.video_segments import decode_segment, plan_segments, probe_video
+from app.services.yolo_service import yolo_service
+
+logger = logging.getLogger(__name__)
+
+class VideoJobService:
+    """Creates, runs, resumes and reports offline video jobs (stored in MongoDB)"""
+
+    def __init__(self, decode_workers: int, max_concurrent: int):
+        self.decode_workers = max(1, decode_workers)
+        self.max_concurrent = max(1, max_concurrent)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.decode_workers, mp_context=mp.get_context("spawn"))
+        return self._pool
+
+    async def create_job(self, data: VideoJobCreate) -> VideoJob:
+        """Probe the video and store the job with its segment plan (start it with start())"""
+        if not os.path.exists(data.video_path):
+            raise ValueError(f"Video not found at {data.video_path}")
+
+        info = await asyncio.get_running_loop().run_in_executor(None, probe_video, data.video_path)
+        segment_seconds = data.segment_seconds or settings.VIDEO_JOB_SEGMENT_SECONDS
+        step, segment_frames, segment_count = plan_segments(
+            info, data.sample_seconds, segment_seconds, settings.VIDEO_JOB_MAX_SEGMENT_SAMPLES
+        )
+
+        job = VideoJob(
+            job_id=str(uuid.uuid4()),
+            camera_id=data.camera_id,
+            video_path=data.video_path,
+            sample_seconds=data.sample_seconds,
+            segment_seconds=segment_seconds,
+            video_start=data.video_start,
+            fps=info.fps,
+            frame_count=info.frame_count,
+            width=info.width,
+            height=info.height,
+            step=step,
+            segment_frames=segment_frames,
+            segment_count=segment_count,
+            total_samples=-(-info.frame_count // step)
+        )
+        db = get_database()
+        await db.video_jobs.insert_one(job.dict(by_alias=True, exclude={"id"}))
+        return job
+
+    def start(self, job_id: str):
+        """Run a job in the background (waits for a free job slot)"""
+        if job_id in self._tasks and not self._tasks[job_id].done():
+            return
+        task = asyncio.get_running_loop().create_task(self.run_job(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume_pending(self):
+        """Restart jobs that were queued or running when the server stopped (called on startup)"""
+        db = get_database()
+        jobs = await db.video_jobs.find({"status": {"$in": ["queued", "running"]}}).to_list(length=None)
+        for job in jobs:
+            logger.info(f"Resuming video job {job['job_id']} ({len(job.get('completed_segments', []))}/{job['segment_count']} segments done)")
+            self.start(job["job_id"])
+
+    async def requeue_job(self, job_id: str) -> Optional[VideoJob]:
+        """Set a failed or cancelled job back to queued so run_job() picks it up; completed segments are kept"""
+        job = await self.get_job(job_id)
+        if job is None:
+            return None
+        if job.status in ("failed", "cancelled"):
+            await self._set(job_id, status="queued", error=None)
+            job = await self.get_job(job_id)
+        return job
+
+    async def resume_job(self, job_id: str) -> Optional[VideoJob]:
+        """Queue a failed or cancelled job again and run it in the background"""
+        if await self.requeue_job(job_id) is None:
+            return None
+        self.start(job_id)
+        return await self.get_job(job_id)
+
+    async def cancel_job(self, job_id: str) -> bool:
+        db = get_database()
+        result = await db.video_jobs.update_one(
+            {"job_id": job_id, "status": {"$in": ["queued", "running"]}},
+            {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}}
+        )
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return result.modified_count > 0
+
+    async def run_job(self, job_id: str, on_progress: Optional[Callable[[VideoJob], None]] = None) -> Optional[VideoJob]:
+        """
+        Process the job's missing segments, decode_workers segments at a time
+        on_progress is called with the job after every completed segment
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+
+        async with self._slots:
+            job = await self.get_job(job_id)
+            if job is None or job.status in ("completed", "cancelled"):
+                return job
+
+            await self._set(job_id, status="running", started_at=job.started_at or datetime.utcnow())
+            done = set(job.completed_segments)
+            pending = deque(segment for segment in range(job.segment_count) if segment not in done)
+            logger.info(f"Video job {job_id}: {len(pending)} of {job.segment_count} segment(s) to process")
+
+            try:
+                calibration = await calibration_service.get_calibration(job.camera_id)
+                profile = await inference_profile_service.get_profile(job.camera_id)
+                params = inference_profile_service.resolve_params(profile)
+                factor = await decode_factor((job.height, job.width), calibration, profile, params)
+
+                async def worker():
+                    while pending:
+                        segment = pending.popleft()
+                        await self._run_segment(job, segment, calibration, profile, params, factor)
+                        if on_progress is not None:
+                            on_progress(await self.get_job(job_id))
+
+                workers = [asyncio.create_task(worker()) for _ in range(self.decode_workers)]
+                try:
+                    done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+                finally:
+                    # One failed segment fails the job, so the other workers stop too
+                    for task in workers:
+                        task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                for task in done:
+                    if not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+            except asyncio.CancelledError:
+                # Status stays "running" on shutdown, so the job resumes on the next start
+                raise
+            except Exception as e:
+                logger.error(f"Video job {job_id} failed: {e}", exc_info=True)
+                await self._set(job_id, status="failed", error=str(e))
+                return await self.get_job(job_id)
+
+            await self._set(job_id, status="completed", finished_at=datetime.utcnow())
+            return await self.get_job(job_id)
+
+    async def _run_segment(
+        self,
+        job: VideoJob,
+        segment: int,
+        calibration: Optional[CameraCalibration],
+        profile: Optional[InferenceProfile],
+        params: InferenceParams,
+        factor: int
+    ):
+        start = segment * job.segment_frames
+        end = min(job.frame_count, start + job.segment_frames)
+        frames = await asyncio.get_running_loop().run_in_executor(
+            self._executor(), decode_segment, job.video_path, start, end, job.step, factor
+        )
+
+        # All frames of the segment are in the batch queue at once and share forward passes
+        shape = (job.height, job.width)
+        results = await asyncio.gather(*(
+            detect_frame(image, None, calibration, profile, params, shape, factor) for _, image in frames
+        ))
+        points = self._points(
+            job, [index for index, _ in frames], [detection_array for detection_array, _, _ in results], calibration
+        )
+        model_version = results[-1][1] if results else yolo_service.model_version
+
+        # Points first: a crash in between only repeats this segment
+        db = get_database()
+        await db.video_job_segments.update_one(
+            {"job_id": job.job_id, "segment": segment},
+            {"$set": {"points": points, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        await db.video_jobs.update_one(
+            {"job_id": job.job_id},
+            {
+                "$addToSet": {"completed_segments": segment},
+                "$inc": {"processed_frames": len(points)},
+                "$set": {"model_version": model_version, "updated_at": datetime.utcnow()}
+            }
+        )
+
+    @staticmethod
+    def _points(
+        job: VideoJob,
+        frame_indexes: List[int],
+        detection_arrays: List[np.ndarray],
+        calibration: Optional[CameraCalibration]
+    ) -> List[dict]:
+        """Time series points of a segment's sampled frames: detections and empty spaces"""
+        results = [yolo_service.to_result(array) for array in detection_arrays]
+        # Empty spaces of all frames of the segment in one pass
+        analyses = EmptySpaceDetector(calibration).process_batch(results, job.job_id) if calibration else [None] * len(results)
+
+        points = []
+        for frame_index, result, analysis in zip(frame_indexes, results, analyses):
+            seconds = frame_index / job.fps
+            point = {"frame": frame_index, "t": round(seconds, 3)}
+            if job.video_start:
+                point["timestamp"] = job.video_start + timedelta(seconds=seconds)
+
+            point["motorcycles"] = result.count
+            if analysis:
+                point["motorcycles"] = analysis.total_motorcycles
+                point["empty_spaces"] = analysis.total_empty_spaces
+                # Convert integer keys to strings for MongoDB
+                point["empty_spaces_per_row"] = {str(k): v for k, v in analysis.empty_spaces_per_row.items()}
+                point["occupancy_rate"] = analysis.parking_occupancy_rate
+            points.append(point)
+        return points
+
+    async def _set(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.utcnow()
+        db = get_database()
+        await db.video_jobs.update_one({"job_id": job_id}, {"$set": fields})
+
+    async def get_job(self, job_id: str) -> Optional[VideoJob]:
+        db = get_database()
+        job = await db.video_jobs.find_one({"job_id": job_id})
+        return VideoJob(**job) if job else None
+
+    async def list_jobs(self, skip: int = 0, limit: int = 50) -> List[VideoJob]:
+        db = get_database()
+        cursor = db.video_jobs.find().sort("created_at", -1).skip(skip).limit(limit)
+        return [VideoJob(**job) for job in await cursor.to_list(length=limit)]
+
+    async def get_series(self, job_id: str) -> List[dict]:
+        """Occupancy time series of the completed segments, in video order"""
+        db = get_database()
+        segments = await db.video_job_segments.find({"job_id": job_id}).sort("segment", 1).to_list(length=None)
+        return [point for segment in segments for point in segment["points"]]
+
+    async def stop(self):
+        """Cancel running jobs (they resume on the next start) and stop the decode processes"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Singleton instance
+video_job_service = VideoJobService(
+    decode_workers=settings.VIDEO_JOB_DECODE_WORKERS,
+    max_concurrent=settings.VIDEO_JOB_MAX_CONCURRENT
+)
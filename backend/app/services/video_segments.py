@@ -0,0 +1,90 @@
+"""
+Video probing and segment decoding for offline video jobs
+
+Kept free of the model and database imports so the decode processes of a
+job (spawned by a ProcessPoolExecutor) start quickly and do not load YOLO.
+"""
+from typing import List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+class VideoInfo(NamedTuple):
+    fps: float
+    frame_count: int
+    width: int
+    height: int
+
+def probe_video(path: str) -> VideoInfo:
+    """Frame rate, frame count and size of a video file; raises ValueError if it cannot be read"""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video {path}")
+        info = VideoInfo(
+            fps=capture.get(cv2.CAP_PROP_FPS) or 0.0,
+            frame_count=int(capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+            width=int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        )
+    finally:
+        capture.release()
+
+    if info.fps <= 0 or info.frame_count <= 0:
+        raise ValueError(f"Video {path} reports no frame rate or frame count")
+    return info
+
+def plan_segments(
+    info: VideoInfo,
+    sample_seconds: float,
+    segment_seconds: float,
+    max_samples: int = 0
+) -> Tuple[int, int, int]:
+    """
+    Frame step between samples and frames per segment (a whole number of steps)
+    max_samples caps the sampled frames per segment (0 = no cap): a segment's
+    decoded frames are held in memory at once, so dense sampling shortens the
+    segment instead of growing it
+    Returns: (step, segment_frames, segment_count)
+    """
+    step = max(1, round(sample_seconds * info.fps))
+    samples = round(segment_seconds * info.fps) // step
+    if max_samples > 0:
+        samples = min(samples, max_samples)
+    segment_frames = max(1, samples) * step
+    segment_count = -(-info.frame_count // segment_frames)
+    return step, segment_frames, segment_count
+
+def decode_segment(
+    path: str,
+    start_frame: int,
+    end_frame: int,
+    step: int,
+    factor: int = 1
+) -> List[Tuple[int, np.ndarray]]:
+    """
+    Decode every step-th frame in [start_frame, end_frame), downscaled by factor
+    Runs in a decode process; frames in between are only grabbed, not converted
+    Returns: (frame index, BGR image) pairs
+    """
+    capture = cv2.VideoCapture(path)
+    frames = []
+    try:
+        if start_frame:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        for index in range(start_frame, end_frame):
+            if not capture.grab():
+                break
+            if (index - start_frame) % step:
+                continue
+            ok, image = capture.retrieve()
+            if not ok:
+                continue
+            if factor > 1:
+                # Same size a 1/factor JPEG decode would give, so boxes map back the same way
+                h, w = image.shape[:2]
+                image = cv2.resize(image, (-(-w // factor), -(-h // factor)), interpolation=cv2.INTER_AREA)
+            frames.append((index, image))
+    finally:
+        capture.release()
+    return frames
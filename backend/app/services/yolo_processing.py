@@ -0,0 +1,254 @@
+"""
+Shared YOLO pre- and post-processing
+
+Mirrors what ultralytics does inside model.predict() so every backend
+produces the same compact (N, 6) detection arrays:
+[x1, y1, x2, y2, confidence, class_id] in original image coordinates.
+"""
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+
+# Class offset used to run per-class NMS in a single pass (same as ultralytics)
+MAX_WH = 7680
+# Maximum number of boxes handed to NMS
+MAX_NMS = 30000
+
+def letterbox(
+    image: np.ndarray,
+    new_shape: Tuple[int, int],
+    stride: int = 32,
+    auto: bool = False,
+    pad_value: int = 114
+) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """
+    Resize and pad image to new_shape (h, w) keeping aspect ratio
+    If auto is True, padding is reduced to the minimum multiple of stride (rectangular input)
+    Returns: (letterboxed image, scale ratio, (pad_w, pad_h) per side)
+    """
+    h, w = image.shape[:2]
+    ratio = min(new_shape[0] / h, new_shape[1] / w)
+    new_unpad = (int(round(w * ratio)), int(round(h * ratio)))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    if auto:
+        dw, dh = np.mod(dw, stride), np.mod(dh, stride)
+    dw /= 2
+    dh /= 2
+
+    if (w, h) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(
+        image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(pad_value, pad_value, pad_value)
+    )
+    return image, ratio, (dw, dh)
+
+def rect_shape(image_shape: Tuple[int, int], imgsz: int, stride: int = 32) -> Tuple[int, int]:
+    """
+    Smallest stride-aligned input (h, w) that holds image_shape scaled to imgsz
+    on its long side, e.g. 1080x1920 at 640 -> 384x640 instead of 640x640
+    (same shape ultralytics uses for a batch of equally sized frames)
+    """
+    h, w = image_shape
+    ratio = min(imgsz / h, imgsz / w)
+    new_h, new_w = int(round(h * ratio)), int(round(w * ratio))
+    return new_h + (imgsz - new_h) % stride, new_w + (imgsz - new_w) % stride
+
+def preprocess(images: List[np.ndarray], input_shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Letterbox BGR images to input_shape (h, w) and stack them into a
+    float32 NCHW RGB tensor scaled to 0-1
+    """
+    batch = np.empty((len(images), 3, input_shape[0], input_shape[1]), dtype=np.float32)
+    for i, image in enumerate(images):
+        boxed, _, _ = letterbox(image, input_shape)
+        # BGR HWC -> RGB CHW
+        batch[i] = boxed[..., ::-1].transpose(2, 0, 1)
+    batch /= 255.0
+    return batch
+
+def xywh2xyxy(boxes: np.ndarray) -> np.ndarray:
+    """Convert (cx, cy, w, h) boxes to (x1, y1, x2, y2)"""
+    xyxy = np.empty_like(boxes)
+    half_w = boxes[:, 2] / 2
+    half_h = boxes[:, 3] / 2
+    xyxy[:, 0] = boxes[:, 0] - half_w
+    xyxy[:, 1] = boxes[:, 1] - half_h
+    xyxy[:, 2] = boxes[:, 0] + half_w
+    xyxy[:, 3] = boxes[:, 1] + half_h
+    return xyxy
+
+def score_order(scores: np.ndarray) -> np.ndarray:
+    """
+    Indices by descending score, ties broken by the lower index first
+    (the order torchvision NMS keeps boxes in)
+    """
+    return np.lexsort((np.arange(len(scores)), -scores))
+
+def nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float,
+    metric: str = "iou",
+    max_keep: int = 0,
+    groups: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Greedy non-maximum suppression
+    metric "iou" is intersection over union; "ios" is intersection over the
+    smaller box, which also suppresses partial boxes cut off at tile seams
+    max_keep stops once that many boxes are kept (0 = no limit)
+    groups: optional (N,) group id per box; boxes of the same group never suppress each other
+    Returns: indices of kept boxes, highest score first (equal scores: lower index first)
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = score_order(scores)
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        if len(keep) == max_keep:
+            break
+        rest = order[1:]
+
+        inter_w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        inter_h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = inter_w * inter_h
+        if metric == "ios":
+            iou = inter / (np.minimum(areas[i], areas[rest]) + 1e-7)
+        else:
+            iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+
+        suppressed = iou > iou_threshold
+        if groups is not None:
+            suppressed &= groups[rest] != groups[i]
+        order = rest[~suppressed]
+
+    return np.array(keep, dtype=np.int64)
+
+def scale_boxes(
+    boxes: np.ndarray,
+    input_shape: Tuple[int, int],
+    image_shape: Tuple[int, int]
+) -> np.ndarray:
+    """Map boxes from letterboxed input_shape (h, w) back to the original image_shape (h, w)"""
+    gain = min(input_shape[0] / image_shape[0], input_shape[1] / image_shape[1])
+    pad_x = round((input_shape[1] - image_shape[1] * gain) / 2 - 0.1)
+    pad_y = round((input_shape[0] - image_shape[0] * gain) / 2 - 0.1)
+
+    boxes[:, [0, 2]] -= pad_x
+    boxes[:, [1, 3]] -= pad_y
+    boxes[:, :4] /= gain
+
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+    return boxes
+
+def postprocess(
+    prediction: np.ndarray,
+    input_shape: Tuple[int, int],
+    image_shapes: List[Tuple[int, int]],
+    conf_threshold: float,
+    iou_threshold: float,
+    max_det: int,
+    top_k: int = 0
+) -> List[np.ndarray]:
+    """
+    Decode raw YOLO head output of shape (B, 4 + num_classes, anchors)
+    top_k caps the candidates handed to NMS (0 = MAX_NMS)
+    Returns: one (N, 6) float32 array per image [x1, y1, x2, y2, confidence, class_id]
+    """
+    if prediction.shape[1] == 5:
+        return postprocess_single_class(
+            prediction, input_shape, image_shapes, conf_threshold, iou_threshold, max_det, top_k
+        )
+
+    max_nms = min(top_k, MAX_NMS) if top_k > 0 else MAX_NMS
+    outputs = []
+    for pred, image_shape in zip(prediction, image_shapes):
+        pred = pred.T  # (anchors, 4 + num_classes)
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        mask = scores > conf_threshold
+        if not mask.any():
+            outputs.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+
+        boxes = xywh2xyxy(pred[mask, :4])
+        scores = scores[mask]
+        class_ids = class_ids[mask]
+
+        if len(scores) > max_nms:
+            top = score_order(scores)[:max_nms]
+            boxes, scores, class_ids = boxes[top], scores[top], class_ids[top]
+
+        # Offset boxes by class so one NMS pass never suppresses across classes
+        keep = nms(boxes + class_ids[:, None] * MAX_WH, scores, iou_threshold, max_keep=max_det)
+
+        detections = np.empty((len(keep), 6), dtype=np.float32)
+        detections[:, :4] = scale_boxes(boxes[keep], input_shape, image_shape)
+        detections[:, 4] = scores[keep]
+        detections[:, 5] = class_ids[keep]
+        outputs.append(detections)
+
+    return outputs
+
+def postprocess_single_class(
+    prediction: np.ndarray,
+    input_shape: Tuple[int, int],
+    image_shapes: List[Tuple[int, int]],
+    conf_threshold: float,
+    iou_threshold: float,
+    max_det: int,
+    top_k: int = 0
+) -> List[np.ndarray]:
+    """
+    postprocess() for single-class models, output (B, 5, anchors)
+    The score row is the confidence, so there is no per-anchor argmax and NMS
+    needs no class offset; candidates are filtered for the whole batch at once
+    and only the top_k highest-scoring ones reach NMS.
+    Returns the same boxes as the general path (with top_k = 0)
+    """
+    max_nms = min(top_k, MAX_NMS) if top_k > 0 else MAX_NMS
+    passed = prediction[:, 4, :] > conf_threshold
+
+    outputs = []
+    for pred, mask, image_shape in zip(prediction, passed, image_shapes):
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            outputs.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+
+        scores = pred[4, candidates]
+        if len(candidates) > max_nms:
+            top = np.argpartition(-scores, max_nms - 1)[:max_nms]
+            candidates, scores = candidates[top], scores[top]
+
+        boxes = xywh2xyxy(pred[:4, candidates].T)
+        keep = nms(boxes, scores, iou_threshold, max_keep=max_det)
+
+        detections = np.zeros((len(keep), 6), dtype=np.float32)
+        detections[:, :4] = scale_boxes(boxes[keep], input_shape, image_shape)
+        detections[:, 4] = scores[keep]
+        outputs.append(detections)
+
+    return outputs
+
+def scale_detections(detections: np.ndarray, factor: float) -> np.ndarray:
+    """Scale (N, 6) detections found in a downscaled image back up by factor"""
+    detections = detections.copy()
+    detections[:, :4] *= factor
+    return detections
+
+def translate_detections(detections: np.ndarray, dx: float, dy: float) -> np.ndarray:
+    """Shift (N, 6) detections found in a crop back to full-frame coordinates"""
+    detections = detections.copy()
+    detections[:, [0, 2]] += dx
+    detections[:, [1, 3]] += dy
+    return detections
@@ -1,56 +1,344 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from app.core.config import settings
-from app.models.detection import BoundingBox
+from app.models.detection import BoundingBox, DetectionResult
+from app.models.calibration import CameraCalibration
+from app.models.inference_profile import InferenceParams
+from app.services.inference_backends import InferenceBackend, create_backend
+from app.services.model_registry import model_registry
+from app.services.yolo_processing import MAX_WH, nms, translate_detections
 import os
+import threading
 
 class YOLOService:
     def __init__(self):
-        self.model = None
+        self.backend = None
+        self.names = {}
+        self.model_path = None
+        self.model_version = None
+        # (backend, version) snapshot taken by every prediction; replaced in one assignment on swap
+        self._active = None
+        # Extra backends requested by per-camera inference profiles, keyed by (model_path, backend)
+        # Copy-on-write like _active: readers never lock, writers replace the dict under the lock
+        self._profile_backends = {}
+        self._profile_lock = threading.Lock()
+        # Model cascade counters: frames/regions that stayed on the small model vs escalated
+        self._cascade = {"frames": 0, "escalated_frames": 0, "regions": 0, "escalated_regions": 0}
         self.load_model()
     
     def load_model(self):
-        """Load YOLO model"""
-        if not os.path.exists(settings.MODEL_PATH):
-            raise FileNotFoundError(f"Model not found at {settings.MODEL_PATH}")
+        """Load YOLO model (the registry's active version if set, else MODEL_PATH)"""
+        active = model_registry.active_model()
+        model_path, version = active if active else (settings.MODEL_PATH, None)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model not found at {model_path}")
         
-        self.model = YOLO(settings.MODEL_PATH)
-        print(f"✅ Model loaded from {settings.MODEL_PATH}")
+        backend = create_backend(
+            model_path,
+            settings.INFERENCE_BACKEND,
+            settings.INFERENCE_THREADS
+        )
+        self._set_active(backend, model_path, version or self.file_version(model_path))
+        print(f"✅ Model loaded from {model_path} ({self.backend.name} backend)")
     
-    def detect(self, image: np.ndarray) -> Tuple[List[BoundingBox], int]:
+    def activate(self, model_path: str, version: str):
+        """
+        Load and warm up another model, then swap it in
+        Predictions already running keep the backend they started with
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model not found at {model_path}")
+        
+        backend = create_backend(model_path, settings.INFERENCE_BACKEND, settings.INFERENCE_THREADS)
+        self.warmup(backend)
+        self._set_active(backend, model_path, version)
+        print(f"✅ Model version {version} activated from {model_path} ({backend.name} backend)")
+    
+    def _set_active(self, backend: InferenceBackend, model_path: str, version: str):
+        previous_path = self.model_path
+        self._active = (backend, version)
+        self.backend = backend
+        self.names = backend.names
+        self.model_path = model_path
+        self.model_version = version
+        
+        # Profile backends that only override the runtime were built from the previous default model
+        with self._profile_lock:
+            self._profile_backends = {
+                key: loaded for key, loaded in self._profile_backends.items() if key[0] != previous_path
+            }
+    
+    def warmup(self, backend: InferenceBackend, size: int = 640):
+        """Run a dummy frame so the first real request does not pay for lazy initialisation"""
+        dummy = np.full((size, size, 3), 114, dtype=np.uint8)
+        backend.predict_arrays(
+            [dummy],
+            conf=settings.CONFIDENCE_THRESHOLD,
+            iou=settings.IOU_THRESHOLD,
+            max_det=settings.MAX_DETECTIONS
+        )
+    
+    @staticmethod
+    def file_version(path: str) -> str:
+        """Identifies a model file by name and modification time, changes when the file is replaced"""
+        name = os.path.basename(os.path.normpath(path))
+        return f"{name}@{int(os.path.getmtime(path))}"
+    
+    def detect(self, image: np.ndarray) -> DetectionResult:
         """
         Detect objects in image
-        Returns: (list of bounding boxes, detection count)
+        Returns: columnar DetectionResult (boxes, scores, class_ids arrays)
+        """
+        return self.detect_batch([image])[0]
+    
+    def detect_batch(self, images: List[np.ndarray]) -> List[DetectionResult]:
+        """
+        Detect objects in several images with a single forward pass
+        Returns: one DetectionResult per input image, in order
         """
-        results = self.model.predict(
-            image,
+        return [self.to_result(array) for array in self.predict_arrays(images)]
+    
+    def default_params(self) -> InferenceParams:
+        """Inference parameters from the global settings"""
+        return InferenceParams(
             conf=settings.CONFIDENCE_THRESHOLD,
             iou=settings.IOU_THRESHOLD,
-            max_det=settings.MAX_DETECTIONS,
-            verbose=False
+            max_det=settings.MAX_DETECTIONS
+        )
+    
+    def get_backend(self, model_path: Optional[str] = None, backend: str = "auto") -> Tuple[InferenceBackend, str]:
+        """
+        (backend, model version) for a profile's model_path/backend, loaded on first use
+        Falls back to the active model when neither is set
+        """
+        if model_path is None and backend == "auto":
+            return self._active
+        
+        key = (model_path or self.model_path, backend)
+        loaded = self._profile_backends.get(key)
+        if loaded is None:
+            if not os.path.exists(key[0]):
+                raise FileNotFoundError(f"Model not found at {key[0]}")
+            loaded = (create_backend(key[0], backend, settings.INFERENCE_THREADS), self.file_version(key[0]))
+            with self._profile_lock:
+                self._profile_backends = {**self._profile_backends, key: loaded}
+            print(f"✅ Profile model loaded from {key[0]} ({loaded[0].name} backend)")
+        return loaded
+    
+    def loaded_backend(self, model_path: Optional[str] = None, backend: str = "auto") -> Optional[InferenceBackend]:
+        """The backend get_backend() would return if it is already loaded, else None (never loads)"""
+        if model_path is None and backend == "auto":
+            return self._active[0] if self._active else None
+        loaded = self._profile_backends.get((model_path or self.model_path, backend))
+        return loaded[0] if loaded else None
+    
+    def predict_versioned(
+        self,
+        images: List[np.ndarray],
+        params: Optional[InferenceParams] = None
+    ) -> Tuple[List[np.ndarray], str]:
+        """
+        Run the model on a batch of images
+        Returns: (one float32 array of shape (N, 6) per image with rows
+                 [x1, y1, x2, y2, confidence, class_id], version of the model that ran)
+        """
+        params = params or self.default_params()
+        backend, version = self.get_backend(params.model_path, params.backend)
+        arrays = backend.predict_arrays(
+            images,
+            conf=params.conf,
+            iou=params.iou,
+            max_det=params.max_det,
+            imgsz=params.imgsz
+        )
+        return arrays, version
+    
+    def predict_arrays(self, images: List[np.ndarray], params: Optional[InferenceParams] = None) -> List[np.ndarray]:
+        """
+        Run the model on a batch of images
+        Returns: one float32 array of shape (N, 6) per image with rows
+                 [x1, y1, x2, y2, confidence, class_id]
+        """
+        return self.predict_versioned(images, params)[0]
+    
+    @property
+    def cascade_enabled(self) -> bool:
+        return bool(settings.CASCADE_MODEL_PATH) and os.path.exists(settings.CASCADE_MODEL_PATH)
+    
+    def cascade_params(self, params: InferenceParams) -> Optional[InferenceParams]:
+        """
+        Params for the cascade's small model, or None when the cascade does not apply
+        (disabled, or the camera's profile pins its own model)
+        """
+        if not self.cascade_enabled or params.model_path is not None:
+            return None
+        return params._replace(
+            conf=min(params.conf, settings.CASCADE_MIN_CONFIDENCE),
+            model_path=settings.CASCADE_MODEL_PATH,
+            backend="auto"
         )
+    
+    def is_uncertain(self, detections: np.ndarray, calibration: Optional[CameraCalibration] = None) -> bool:
+        """
+        Whether a small-model result (full-frame coordinates) should go to the main model:
+        too many boxes with ambiguous scores, or an ambiguous box on a calibrated row
+        """
+        scores = detections[:, 4]
+        uncertain = detections[(scores >= settings.CASCADE_MIN_CONFIDENCE) & (scores < settings.CASCADE_ACCEPT_CONFIDENCE)]
+        if len(uncertain) > settings.CASCADE_MAX_UNCERTAIN:
+            return True
+        if calibration is None or not len(uncertain):
+            return False
+        
+        # Ambiguous boxes on a row change the empty space count, so they always escalate
+        center_x = (uncertain[:, 0] + uncertain[:, 2]) / 2
+        margin = settings.CASCADE_ROW_MARGIN
+        for row in calibration.rows:
+            start_x = row.start_x if row.start_x is not None else calibration.row_start_x
+            end_x = row.end_x if row.end_x is not None else calibration.row_end_x
+            on_row = (
+                (uncertain[:, 1] - margin <= row.y_coordinate)
+                & (uncertain[:, 3] + margin >= row.y_coordinate)
+                & (center_x >= start_x)
+                & (center_x <= end_x)
+            )
+            if on_row.any():
+                return True
+        return False
+    
+    @staticmethod
+    def accept_small(detections: np.ndarray, params: InferenceParams) -> np.ndarray:
+        """Small-model result kept as final: only boxes above the camera's confidence threshold"""
+        return detections[detections[:, 4] > params.conf]
+    
+    def record_cascade(self, regions: int, escalated: int):
+        self._cascade["frames"] += 1
+        self._cascade["escalated_frames"] += int(escalated > 0)
+        self._cascade["regions"] += regions
+        self._cascade["escalated_regions"] += escalated
+    
+    def get_cascade_stats(self) -> dict:
+        """How often the main model was needed; 1 - region_escalation_rate is the share of main-model calls saved"""
+        stats = self._cascade
+        return {
+            "enabled": self.cascade_enabled,
+            **stats,
+            "frame_escalation_rate": round(stats["escalated_frames"] / stats["frames"], 4) if stats["frames"] else 0.0,
+            "region_escalation_rate": round(stats["escalated_regions"] / stats["regions"], 4) if stats["regions"] else 0.0
+        }
+    
+    def to_result(self, array: np.ndarray) -> DetectionResult:
+        """Wrap a compact (N, 6) detection array as a columnar DetectionResult"""
+        return DetectionResult.from_array(array, self.names)
+    
+    def to_bounding_boxes(self, array: np.ndarray) -> List[BoundingBox]:
+        """Convert a compact (N, 6) detection array into BoundingBox objects"""
+        return self.to_result(array).to_bounding_boxes()
+    
+    def detect_tiled(
+        self,
+        image: np.ndarray,
+        tile_size: int,
+        overlap: float,
+        calibration: Optional[CameraCalibration] = None,
+        params: Optional[InferenceParams] = None
+    ) -> np.ndarray:
+        """
+        Detect on overlapping tiles run as one batch, merged across tile seams
+        Returns: compact (N, 6) array in full-frame coordinates
+        """
+        params = params or self.default_params()
+        tiles = self.plan_tiles(image.shape[:2], tile_size, overlap, calibration)
+        if tiles is None:
+            return self.predict_arrays([image], params)[0]
         
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                conf = float(box.conf[0].cpu().numpy())
-                cls = int(box.cls[0].cpu().numpy())
-                class_name = result.names[cls]
-                
-                detections.append(BoundingBox(
-                    x1=float(x1),
-                    y1=float(y1),
-                    x2=float(x2),
-                    y2=float(y2),
-                    confidence=conf,
-                    class_name=class_name
-                ))
-        
-        return detections, len(detections)
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        return self.merge_tiles(self.predict_arrays(crops, params) if crops else [], tiles, params.max_det)
+    
+    @staticmethod
+    def plan_tiles(
+        image_shape: Tuple[int, int],
+        tile_size: int,
+        overlap: float,
+        calibration: Optional[CameraCalibration] = None
+    ) -> Optional[List[Tuple[int, int, int, int]]]:
+        """
+        Split a frame into overlapping tile_size x tile_size tiles
+        With a calibration, tiles that do not reach any row (line +/- ROI_ROW_MARGIN
+        within the row's X boundaries) are skipped
+        Returns: list of (x1, y1, x2, y2), or None if the frame fits in one tile
+        """
+        img_height, img_width = image_shape
+        if img_width <= tile_size and img_height <= tile_size:
+            return None
+        
+        stride = max(1, int(tile_size * (1 - overlap)))
+        
+        def starts(length: int) -> List[int]:
+            if length <= tile_size:
+                return [0]
+            positions = list(range(0, length - tile_size, stride))
+            positions.append(length - tile_size)
+            return positions
+        
+        tiles = [
+            (x, y, min(x + tile_size, img_width), min(y + tile_size, img_height))
+            for y in starts(img_height)
+            for x in starts(img_width)
+        ]
+        
+        if calibration is None:
+            return tiles
+        
+        margin = settings.ROI_ROW_MARGIN
+        row_spans = [
+            (
+                row.y_coordinate,
+                row.start_x if row.start_x is not None else calibration.row_start_x,
+                row.end_x if row.end_x is not None else calibration.row_end_x
+            )
+            for row in calibration.rows
+        ]
+        
+        return [
+            (x1, y1, x2, y2) for x1, y1, x2, y2 in tiles
+            if any(
+                y1 - margin <= row_y <= y2 + margin and start_x < x2 and end_x > x1
+                for row_y, start_x, end_x in row_spans
+            )
+        ]
+    
+    @staticmethod
+    def merge_tiles(
+        tile_detections: List[np.ndarray],
+        tiles: List[Tuple[int, int, int, int]],
+        max_det: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Shift per-tile detections to full-frame coordinates and merge duplicates
+        from overlapping tiles with class-aware NMS on intersection over smaller box
+        Only boxes from different tiles are merged: detections within a tile already
+        went through the model's NMS, and a partly hidden motorcycle mostly inside its
+        neighbour's box must stay
+        """
+        if not tile_detections:
+            return np.zeros((0, 6), dtype=np.float32)
+        
+        merged = np.concatenate([
+            translate_detections(detections, x1, y1)
+            for detections, (x1, y1, _, _) in zip(tile_detections, tiles)
+        ])
+        if not len(merged):
+            return merged
+        
+        tile_ids = np.repeat(np.arange(len(tile_detections)), [len(d) for d in tile_detections])
+        offset_boxes = merged[:, :4] + merged[:, 5:6] * MAX_WH
+        keep = nms(
+            offset_boxes, merged[:, 4], settings.TILE_MERGE_THRESHOLD,
+            metric="ios", max_keep=max_det or settings.MAX_DETECTIONS, groups=tile_ids
+        )
+        return merged[keep]
     
     def draw_detections(self, image: np.ndarray, detections: List[BoundingBox]) -> np.ndarray:
         """Draw bounding boxes on image"""
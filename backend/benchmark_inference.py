@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the lean torch backend against ultralytics model.predict()
+
+Runs both backends on the same frames, checks that they return the same
+boxes and reports per-frame latency for several batch sizes. Frames are
+resized to --frame-size (default 1920x1080) to reflect 16:9 camera uploads.
+
+Usage:
+    python benchmark_inference.py
+    python benchmark_inference.py --weights models/best.pt --batch-sizes 1 4 8 --runs 20
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import List
+
+import cv2
+import numpy as np
+
+from app.services.inference_backends import InferenceBackend, TorchBackend, UltralyticsBackend
+
+DEFAULT_DATASET = Path(__file__).resolve().parent.parent / "Dataset Parkiran UPJ.v3i.yolov12"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+def load_frames(split_dir: Path, count: int, frame_size: List[int]) -> List[np.ndarray]:
+    """First count images of a dataset split, resized to frame_size (w, h)"""
+    paths = sorted(p for p in (split_dir / "images").iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)[:count]
+    if not paths:
+        raise FileNotFoundError(f"No images found in {split_dir / 'images'}")
+    return [cv2.resize(cv2.imread(str(p)), tuple(frame_size)) for p in paths]
+
+def compare(a: List[np.ndarray], b: List[np.ndarray]) -> float:
+    """Largest absolute difference between two backends' detections; inf if box counts differ"""
+    worst = 0.0
+    for x, y in zip(a, b):
+        if x.shape != y.shape:
+            return float("inf")
+        if len(x):
+            worst = max(worst, float(np.abs(x - y).max()))
+    return worst
+
+def time_backend(
+    backend: InferenceBackend,
+    frames: List[np.ndarray],
+    batch_size: int,
+    runs: int,
+    args
+) -> float:
+    """Mean milliseconds per frame over runs batches"""
+    batch = [frames[i % len(frames)] for i in range(batch_size)]
+    for _ in range(2):
+        backend.predict_arrays(batch, args.conf, args.iou, args.max_det, args.imgsz)
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        backend.predict_arrays(batch, args.conf, args.iou, args.max_det, args.imgsz)
+    return (time.perf_counter() - start) * 1000 / (runs * batch_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ultralytics predict() with the lean torch backend")
+    parser.add_argument("--weights", default="models/best.pt")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET), help="Dataset root with train/ and test/")
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--frames", type=int, default=8, help="Number of dataset images to use")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[1920, 1080], metavar=("W", "H"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--runs", type=int, default=10, help="Timed batches per batch size")
+    parser.add_argument("--imgsz", type=int, default=None, help="Inference size (default: the model's)")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--max-det", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads (0 = library default)")
+    args = parser.parse_args()
+
+    frames = load_frames(Path(args.dataset) / args.split, args.frames, args.frame_size)
+    print(f"🖼️  {len(frames)} frames at {args.frame_size[0]}x{args.frame_size[1]}")
+
+    ultralytics_backend = UltralyticsBackend(args.weights, args.threads)
+    torch_backend = TorchBackend(args.weights, args.threads)
+
+    # Same boxes: one frame at a time and as a batch of equally sized frames
+    single = max(
+        compare(
+            ultralytics_backend.predict_arrays([f], args.conf, args.iou, args.max_det, args.imgsz),
+            torch_backend.predict_arrays([f], args.conf, args.iou, args.max_det, args.imgsz)
+        )
+        for f in frames
+    )
+    batched = compare(
+        ultralytics_backend.predict_arrays(frames, args.conf, args.iou, args.max_det, args.imgsz),
+        torch_backend.predict_arrays(frames, args.conf, args.iou, args.max_det, args.imgsz)
+    )
+    print(f"🔍 Max box difference: single {single:.4f}px, batched {batched:.4f}px")
+    if single == float("inf") or batched == float("inf"):
+        print("⚠️  Backends returned different box counts")
+
+    print(f"\n{'batch':>5}  {'ultralytics ms/frame':>20}  {'torch ms/frame':>14}  {'speedup':>7}")
+    for batch_size in args.batch_sizes:
+        slow = time_backend(ultralytics_backend, frames, batch_size, args.runs, args)
+        fast = time_backend(torch_backend, frames, batch_size, args.runs, args)
+        print(f"{batch_size:>5}  {slow:>20.1f}  {fast:>14.1f}  {slow / fast:>6.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,11 @@ import os
 from app.api import frames, results, users, admin, calibration
 from app.core.config import settings
 from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.services.inference_batcher import inference_batcher
+from app.services.inference_pool import inference_pool
+from app.services.yolo_service import yolo_service
+from app.services.stream_ingest import stream_ingest_service
+from app.services.video_jobs import video_job_service
 
 app = FastAPI(
     title="ParkIt API",
@@ -38,9 +43,16 @@ app.add_middleware(
 async def startup_event():
     await connect_to_mongo()
     print("✅ Connected to MongoDB")
+    inference_pool.start(yolo_service.model_path, yolo_service.model_version)
+    await stream_ingest_service.start()
+    await video_job_service.resume_pending()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    stream_ingest_service.stop()
+    await video_job_service.stop()
+    await inference_batcher.stop()
+    inference_pool.stop()
     await close_mongo_connection()
     print("❌ Disconnected from MongoDB")
 
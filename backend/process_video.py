@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Analyse a recorded parking video into an occupancy time series
+
+Runs an offline video job in this process (same pipeline and MongoDB
+collections as POST /api/admin/video-jobs): the video is split into time
+segments that are decoded in parallel processes, sampled frames go through
+batched detection and EmptySpaceDetector with the camera's calibration.
+Progress is stored per segment, so an interrupted run continues with
+--resume.
+
+Usage:
+    python process_video.py recordings/lot_2024-05-01.mp4 --camera-id parking-area-1
+    python process_video.py recordings/lot.mp4 --camera-id parking-area-1 --sample-seconds 10 --csv occupancy.csv
+    python process_video.py --resume <job_id> --csv occupancy.csv
+"""
+
+import argparse
+import asyncio
+import csv
+from datetime import datetime
+from typing import List
+
+CSV_FIELDS = ["frame", "t", "timestamp", "motorcycles", "empty_spaces", "occupancy_rate", "empty_spaces_per_row"]
+
+def print_progress(job):
+    print(f"  {len(job.completed_segments)}/{job.segment_count} segments, "
+          f"{job.processed_frames}/{job.total_samples} frames ({job.progress:.0%})", flush=True)
+
+def write_csv(path: str, points: List[dict]):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for point in points:
+            writer.writerow(point)
+
+async def run(args):
+    # Imported here: decode processes are spawned and re-import this module, and
+    # must not load the YOLO model that importing the services brings along
+    from app.db.mongodb import connect_to_mongo, close_mongo_connection
+    from app.models.video_job import VideoJobCreate
+    from app.services.inference_batcher import inference_batcher
+    from app.services.video_jobs import video_job_service
+
+    await connect_to_mongo()
+    try:
+        if args.resume:
+            # Failed and cancelled jobs are queued again, like POST /api/admin/video-jobs/{job_id}/resume
+            job = await video_job_service.requeue_job(args.resume)
+            if job is None:
+                raise SystemExit(f"❌ Video job {args.resume} not found")
+        else:
+            job = await video_job_service.create_job(VideoJobCreate(
+                video_path=args.video,
+                camera_id=args.camera_id,
+                sample_seconds=args.sample_seconds,
+                segment_seconds=args.segment_seconds,
+                video_start=datetime.fromisoformat(args.video_start) if args.video_start else None
+            ))
+
+        print(f"🎬 Job {job.job_id}: {job.video_path} ({job.frame_count / job.fps / 60:.1f} min at {job.fps:.1f} fps)")
+        print(f"   {job.total_samples} frames to analyse in {job.segment_count} segments, "
+              f"{len(job.completed_segments)} already done")
+
+        job = await video_job_service.run_job(job.job_id, on_progress=print_progress)
+        print(f"{'✅' if job.status == 'completed' else '❌'} Job {job.status}" + (f": {job.error}" if job.error else ""))
+
+        points = await video_job_service.get_series(job.job_id)
+        if args.csv:
+            write_csv(args.csv, points)
+            print(f"📄 {len(points)} points written to {args.csv}")
+        rates = [p["occupancy_rate"] for p in points if "occupancy_rate" in p]
+        if rates:
+            print(f"📊 Occupancy rate: min {min(rates):.2f}, mean {sum(rates) / len(rates):.2f}, max {max(rates):.2f}")
+    finally:
+        await inference_batcher.stop()
+        await video_job_service.stop()
+        await close_mongo_connection()
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline occupancy analysis of a recorded parking video")
+    parser.add_argument("video", nargs="?", help="Video file to analyse")
+    parser.add_argument("--camera-id", help="Camera whose calibration and inference profile are used")
+    parser.add_argument("--sample-seconds", type=float, default=5.0, help="Seconds of video between analysed frames")
+    parser.add_argument("--segment-seconds", type=float, default=None, help="Video time per parallel segment")
+    parser.add_argument("--video-start", help="Wall-clock time of the first frame (ISO 8601) for absolute timestamps")
+    parser.add_argument("--resume", metavar="JOB_ID", help="Continue an interrupted job instead of starting one")
+    parser.add_argument("--csv", help="Write the occupancy time series to this CSV file")
+    args = parser.parse_args()
+
+    if not args.resume and not (args.video and args.camera_id):
+        parser.error("a video and --camera-id are required unless --resume is given")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+INT8 post-training quantization for the parking detection model
+
+Exports models/best.pt to ONNX, quantizes it with ONNX Runtime static
+quantization calibrated on the parking dataset's train images, then compares
+FP32 and INT8 mAP50 and per-frame latency on the test split.
+
+The output .onnx can be used directly: MODEL_PATH=models/best_int8.onnx
+
+Usage:
+    python quantize_model.py
+    python quantize_model.py --weights models/best.pt --output models/best_int8.onnx --calib-method entropy
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from app.services.inference_backends import OnnxRuntimeBackend
+from app.services.yolo_processing import preprocess
+
+DEFAULT_DATASET = Path(__file__).resolve().parent.parent / "Dataset Parkiran UPJ.v3i.yolov12"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+def list_images(split_dir: Path) -> List[Path]:
+    """Images of a dataset split (Roboflow/YOLO layout: <split>/images/*.jpg)"""
+    image_dir = split_dir / "images"
+    return sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+
+def load_labels(image_path: Path, image_shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Ground truth boxes for an image from its YOLO label file
+    Returns: (N, 5) array [class_id, x1, y1, x2, y2] in pixels
+    """
+    label_path = image_path.parent.parent / "labels" / (image_path.stem + ".txt")
+    if not label_path.exists():
+        return np.zeros((0, 5), dtype=np.float32)
+
+    rows = [line.split() for line in label_path.read_text().splitlines() if line.strip()]
+    if not rows:
+        return np.zeros((0, 5), dtype=np.float32)
+
+    labels = np.array(rows, dtype=np.float32)[:, :5]
+    h, w = image_shape
+    cx, cy, bw, bh = labels[:, 1] * w, labels[:, 2] * h, labels[:, 3] * w, labels[:, 4] * h
+    return np.stack([labels[:, 0], cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+
+def export_onnx(weights: str, imgsz: int) -> str:
+    """Export .pt weights to an FP32 ONNX graph next to them"""
+    from ultralytics import YOLO
+
+    print(f"📦 Exporting {weights} to ONNX (imgsz={imgsz})...")
+    return YOLO(weights).export(format="onnx", imgsz=imgsz, simplify=True)
+
+def head_nodes_to_exclude(onnx_path: str) -> List[str]:
+    """
+    Non-conv nodes of the final Detect module (DFL, box decode, sigmoid, concat)
+    Keeping them in FP32 avoids most of the box-coordinate error from INT8
+    """
+    import onnx
+
+    model = onnx.load(onnx_path)
+    module_ids = []
+    for node in model.graph.node:
+        parts = node.name.split("/")
+        if len(parts) > 2 and parts[1].startswith("model.") and parts[1][6:].isdigit():
+            module_ids.append(int(parts[1][6:]))
+
+    if not module_ids:
+        return []
+
+    head_prefix = f"/model.{max(module_ids)}/"
+    return [
+        node.name for node in model.graph.node
+        if node.name.startswith(head_prefix) and node.op_type != "Conv"
+    ]
+
+class ParkingCalibrationReader:
+    """Feeds letterboxed train images to the ONNX Runtime calibrator"""
+
+    def __init__(self, image_paths: List[Path], input_name: str, input_shape: Tuple[int, int]):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.input_shape = input_shape
+        self._iter = iter(self.image_paths)
+
+    def get_next(self):
+        for path in self._iter:
+            image = cv2.imread(str(path))
+            if image is None:
+                print(f"⚠️  Skipping unreadable calibration image {path.name}")
+                continue
+            return {self.input_name: preprocess([image], self.input_shape)}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+def quantize(fp32_path: str, output_path: str, calib_images: List[Path], calib_method: str, exclude_head: bool):
+    """Static INT8 quantization (QDQ, per-channel weights) calibrated on calib_images"""
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    reference = OnnxRuntimeBackend(fp32_path)
+    reader = ParkingCalibrationReader(calib_images, reference.input_name, reference.input_shape)
+
+    prepared_path = str(Path(output_path).with_suffix(".prep.onnx"))
+    quant_pre_process(fp32_path, prepared_path)
+
+    excluded = head_nodes_to_exclude(prepared_path) if exclude_head else []
+    methods = {
+        "minmax": CalibrationMethod.MinMax,
+        "entropy": CalibrationMethod.Entropy,
+        "percentile": CalibrationMethod.Percentile,
+    }
+
+    print(f"🔧 Calibrating on {len(calib_images)} image(s) with {calib_method}, "
+          f"{len(excluded)} detect-head node(s) kept in FP32...")
+    quantize_static(
+        prepared_path,
+        output_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=methods[calib_method],
+        nodes_to_exclude=excluded
+    )
+    os.remove(prepared_path)
+
+    # Keep the ultralytics metadata (class names, imgsz, stride) so YOLOService can load it as-is
+    fp32_model = onnx.load(fp32_path)
+    int8_model = onnx.load(output_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, output_path)
+
+    print(f"✅ INT8 model written to {output_path}")
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+def average_precision(recall: np.ndarray, precision: np.ndarray) -> float:
+    """101-point interpolated AP (same as ultralytics / COCO)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    y = np.interp(x, mrec, mpre)
+    return float(np.sum((x[1:] - x[:-1]) * (y[1:] + y[:-1]) / 2))
+
+def map50(predictions: List[np.ndarray], ground_truths: List[np.ndarray]) -> float:
+    """mAP at IoU 0.5 over all classes present in the ground truth"""
+    classes = np.unique(np.concatenate([gt[:, 0] for gt in ground_truths])) if ground_truths else []
+    aps = []
+
+    for cls in classes:
+        scores, hits, total_gt = [], [], 0
+        for pred, gt in zip(predictions, ground_truths):
+            pred = pred[pred[:, 5] == cls]
+            gt = gt[gt[:, 0] == cls]
+            total_gt += len(gt)
+            if not len(pred):
+                continue
+
+            pred = pred[np.argsort(-pred[:, 4], kind="stable")]
+            matched = np.zeros(len(gt), dtype=bool)
+            ious = iou_matrix(pred[:, :4], gt[:, 1:5]) if len(gt) else np.zeros((len(pred), 0))
+            for i in range(len(pred)):
+                hit = False
+                if ious.shape[1]:
+                    candidates = np.where((ious[i] >= 0.5) & ~matched)[0]
+                    if len(candidates):
+                        matched[candidates[np.argmax(ious[i, candidates])]] = True
+                        hit = True
+                scores.append(pred[i, 4])
+                hits.append(hit)
+
+        if total_gt == 0:
+            continue
+        if not scores:
+            aps.append(0.0)
+            continue
+
+        order = np.argsort(-np.array(scores), kind="stable")
+        tp = np.cumsum(np.array(hits)[order])
+        fp = np.cumsum(~np.array(hits)[order])
+        aps.append(average_precision(tp / total_gt, tp / (tp + fp)))
+
+    return float(np.mean(aps)) if aps else 0.0
+
+def evaluate(model_path: str, eval_images: List[Path], conf: float, iou: float, warmup: int = 3) -> Dict:
+    """mAP50 (conf=0.001, like ultralytics val) and per-frame latency at the serving conf"""
+    backend = OnnxRuntimeBackend(model_path)
+    images = [cv2.imread(str(p)) for p in eval_images]
+    ground_truths = [load_labels(p, img.shape[:2]) for p, img in zip(eval_images, images)]
+
+    predictions = [backend.predict_arrays([img], 0.001, iou, 300)[0] for img in images]
+
+    for img in images[:warmup]:
+        backend.predict_arrays([img], conf, iou, 300)
+
+    latencies = []
+    for img in images:
+        started_at = time.perf_counter()
+        backend.predict_arrays([img], conf, iou, 300)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+
+    return {
+        "model": model_path,
+        "size_mb": round(os.path.getsize(model_path) / 1024 / 1024, 2),
+        "map50": round(map50(predictions, ground_truths), 4),
+        "latency_ms_mean": round(float(np.mean(latencies)), 2),
+        "latency_ms_p50": round(float(np.median(latencies)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "images": len(images)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and evaluate an INT8 ONNX model for ParkIt")
+    parser.add_argument("--weights", default="models/best.pt", help="PyTorch weights to export")
+    parser.add_argument("--onnx", default=None, help="Existing FP32 ONNX model (skips export)")
+    parser.add_argument("--output", default="models/best_int8.onnx", help="INT8 model output path")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET), help="Dataset root with train/ and test/")
+    parser.add_argument("--calib-split", default="train")
+    parser.add_argument("--eval-split", default="test")
+    parser.add_argument("--max-calib-images", type=int, default=0, help="0 = use every calibration image")
+    parser.add_argument("--calib-method", choices=["minmax", "entropy", "percentile"], default="minmax")
+    parser.add_argument("--imgsz", type=int, default=1280, help="Export image size (model was trained at 1280)")
+    parser.add_argument("--quantize-head", action="store_true", help="Also quantize the detect head")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence used for latency runs")
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--report", default=None, help="Write the comparison as JSON to this path")
+    args = parser.parse_args()
+
+    dataset = Path(args.dataset)
+    calib_images = list_images(dataset / args.calib_split)
+    if args.max_calib_images > 0:
+        calib_images = calib_images[:args.max_calib_images]
+    eval_images = list_images(dataset / args.eval_split)
+
+    if not calib_images:
+        print(f"❌ No calibration images found in {dataset / args.calib_split}")
+        return 1
+    if not eval_images:
+        print(f"❌ No evaluation images found in {dataset / args.eval_split}")
+        return 1
+
+    fp32_path = args.onnx or export_onnx(args.weights, args.imgsz)
+    quantize(fp32_path, args.output, calib_images, args.calib_method, not args.quantize_head)
+
+    print(f"\n📊 Evaluating on {len(eval_images)} {args.eval_split} image(s)...")
+    fp32 = evaluate(fp32_path, eval_images, args.conf, args.iou)
+    int8 = evaluate(args.output, eval_images, args.conf, args.iou)
+
+    print("\n" + "=" * 60)
+    print(f"{'':10} {'mAP50':>8} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'MB':>8}")
+    for name, result in (("FP32", fp32), ("INT8", int8)):
+        print(f"{name:10} {result['map50']:>8.4f} {result['latency_ms_mean']:>10.2f} "
+              f"{result['latency_ms_p50']:>10.2f} {result['latency_ms_p95']:>10.2f} {result['size_mb']:>8.2f}")
+    print("=" * 60)
+
+    speedup = fp32["latency_ms_mean"] / int8["latency_ms_mean"] if int8["latency_ms_mean"] else 0.0
+    print(f"Speedup: {speedup:.2f}x, mAP50 change: {int8['map50'] - fp32['map50']:+.4f}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"fp32": fp32, "int8": int8, "speedup": round(speedup, 3)}, f, indent=2)
+        print(f"📝 Report written to {args.report}")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Capture a camera into a shared-memory frame ring for the backend on this host
+
+Reads an RTSP/MJPEG stream, a local video file or a webcam index and writes
+every frame as raw BGR into the ring, so the backend does not receive and
+decode JPEG uploads. Register the ring as the camera's stream:
+
+    PUT /api/admin/calibration/{camera_id}/stream
+    {"url": "shm://parkit-{camera_id}", "sample_fps": 2}
+
+Usage:
+    python shm_capture.py rtsp://192.168.1.20/stream1 --camera-id parking-area-1
+    python shm_capture.py recordings/lot.mp4 --camera-id parking-area-1 --loop
+"""
+
+import argparse
+import time
+
+import cv2
+
+from app.services.shm_ring import FrameRingWriter
+
+def run(args):
+    source = int(args.source) if args.source.isdigit() else args.source
+    is_file = isinstance(source, str) and "://" not in source
+    ring_name = args.ring or f"parkit-{args.camera_id}"
+    writer = None
+
+    try:
+        while True:
+            capture = cv2.VideoCapture(source)
+            if not capture.isOpened():
+                if is_file:
+                    raise SystemExit(f"❌ Cannot open video file {args.source}")
+                print(f"❌ Cannot open {args.source}, retrying in {args.reconnect_delay}s")
+                time.sleep(args.reconnect_delay)
+                continue
+
+            # Replay files at their own frame rate, like a live camera
+            fps = capture.get(cv2.CAP_PROP_FPS) if is_file else 0.0
+            started = time.monotonic()
+            frames = 0
+            while True:
+                ok, image = capture.read()
+                if not ok:
+                    break
+                if writer is None:
+                    writer = FrameRingWriter(ring_name, slot_bytes=image.nbytes, slots=args.slots)
+                    print(f"✅ Writing {image.shape[1]}x{image.shape[0]} frames to shm://{ring_name}")
+                writer.write(image)
+                frames += 1
+                if fps > 0:
+                    delay = started + frames / fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            capture.release()
+
+            if is_file:
+                if not args.loop:
+                    break
+                continue
+            print(f"⚠️  Stream ended, reconnecting in {args.reconnect_delay}s")
+            time.sleep(args.reconnect_delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer is not None:
+            writer.close(unlink=not args.keep)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write camera frames into a shared-memory ring for the backend")
+    parser.add_argument("source", help="Stream URL, video file or webcam index")
+    parser.add_argument("--camera-id", required=True, help="Camera the frames belong to")
+    parser.add_argument("--ring", help="Ring name (default parkit-{camera_id})")
+    parser.add_argument("--slots", type=int, default=3, help="Frames kept in the ring (at least 2)")
+    parser.add_argument("--loop", action="store_true", help="Restart video files from the beginning when they end")
+    parser.add_argument("--keep", action="store_true", help="Leave the ring in place on exit for the next run")
+    parser.add_argument("--reconnect-delay", type=float, default=5.0, help="Seconds before reopening a failed stream")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
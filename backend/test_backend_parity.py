@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Parity test: the lean torch backend must return the same boxes as ultralytics
+
+Runs without the server. Compares TorchBackend with UltralyticsBackend on
+dataset images (one at a time and batched) and checks that NMS keeps the
+same boxes as torch NMS when candidates have equal scores.
+
+Usage:
+    python test_backend_parity.py
+    MODEL_PATH=models/best.pt python test_backend_parity.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.inference_backends import TorchBackend, UltralyticsBackend
+from app.services.yolo_processing import nms
+from benchmark_inference import DEFAULT_DATASET, compare, load_frames
+
+CONF = 0.25
+IOU = 0.45
+MAX_DET = 300
+# Both backends letterbox and decode the same way; only float rounding may differ
+TOLERANCE = 0.01
+
+def _frames():
+    split = DEFAULT_DATASET / "test"
+    if (split / "images").exists():
+        return load_frames(split, 8, [1920, 1080])
+    return load_frames(Path("test_data"), 4, [1920, 1080])
+
+def _tied_boxes(rng, count):
+    """Overlapping boxes whose scores take only three values"""
+    xy = rng.uniform(0, 200, (count, 2)).astype(np.float32)
+    wh = rng.uniform(10, 60, (count, 2)).astype(np.float32)
+    scores = rng.choice([0.3, 0.5, 0.7], count).astype(np.float32)
+    return np.hstack([xy, xy + wh]), scores
+
+def test_nms_tie_breaking():
+    """Equal scores keep the lower index first, like torchvision and ultralytics' TorchNMS"""
+    import torch
+    from ultralytics.utils.nms import TorchNMS
+
+    rng = np.random.default_rng(0)
+    for case in range(200):
+        # torch only sorts ties in index order up to 16 elements
+        boxes, scores = _tied_boxes(rng, int(rng.integers(2, 17)))
+        expected = TorchNMS.nms(torch.from_numpy(boxes), torch.from_numpy(scores), IOU).numpy()
+        assert list(nms(boxes, scores, IOU)) == list(expected), f"case {case} keeps different boxes"
+
+    try:
+        import torchvision
+    except ImportError:
+        return
+    for case in range(200):
+        boxes, scores = _tied_boxes(rng, int(rng.integers(2, 500)))
+        expected = torchvision.ops.nms(torch.from_numpy(boxes), torch.from_numpy(scores), IOU).numpy()
+        assert list(nms(boxes, scores, IOU)) == list(expected), f"case {case} keeps different boxes (torchvision)"
+
+def test_torch_backend_matches_ultralytics():
+    """Same boxes, scores and classes for single frames and a batch"""
+    frames = _frames()
+    reference = UltralyticsBackend(settings.MODEL_PATH)
+    backend = TorchBackend(settings.MODEL_PATH)
+
+    for i, frame in enumerate(frames):
+        expected = reference.predict_arrays([frame], CONF, IOU, MAX_DET)
+        difference = compare(expected, backend.predict_arrays([frame], CONF, IOU, MAX_DET))
+        assert difference <= TOLERANCE, f"frame {i}: boxes differ by {difference}"
+
+    difference = compare(
+        reference.predict_arrays(frames, CONF, IOU, MAX_DET),
+        backend.predict_arrays(frames, CONF, IOU, MAX_DET)
+    )
+    assert difference <= TOLERANCE, f"batch: boxes differ by {difference}"
+
+def main():
+    """Run all tests"""
+    print("🚀 Backend parity tests")
+    print(f"Model: {settings.MODEL_PATH}")
+
+    failed = 0
+    for test in (test_nms_tie_breaking, test_torch_backend_matches_ultralytics):
+        try:
+            test()
+            print(f"✅ {test.__name__} passed")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n{'='*50}")
+    print(f"Test Summary: {2 - failed} passed, {failed} failed")
+    print(f"{'='*50}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()